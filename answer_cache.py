@@ -0,0 +1,132 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """Normalisasi query: huruf kecil, spasi tunggal, tanpa tanda baca di ujung."""
+    query = re.sub(r'\s+', ' ', query.strip().lower())
+    return query.strip(' ?!.,;:')
+
+
+def make_cache_key(query: str, case_ids: Iterable[str], version: str) -> str:
+    """Kunci cache = query ternormalisasi + set ID case + versi prompt/model."""
+    raw = '\x1f'.join([normalize_query(query), _case_ids_key(case_ids), version])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _case_ids_key(case_ids: Iterable[str]) -> str:
+    return ','.join(sorted(case_ids))
+
+
+class AnswerCache:
+    """Cache jawaban LLM di SQLite dengan eviksi LRU + TTL.
+
+    Semua entri terikat ke `db_key` (hash database); saat database berubah,
+    entri lama otomatis dihapus ketika cache dibuka. Tier semantik opsional
+    memakai embedding query yang disimpan bersama jawaban, dan hanya berlaku
+    untuk entri dengan set case hasil retrieval yang sama.
+    """
+
+    def __init__(self, path: str, db_key: str, max_entries: int = 1000,
+                 ttl_seconds: float = 7 * 24 * 3600):
+        self.db_key = db_key
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS answers (
+                    key TEXT PRIMARY KEY,
+                    db_key TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    embedding BLOB,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    case_ids TEXT
+                )
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(answers)")}
+            if 'case_ids' not in columns:
+                # Cache lama: entri tanpa case_ids tidak pernah dipakai tier semantik
+                self._conn.execute("ALTER TABLE answers ADD COLUMN case_ids TEXT")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS answers_last_used ON answers(last_used)"
+            )
+            self._conn.execute("DELETE FROM answers WHERE db_key != ?", (db_key,))
+
+    def get(self, key: str) -> Optional[str]:
+        """Ambil jawaban untuk kunci persis (None jika tidak ada/kedaluwarsa)."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT answer FROM answers WHERE key = ? AND db_key = ? AND created >= ?",
+                (key, self.db_key, now - self.ttl_seconds)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def get_similar(self, embedding: List[float], version: str, threshold: float,
+                    case_ids: Iterable[str]) -> Optional[Tuple[str, float]]:
+        """Tier semantik: jawaban dari query lama dengan cosine >= threshold.
+
+        Hanya entri dengan set `case_ids` hasil retrieval yang sama: parafrase
+        yang maknanya berbeda biasanya juga mengambil case yang berbeda.
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, answer, embedding FROM answers "
+                "WHERE db_key = ? AND version = ? AND case_ids = ? "
+                "AND embedding IS NOT NULL AND created >= ?",
+                (self.db_key, version, _case_ids_key(case_ids), now - self.ttl_seconds)
+            ).fetchall()
+        if not rows:
+            return None
+
+        query_vec = np.asarray(embedding, dtype=np.float32)
+        query_vec /= (np.linalg.norm(query_vec) or 1.0)
+        matrix = np.stack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        scores = matrix @ query_vec
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, rows[best][0]))
+        return rows[best][1], float(scores[best])
+
+    def put(self, key: str, query: str, answer: str, version: str,
+            embedding: Optional[List[float]] = None, case_ids: Optional[Iterable[str]] = None):
+        """Simpan jawaban, lalu buang entri kedaluwarsa dan yang paling lama tak dipakai."""
+        now = time.time()
+        blob = np.asarray(embedding, dtype=np.float32).tobytes() if embedding is not None else None
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, self.db_key, version, normalize_query(query), answer, blob, now, now,
+                 _case_ids_key(case_ids) if case_ids is not None else None)
+            )
+            self._conn.execute(
+                "DELETE FROM answers WHERE created < ?", (now - self.ttl_seconds,)
+            )
+            self._conn.execute("""
+                DELETE FROM answers WHERE key IN (
+                    SELECT key FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
@@ -0,0 +1,245 @@
+"""HTTP JSON API untuk query koding klaim, terpisah dari UI Streamlit.
+
+Jalankan:
+    python api_server.py --port 8000
+    python api_server.py --stub-llm --llm-rate 6000   # load test tanpa Groq
+
+Endpoint:
+    GET  /health   (status warm-up; 'warming' sampai model & index siap; daftar kategori)
+    GET  /metrics  (format teks Prometheus)
+    POST /search   {"query": "...", "k": 3, "kategori": "neoplasma"}
+    POST /answer   {"query": "...", "k": 3, "kategori": "neoplasma"}
+
+`kategori` opsional: membatasi pencarian ke satu kategori case.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from urllib.parse import parse_qs, urlparse
+
+from dotenv import load_dotenv
+
+from metrics import REGISTRY
+from rag_core import (
+    DB_WATCH_INTERVAL_S, LLM_RATE_PER_MINUTE, RAGEngine, StubChatModel, WarmUp, create_answer_cache,
+    create_llm, create_llm_scheduler, scheduler_gauges
+)
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_K = 20
+READY_TIMEOUT_S = 30     # lama request menunggu warm-up sebelum dibalas 503
+
+
+class NotReady(Exception):
+    """Engine belum siap (warm-up masih berjalan atau gagal)."""
+
+
+def document_summary(doc) -> Dict:
+    """Ringkasan satu case hasil retrieval untuk respons JSON."""
+    meta = doc.metadata
+    return {
+        'id': meta['id'],
+        'diagnosa_utama': meta.get('diagnosa_utama', ''),
+        'kode': list(meta.get('kode', [])),
+        'kategori': meta.get('kategori', ''),
+        'prosedur': meta.get('prosedur'),
+        'aspek_koding': meta.get('aspek_koding', ''),
+        'perhatian_khusus': meta.get('perhatian_khusus'),
+    }
+
+
+def parse_k(value) -> int:
+    """Nilai `k` dari request, dibatasi 1..MAX_K; ValueError (400) jika bukan bilangan bulat."""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError("parameter 'k' harus bilangan bulat")
+    try:
+        k = int(value)
+    except ValueError:
+        raise ValueError("parameter 'k' harus bilangan bulat") from None
+    return min(max(k, 1), MAX_K)
+
+
+class APIHandler(BaseHTTPRequestHandler):
+    """Handler request; engine dibuat setelah warm-up (dan tiap database dimuat ulang)."""
+
+    warmup: WarmUp = None
+    scheduler = None
+    engine: RAGEngine = None
+    started_at = time.time()
+    _engine_lock = threading.Lock()
+
+    @classmethod
+    def get_engine(cls, timeout: float = READY_TIMEOUT_S) -> RAGEngine:
+        if cls.engine is None:
+            if not cls.warmup.wait(timeout):
+                raise NotReady(f"model masih dimuat ({cls.warmup.step})")
+            if cls.warmup.error is not None:
+                raise NotReady(f"warm-up gagal: {cls.warmup.error}")
+        case_store, db = cls.warmup.result()
+        engine = cls.engine
+        if engine is None or engine.db is not db:
+            # Database dimuat ulang: request baru memakai engine baru, yang berjalan tetap di engine lama
+            with cls._engine_lock:
+                if cls.engine is None or cls.engine.db is not db:
+                    cls.engine = RAGEngine(
+                        case_store, db, cls.scheduler, create_answer_cache(case_store.index_key)
+                    )
+                engine = cls.engine
+        return engine
+
+    def _send_text(self, status: int, text: str, content_type: str = 'text/plain; version=0.0.4'):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_params(self) -> Dict:
+        """Parameter dari body JSON (POST) atau query string (GET)."""
+        if self.command == 'POST':
+            length = int(self.headers.get('Content-Length') or 0)
+            if length > MAX_BODY_BYTES:
+                raise ValueError("body terlalu besar")
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(body, dict):
+                raise ValueError("body harus berupa objek JSON")
+            return body
+        params = parse_qs(urlparse(self.path).query)
+        return {key: values[0] for key, values in params.items()}
+
+    def _query_params(self):
+        params = self._read_params()
+        query = str(params.get('query') or params.get('q') or '').strip()
+        if not query:
+            raise ValueError("parameter 'query' wajib diisi")
+        k = parse_k(params.get('k', 3))
+        category = str(params.get('kategori') or '').strip() or None
+        return query, k, category
+
+    def _route(self):
+        path = urlparse(self.path).path.rstrip('/')
+        try:
+            if path == '/health':
+                self._handle_health()
+            elif path == '/metrics':
+                self._handle_metrics()
+            elif path == '/search':
+                self._handle_search()
+            elif path == '/answer':
+                self._handle_answer()
+            else:
+                self._send_json(404, {'error': f"endpoint tidak dikenal: {path}"})
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+        except NotReady as e:
+            self._send_json(503, {'error': str(e), 'warmup': self.warmup.status()})
+        except Exception as e:
+            print(f"Error handling {self.command} {self.path}: {e}")
+            self._send_json(500, {'error': str(e)})
+
+    def do_GET(self):
+        self._route()
+
+    def do_POST(self):
+        self._route()
+
+    def _handle_health(self):
+        warmup = self.warmup.status()
+        payload = {
+            'status': 'ok' if warmup['ready'] else ('error' if warmup['error'] else 'warming'),
+            'uptime_s': round(time.time() - self.started_at),
+            'warmup': warmup,
+            'llm': self.scheduler.stats(),
+        }
+        if warmup['ready']:
+            case_store = self.warmup.case_store
+            payload.update(
+                cases=len(case_store.documents),
+                index_key=case_store.index_key,
+                categories={category: len(ids) for category, ids in case_store.category_index.items()}
+            )
+        self._send_json(200 if warmup['ready'] else 503, payload)
+
+    def _handle_metrics(self):
+        self._send_text(200, REGISTRY.render_prometheus(scheduler_gauges(self.scheduler)))
+
+    def _handle_search(self):
+        query, k, category = self._query_params()
+        engine = self.get_engine()
+        start = time.perf_counter()
+        docs = engine.search(query, k=k, category=category)
+        self._send_json(200, {
+            'query': query,
+            'kategori': category,
+            'results': [document_summary(doc) for doc in docs],
+            'total_ms': round((time.perf_counter() - start) * 1000),
+        })
+
+    def _handle_answer(self):
+        query, k, category = self._query_params()
+        result = self.get_engine().answer(query, k=k, category=category)
+        result['query'] = query
+        result['kategori'] = category
+        self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API JSON koding klaim INA-CBG")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--json-file', default='medical_database_structured2.json')
+    parser.add_argument('--stub-llm', action='store_true',
+                        help="pakai LLM palsu deterministik (untuk load test)")
+    parser.add_argument('--stub-latency', type=float, default=0.5,
+                        help="latensi LLM palsu per jawaban (detik)")
+    parser.add_argument('--llm-rate', type=float, default=LLM_RATE_PER_MINUTE,
+                        help="batas request LLM per menit")
+    parser.add_argument('--quiet', action='store_true', help="tanpa access log")
+    parser.add_argument('--watch-interval', type=float, default=DB_WATCH_INTERVAL_S,
+                        help="detik antar cek perubahan file database (0 = tidak dipantau)")
+    args = parser.parse_args()
+
+    if args.stub_llm:
+        client_factory = lambda: StubChatModel(latency=args.stub_latency)
+    else:
+        load_dotenv()
+        if not os.getenv("GROQ_API_KEY"):
+            sys.exit("GROQ_API_KEY tidak ditemukan (set di .env atau pakai --stub-llm)")
+        client_factory = create_llm
+
+    # Server langsung menerima request; model & index dimuat di latar
+    APIHandler.warmup = WarmUp(args.json_file, watch_interval=args.watch_interval or None)
+    APIHandler.scheduler = create_llm_scheduler(client_factory, rate_per_minute=args.llm_rate)
+
+    server = ThreadingHTTPServer((args.host, args.port), APIHandler)
+    server.daemon_threads = True
+    server.quiet = args.quiet
+    print(f"API berjalan di http://{args.host}:{args.port} (warm-up {args.json_file} di latar)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
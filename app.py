@@ -1,11 +1,9 @@
 import streamlit as st
 import os
-import sys
-import json
 import uuid
 from dotenv import load_dotenv
 from datetime import datetime
-from typing import List, Dict
+from typing import Dict, Iterator, Optional
 
 # Configure page
 st.set_page_config(
@@ -33,11 +31,22 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Pustaka LangChain & Komponen AI
-from langchain_core.documents import Document
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_groq import ChatGroq
+# Pipeline retrieval + RAG (tanpa ketergantungan UI); modul berat di-import di latar oleh WarmUp
+from rag_core import (
+    DB_WATCH_INTERVAL_S, CaseStore, RAGEngine, WarmUp, create_answer_cache, create_llm_scheduler,
+    scheduler_gauges
+)
+from async_pipeline import AsyncPipeline
+from conversation_store import ConversationStore
+from metrics import start_metrics_server
+
+# --- KONFIGURASI RIWAYAT CHAT ---
+HISTORY_DIR = "user_histories"
+CONVERSATION_DB = os.path.join(HISTORY_DIR, "conversations.sqlite3")
+CONVERSATION_PAGE_SIZE = 20
+CHAT_WINDOW = 20              # tanya-jawab terakhir yang dirender & disimpan di session
+HISTORY_SUMMARY = True        # ringkas tanya-jawab di luar jendela (daftar pertanyaan)
+SUMMARY_MAX_QUESTIONS = 30
 
 # --- USER SESSION MANAGEMENT ---
 def get_or_create_user_id():
@@ -95,92 +104,82 @@ def reset_user_session():
         del st.session_state.current_messages
     if 'conversation_title' in st.session_state:
         del st.session_state.conversation_title
+    if 'history_start' in st.session_state:
+        del st.session_state.history_start
+
+@st.cache_resource(show_spinner=False)
+def get_conversation_store() -> ConversationStore:
+    """Store riwayat chat bersama per proses (migrasi JSON lama sekali saja)."""
+    store = ConversationStore(CONVERSATION_DB)
+    migrated = store.migrate_json_histories(HISTORY_DIR)
+    if migrated:
+        print(f"Migrated {migrated} conversations from {HISTORY_DIR}")
+    return store
+
+def get_user_conversations(user_id, limit=CONVERSATION_PAGE_SIZE, offset=0):
+    """Mengambil satu halaman daftar percakapan user."""
+    return get_conversation_store().list_conversations(user_id, limit=limit, offset=offset)
+
+def count_user_conversations(user_id):
+    """Jumlah percakapan tersimpan milik user."""
+    return get_conversation_store().count_conversations(user_id)
+
+def load_conversation(user_id, conversation_id, limit=CHAT_WINDOW):
+    """Memuat percakapan tertentu (hanya `limit` pesan terakhir)."""
+    try:
+        return get_conversation_store().load_conversation(user_id, conversation_id, limit=limit)
+    except Exception as e:
+        print(f"Error loading conversation: {e}")
+        return None
 
-def get_user_conversations(user_id):
-    """Mengambil daftar semua percakapan user."""
-    history_dir = "user_histories"
-    user_dir = os.path.join(history_dir, user_id)
-    
-    if not os.path.exists(user_dir):
-        os.makedirs(user_dir)
+def load_earlier_messages(conversation_id, start, end):
+    """Memuat pesan lama (seq start..end-1) untuk tombol "muat sebelumnya"."""
+    try:
+        return get_conversation_store().load_messages(conversation_id, start, end)
+    except Exception as e:
+        print(f"Error loading messages: {e}")
         return []
-    
-    conversations = []
-    for filename in os.listdir(user_dir):
-        if filename.endswith('.json'):
-            conv_id = filename.replace('.json', '')
-            filepath = os.path.join(user_dir, filename)
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if data.get('messages'):
-                        conversations.append({
-                            'id': conv_id,
-                            'title': data.get('title', 'Percakapan Baru'),
-                            'created': data.get('created', ''),
-                            'updated': data.get('updated', ''),
-                            'message_count': len(data.get('messages', []))
-                        })
-            except Exception as e:
-                print(f"Error loading conversation {filename}: {e}")
-                continue
-    
-    conversations.sort(key=lambda x: x.get('updated', ''), reverse=True)
-    return conversations
 
-def load_conversation(user_id, conversation_id):
-    """Memuat percakapan tertentu."""
-    history_dir = "user_histories"
-    filepath = os.path.join(history_dir, user_id, f"{conversation_id}.json")
-    
-    if os.path.exists(filepath):
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading conversation: {e}")
-            return None
-    return None
+def get_history_summary(conversation_id, end):
+    """Pertanyaan-pertanyaan sebelum jendela chat, sebagai ringkasan riwayat lama."""
+    try:
+        return get_conversation_store().list_questions(conversation_id, end, SUMMARY_MAX_QUESTIONS)
+    except Exception as e:
+        print(f"Error loading history summary: {e}")
+        return []
 
-def save_conversation(user_id, conversation_id, title, messages):
-    """Menyimpan percakapan."""
-    history_dir = "user_histories"
-    user_dir = os.path.join(history_dir, user_id)
-    
-    if not os.path.exists(user_dir):
-        os.makedirs(user_dir)
-    
-    filepath = os.path.join(user_dir, f"{conversation_id}.json")
-    
-    existing_data = load_conversation(user_id, conversation_id)
-    created_time = existing_data.get('created') if existing_data else datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    data = {
-        'id': conversation_id,
-        'title': title,
-        'created': created_time,
-        'updated': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        'messages': messages
-    }
-    
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+def save_message(user_id, conversation_id, title, message):
+    """Menyimpan satu pesan baru ke percakapan (append, tanpa menulis ulang riwayat)."""
+    get_conversation_store().append_message(user_id, conversation_id, title, message)
 
 def delete_conversation(user_id, conversation_id):
     """Menghapus percakapan."""
-    history_dir = "user_histories"
-    filepath = os.path.join(history_dir, user_id, f"{conversation_id}.json")
-    
-    if os.path.exists(filepath):
-        os.remove(filepath)
-        return True
-    return False
+    return get_conversation_store().delete_conversation(user_id, conversation_id)
 
 def create_new_conversation():
     """Membuat percakapan baru."""
     st.session_state.current_conversation_id = str(uuid.uuid4())
     st.session_state.current_messages = []
     st.session_state.conversation_title = "Percakapan Baru"
+    st.session_state.history_start = 0
+
+def set_current_conversation(conv_data):
+    """Jadikan percakapan aktif; hanya jendela pesan terakhir yang ada di session."""
+    st.session_state.current_conversation_id = conv_data['id']
+    st.session_state.current_messages = conv_data.get('messages', [])
+    st.session_state.conversation_title = conv_data.get('title', 'Percakapan Baru')
+    st.session_state.history_start = conv_data.get('first_seq', 0)
+
+def trim_history():
+    """Buang pesan tertua dari session jika melebihi jendela (tetap ada di storage)."""
+    extra = len(st.session_state.current_messages) - CHAT_WINDOW
+    if extra > 0:
+        st.session_state.current_messages = st.session_state.current_messages[extra:]
+        st.session_state.history_start += extra
+
+def total_message_count():
+    """Jumlah pesan percakapan aktif, termasuk yang tidak dimuat ke session."""
+    return st.session_state.history_start + len(st.session_state.current_messages)
 
 def generate_title_from_first_question(question):
     """Generate judul dari pertanyaan pertama."""
@@ -192,14 +191,12 @@ def generate_title_from_first_question(question):
 def initialize_conversation_state(user_id):
     """Inisialisasi state percakapan saat aplikasi dimulai atau di-refresh."""
     if 'current_conversation_id' not in st.session_state:
-        conversations = get_user_conversations(user_id)
+        conversations = get_user_conversations(user_id, limit=1)
         if conversations and len(conversations) > 0:
             last_conv = conversations[0]
             conv_data = load_conversation(user_id, last_conv['id'])
             if conv_data:
-                st.session_state.current_conversation_id = last_conv['id']
-                st.session_state.current_messages = conv_data.get('messages', [])
-                st.session_state.conversation_title = conv_data.get('title', 'Percakapan Baru')
+                set_current_conversation(conv_data)
             else:
                 create_new_conversation()
         else:
@@ -250,171 +247,141 @@ def setup_environment():
     
     os.environ["GROQ_API_KEY"] = api_key
 
-def load_json_database(json_file: str) -> Dict:
-    """Load JSON database"""
-    with st.spinner(f"📄 Memuat database JSON: {json_file}..."):
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return data
-        except Exception as e:
-            st.error(f"❌ ERROR membaca JSON: {e}")
-            st.stop()
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _start_warmup(json_file: str) -> WarmUp:
+    """Mulai warm-up (database, model embedding, index) sekali per proses."""
+    return WarmUp(json_file, watch_interval=DB_WATCH_INTERVAL_S)
 
-def create_smart_chunks(json_data: Dict) -> List[Document]:
-    """SMART CHUNKING: Satu case = satu chunk dengan struktur optimal"""
-    with st.spinner("🧩 Membuat Smart Chunks..."):
-        documents = []
-        
-        for case in json_data['cases']:
-            # Format chunk yang OPTIMAL untuk pencarian
-            chunk_text = f"""ID: {case['id']}
-DIAGNOSA: {case.get('diagnosa_utama', '')} - {case['diagnosa'][:200]}
-KODE: {', '.join(case['kode_diagnosa'][:5])}
-KATEGORI: {case['kategori']}
-PROSEDUR: {case['prosedur'][:150] if case['prosedur'] else 'Tidak ada'}
-ASPEK KODING: {case['aspek_koding'][:300]}
-KEYWORDS: {', '.join(case['keywords'][:15])}"""
-            
-            doc = Document(
-                page_content=chunk_text,
-                metadata={
-                    'id': case['id'],
-                    'diagnosa_utama': case.get('diagnosa_utama', ''),
-                    'diagnosa': case['diagnosa'],
-                    'kode': case['kode_diagnosa'],
-                    'kategori': case['kategori'],
-                    'prosedur': case['prosedur'],
-                    'aspek_koding': case['aspek_koding'],
-                    'perhatian_khusus': case['perhatian_khusus'],
-                    'keywords': case['keywords']
-                }
-            )
-            
-            documents.append(doc)
-        
-        return documents
+def get_warmup(json_file: str) -> WarmUp:
+    """Warm-up bersama; perubahan file database dimuat ulang di latar dan ditukar atomik."""
+    return _start_warmup(json_file)
 
-@st.cache_resource
-def create_vector_store(_documents: List[Document]):
-    """Buat vector store dari documents"""
-    with st.spinner("🔍 Membuat Vector Store..."):
-        try:
-            embedding_model = HuggingFaceEmbeddings(
-                model_name="paraphrase-multilingual-mpnet-base-v2"
-            )
-            db = FAISS.from_documents(_documents, embedding_model)
-            return db
-        except Exception as e:
-            st.error(f"❌ ERROR membuat vector store: {e}")
-            st.stop()
-
-def smart_search(db, query: str, json_data: Dict, k: int = 3) -> List[Document]:
-    """SMART SEARCH: Optimized hybrid search"""
-    import re
-    
-    # Cek apakah ada kode ICD di query
-    kode_pattern = r'\b[A-Z]\d{2}(?:\.\d+)?\b'
-    kode_found = re.findall(kode_pattern, query.upper())
-    
-    # Jika ada kode spesifik, cari langsung
-    if kode_found:
-        filtered_docs = []
-        for case in json_data['cases']:
-            if any(kode in case['kode_diagnosa'] for kode in kode_found):
-                doc = Document(
-                    page_content="",
-                    metadata={
-                        'id': case['id'],
-                        'diagnosa': case['diagnosa'],
-                        'kode': case['kode_diagnosa'],
-                        'prosedur': case['prosedur'],
-                        'aspek_koding': case['aspek_koding'],
-                        'perhatian_khusus': case['perhatian_khusus']
-                    }
-                )
-                filtered_docs.append(doc)
+def render_warmup_progress(warmup: WarmUp):
+    """Status warm-up yang diperbarui tiap detik; halaman di-rerun begitu siap."""
+    @st.fragment(run_every=1.0)
+    def progress():
+        if warmup.wait(0):
+            st.rerun()
+        status = warmup.status()
+        st.info(f"⏳ Menyiapkan model & index ({status['step']}, {status['elapsed_s']} dtk)... "
+                "Riwayat sudah bisa dibaca; pertanyaan akan dijawab begitu siap.")
+    progress()
+
+@st.cache_resource(show_spinner=False)
+def get_llm_scheduler():
+    """Satu scheduler (dan satu client Groq) untuk seluruh proses."""
+    return create_llm_scheduler()
+
+@st.cache_resource(show_spinner=False)
+def get_answer_cache(db_key: str):
+    """Cache jawaban bersama per proses, terikat ke versi database."""
+    return create_answer_cache(db_key)
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_endpoint():
+    """Endpoint /metrics di port METRICS_PORT (opsional, sekali per proses)."""
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return None
+    try:
+        return start_metrics_server(int(port), gauges=lambda: scheduler_gauges(get_llm_scheduler()))
+    except Exception as e:
+        print(f"Error starting metrics server: {e}")
+        return None
+
+def get_engine(case_store: CaseStore, vector_db) -> RAGEngine:
+    """Rangkai pipeline RAG dari komponen yang sudah di-cache per proses."""
+    return RAGEngine(
+        case_store,
+        vector_db,
+        get_llm_scheduler(),
+        get_answer_cache(case_store.index_key)
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_pipeline(json_file: str) -> AsyncPipeline:
+    """Satu event loop untuk semua sesi; engine diambil ulang tiap query (ikut reload database)."""
+    return AsyncPipeline(lambda: get_engine(*get_warmup(json_file).result()))
+
+def get_pipeline_session_id() -> str:
+    """ID per tab browser: query baru dari tab yang sama membatalkan query lamanya."""
+    if 'pipeline_session_id' not in st.session_state:
+        st.session_state.pipeline_session_id = str(uuid.uuid4())
+    return st.session_state.pipeline_session_id
+
+def stream_groq_rag(pipeline: AsyncPipeline, query: str, metrics: Dict,
+                    category: Optional[str] = None) -> Iterator[str]:
+    """GROQ RAG versi streaming: yield token demi token ke UI.
+
+    Jika user mengirim pertanyaan lain atau meninggalkan halaman, rerun
+    Streamlit menutup generator ini dan query di pipeline ikut dibatalkan.
+    """
+    try:
+        # Spinner tampil sampai token pertama datang
+        with st.spinner("🤖 AI Groq sedang menganalisis (super cepat!)..."):
+            stream = pipeline.stream(query, metrics, session_id=get_pipeline_session_id(), category=category)
+            first_token = next(stream, "")
         
-        if filtered_docs:
-            return filtered_docs[:k]
+        yield first_token
+        yield from stream
     
-    # Semantic search
-    results = db.similarity_search(query, k=k)
-    return results
-
-def run_groq_rag(db, json_data: Dict, query: str) -> str:
-    """GROQ RAG: Gratis, Cepat, Akurat!"""
-    with st.spinner("🤖 AI Groq sedang menganalisis (super cepat!)..."):
-        try:
-            llm = ChatGroq(
-                model="moonshotai/kimi-k2-instruct-0905",  # Model stabil Groq (gratis!)
-                temperature=0.1,
-                max_tokens=1024
-            )
-            
-            # SINGLE SEARCH (hemat & cepat!)
-            top_docs = smart_search(db, query, json_data, k=3)
-            
-            # Build context dari metadata
-            context_parts = []
-            for doc in top_docs:
-                meta = doc.metadata
-                context_part = f"""
-DIAGNOSA: {meta.get('diagnosa', 'N/A')}
-KODE ICD: {', '.join(meta.get('kode', []))}
-PROSEDUR: {meta.get('prosedur') or 'Tidak ada prosedur khusus'}
-ASPEK KODING: {meta.get('aspek_koding', 'N/A')}
-PERHATIAN KHUSUS: {meta.get('perhatian_khusus') or 'Tidak ada'}
----"""
-                context_parts.append(context_part)
-            
-            context = "\n".join(context_parts)
-            
-            # PROMPT YANG SUPER EFEKTIF
-            prompt = f"""Kamu adalah ahli koding ICD-10 dan INA-CBG. Jawab dengan RINGKAS, AKURAT, dan TERSTRUKTUR.
-
-KONTEKS DATABASE:
-{context}
-
-PERTANYAAN: {query}
-
-INSTRUKSI:
-1. Jawab LANGSUNG dengan struktur:
-   - DIAGNOSA: (singkat)
-   - KODE ICD-10/ICD-9: (list dengan penjelasan 1 kalimat)
-   - PROSEDUR: (jika ada)
-   - ASPEK KODING: (poin penting saja, max 3-4 poin)
-   - PERHATIAN KHUSUS: (jika ada, max 2-3 poin)
-
-2. ATURAN PENTING:
-   - Jawab PADAT dan FOKUS (hindari pengulangan)
-   - Jika ada kode kombinasi, jelaskan secara SINGKAT
-   - Jika info tidak lengkap di konteks, katakan "Tidak ditemukan dalam database"
-   - Gunakan bullet points (•) untuk list
-
-3. FORMAT CONTOH:
-DIAGNOSA: [nama diagnosa lengkap]
-
-KODE ICD-10: 
-• A01.0 - Typhoid fever
-• A09 - Tidak dikoding jika sudah ada A01.0
-
-PROSEDUR: [jika ada, jika tidak: "Tidak ada prosedur khusus"]
-
-ASPEK KODING:
-• [poin penting 1]
-• [poin penting 2]
+    except Exception as e:
+        st.error(f"❌ ERROR: {e}")
+        yield f"Maaf, terjadi kesalahan: {str(e)}"
+
+def render_markdown(text: str) -> str:
+    """Markdown siap tampil; '$' di-escape agar tidak dibaca sebagai LaTeX."""
+    return text.replace("$", "\\$")
+
+def prerender_messages(messages):
+    """Markdown jawaban dihitung sekali per pesan dan disimpan di pesan itu (dipakai ulang tiap rerun).
+
+    Dipanggil setelah pesan disimpan, jadi kunci 'markdown' tidak ikut masuk storage.
+    """
+    for msg in messages:
+        if "markdown" not in msg:
+            msg["markdown"] = render_markdown(msg["answer"])
+
+def format_answer_caption(metrics: Dict) -> Optional[str]:
+    """Keterangan sumber & latensi jawaban."""
+    if metrics.get("path") == "template":
+        return f"📋 Jawaban langsung dari database (tanpa AI) · {metrics['total_ms']} ms"
+    if metrics.get("cache"):
+        return f"♻️ Dari cache ({metrics['cache']}) · {metrics['total_ms']} ms"
+    if metrics.get("ttft_ms") is not None:
+        return f"⚡ Token pertama {metrics['ttft_ms']} ms · total {metrics['total_ms']} ms"
+    return None
 
-PERHATIAN KHUSUS: [jika ada, singkat saja]
+def render_chat_history():
+    """Render jendela tanya-jawab terakhir; riwayat lama diringkas dan bisa dimuat per halaman."""
+    history_start = st.session_state.history_start
+    if history_start > 0:
+        if HISTORY_SUMMARY:
+            with st.expander(f"🗂️ Ringkasan {history_start} tanya-jawab sebelumnya"):
+                questions = get_history_summary(st.session_state.current_conversation_id, history_start)
+                if history_start > len(questions):
+                    st.caption(f"... dan {history_start - len(questions)} pertanyaan lebih awal")
+                st.markdown("\n".join(
+                    f"{history_start - len(questions) + i + 1}. {render_markdown(' '.join(question.split())[:120])}"
+                    for i, question in enumerate(questions)
+                ))
+        if st.button(f"⬆️ Muat {min(CHAT_WINDOW, history_start)} tanya-jawab sebelumnya",
+                     use_container_width=True):
+            start = max(0, history_start - CHAT_WINDOW)
+            earlier = load_earlier_messages(st.session_state.current_conversation_id, start, history_start)
+            st.session_state.current_messages = earlier + st.session_state.current_messages
+            st.session_state.history_start = start
+            st.rerun()
 
-Jawaban:"""
-            
-            response = llm.invoke(prompt)
-            return response.content
-            
-        except Exception as e:
-            st.error(f"❌ ERROR: {e}")
-            return f"Maaf, terjadi kesalahan: {str(e)}"
+    prerender_messages(st.session_state.current_messages)
+    for msg in st.session_state.current_messages:
+        with st.chat_message("user"):
+            st.write(msg["question"])
+        with st.chat_message("assistant"):
+            st.markdown(msg["markdown"])
+            caption = format_answer_caption(msg.get("metrics", {}))
+            if caption:
+                st.caption(caption)
 
 # --- MAIN APP ---
 def main():
@@ -425,6 +392,17 @@ def main():
     """, unsafe_allow_html=True)
     
     setup_environment()
+    start_metrics_endpoint()
+
+    json_file = "medical_database_structured2.json"
+
+    if not os.path.exists(json_file):
+        st.error(f"❌ ERROR: File '{json_file}' tidak ditemukan.")
+        st.info("💡 Jalankan converter: `python convert_medical_db_to_json.py`")
+        st.stop()
+
+    # Model & index dimuat di latar sementara sidebar dan riwayat dirender
+    warmup = get_warmup(json_file)
     user_id = get_or_create_user_id()
     initialize_conversation_state(user_id)
 
@@ -438,10 +416,14 @@ def main():
         
         st.divider()
         
-        conversations = get_user_conversations(user_id)
+        if 'conversation_limit' not in st.session_state:
+            st.session_state.conversation_limit = CONVERSATION_PAGE_SIZE
+        
+        total_conversations = count_user_conversations(user_id)
+        conversations = get_user_conversations(user_id, limit=st.session_state.conversation_limit)
         
         if conversations:
-            st.caption(f"📋 {len(conversations)} percakapan tersimpan")
+            st.caption(f"📋 {total_conversations} percakapan tersimpan")
             
             for conv in conversations:
                 col1, col2 = st.columns([4, 1])
@@ -457,33 +439,66 @@ def main():
                     ):
                         conv_data = load_conversation(user_id, conv['id'])
                         if conv_data:
-                            st.session_state.current_conversation_id = conv['id']
-                            st.session_state.current_messages = conv_data.get('messages', [])
-                            st.session_state.conversation_title = conv_data.get('title', 'Percakapan Baru')
+                            set_current_conversation(conv_data)
                             st.rerun()
                 
                 with col2:
                     if st.button("🗑", key=f"del_{conv['id']}"):
                         if delete_conversation(user_id, conv['id']):
                             if conv['id'] == st.session_state.current_conversation_id:
-                                remaining_convs = get_user_conversations(user_id)
+                                remaining_convs = get_user_conversations(user_id, limit=1)
                                 if remaining_convs:
                                     first_conv = remaining_convs[0]
                                     conv_data = load_conversation(user_id, first_conv['id'])
                                     if conv_data:
-                                        st.session_state.current_conversation_id = first_conv['id']
-                                        st.session_state.current_messages = conv_data.get('messages', [])
-                                        st.session_state.conversation_title = conv_data.get('title', 'Percakapan Baru')
+                                        set_current_conversation(conv_data)
                                 else:
                                     create_new_conversation()
                             st.rerun()
+            
+            if total_conversations > len(conversations):
+                if st.button("⬇️ Muat lebih banyak", use_container_width=True):
+                    st.session_state.conversation_limit += CONVERSATION_PAGE_SIZE
+                    st.rerun()
         else:
             st.info("💭 Belum ada percakapan")
         
         st.divider()
         
+        # Batasi pencarian ke satu kategori (daftar tersedia setelah database dimuat)
+        categories = sorted(warmup.case_store.category_index) if warmup.ready else []
+        st.selectbox(
+            "🗂️ Kategori kasus",
+            [None] + categories,
+            format_func=lambda category: category.replace('_', ' ') if category else "Semua kategori",
+            key="category_scope",
+            disabled=not warmup.ready,
+            help="Pilih kategori untuk mempersempit pencarian. Tanpa pilihan, kategori ditebak dari pertanyaan."
+        )
+        
+        st.divider()
+        
         # Info Groq
         st.success("⚡ Powered by rekam-medis.id")
+        
+        with st.expander("📈 Antrean LLM"):
+            llm_stats = get_llm_scheduler().stats()
+            st.caption(
+                f"Antrean: {llm_stats['queue_depth']} · Berjalan: {llm_stats['in_flight']}\n\n"
+                f"Tunggu rata-rata: {llm_stats['avg_wait_s'] * 1000:.0f} ms · "
+                f"maks: {llm_stats['max_wait_s'] * 1000:.0f} ms\n\n"
+                f"Request: {llm_stats['requests']} · Upstream: {llm_stats['upstream_calls']} · "
+                f"Digabung: {llm_stats['coalesced']} · Retry: {llm_stats['retries']}"
+            )
+        with st.expander("🚀 Status startup"):
+            warmup_status = warmup.status()
+            st.caption(
+                f"Status: {warmup_status['step']} · {warmup_status['elapsed_s']} dtk\n\n" +
+                f"Index: {warmup_status['index_key']} · dimuat ulang {warmup_status['reloads']}x\n\n" +
+                "\n\n".join(f"{step}: {ms} ms" for step, ms in warmup_status['timings_ms'].items())
+            )
+            if warmup_status['reload_error']:
+                st.warning(f"Gagal memuat ulang database: {warmup_status['reload_error']}")
         st.caption(f"🔐 Session: {user_id[:12]}...")
         
         if st.button("🔄 Reset Session", use_container_width=True):
@@ -492,31 +507,25 @@ def main():
 
     # Main content
     st.subheader(f"💬 {st.session_state.conversation_title}")
-    st.caption(f"📊 {len(st.session_state.current_messages)} pesan")
+    st.caption(f"📊 {total_message_count()} pesan")
     st.divider()
 
-    json_file = "medical_database_structured2.json"
-
-    if not os.path.exists(json_file):
-        st.error(f"❌ ERROR: File '{json_file}' tidak ditemukan.")
-        st.info("💡 Jalankan converter: `python convert_medical_db_to_json.py`")
-        st.stop()
-
     try:
-        json_data = load_json_database(json_file)
-        documents = create_smart_chunks(json_data)
-        vector_db = create_vector_store(documents)
-
-        st.success(f"✅ Database: {json_data['metadata']['total_cases']} cases | ⚡ AI LSR")
+        if warmup.error is not None:
+            st.error(f"❌ ERROR memuat database/model: {warmup.error}")
+            # Warm-up dicoba ulang pada interaksi berikutnya
+            _start_warmup.clear()
+            st.stop()
+        elif warmup.ready:
+            json_data = warmup.case_store.json_data
+            st.success(f"✅ Database: {json_data['metadata']['total_cases']} cases | ⚡ AI LSR")
+        else:
+            render_warmup_progress(warmup)
 
-        if len(st.session_state.current_messages) == 0:
+        if total_message_count() == 0:
             st.info("👋 Tanyakan tentang diagnosa, kode ICD, prosedur, atau aspek koding apapun!")
         
-        for msg in st.session_state.current_messages:
-            with st.chat_message("user"):
-                st.write(msg["question"])
-            with st.chat_message("assistant"):
-                st.markdown(msg["answer"])
+        render_chat_history()
 
         pertanyaan_user = st.chat_input("💭 Ajukan pertanyaan Anda...")
 
@@ -525,27 +534,36 @@ def main():
                 with st.chat_message("user"):
                     st.write(pertanyaan_user)
                 
-                final_answer = run_groq_rag(vector_db, json_data, pertanyaan_user)
-                
+                if not warmup.ready:
+                    with st.spinner("⏳ Menunggu model & index siap..."):
+                        warmup.wait()
+
+                stream_metrics = {}
                 with st.chat_message("assistant"):
-                    st.markdown(final_answer)
+                    final_answer = st.write_stream(
+                        stream_groq_rag(get_pipeline(json_file), pertanyaan_user, stream_metrics,
+                                        st.session_state.get("category_scope"))
+                    )
 
                 chat_entry = {
                     "question": pertanyaan_user,
                     "answer": final_answer,
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "metrics": stream_metrics
                 }
                 st.session_state.current_messages.append(chat_entry)
 
-                if len(st.session_state.current_messages) == 1:
+                if total_message_count() == 1:
                     st.session_state.conversation_title = generate_title_from_first_question(pertanyaan_user)
 
-                save_conversation(
+                save_message(
                     user_id,
                     st.session_state.current_conversation_id,
                     st.session_state.conversation_title,
-                    st.session_state.current_messages
+                    chat_entry
                 )
+                # Session hanya menyimpan jendela terakhir; sisanya dibaca dari storage saat diminta
+                trim_history()
                 
                 st.rerun()
             else:
@@ -0,0 +1,88 @@
+"""Event loop asyncio bersama untuk melayani banyak pertanyaan sekaligus.
+
+Satu thread latar menjalankan loop: retrieval berjalan di thread pool dan
+panggilan LLM memakai client async, jadi satu worker tidak lagi terblokir
+menunggu jaringan per pertanyaan. Tiap sesi punya paling banyak satu query
+aktif; query baru dari sesi yang sama (atau `cancel`) membatalkan yang lama.
+
+`answer` dan `stream` adalah wrapper sinkron untuk UI Streamlit.
+"""
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterator, Optional
+
+from rag_core import RAGEngine
+
+_DONE = object()
+
+
+class AsyncPipeline:
+    """Multiplexer query async per proses, dengan pembatalan per sesi."""
+
+    def __init__(self, engine_provider: Callable[[], RAGEngine]):
+        # Provider dipanggil tiap query, jadi engine baru (database dimuat ulang) langsung dipakai
+        self._engine_provider = engine_provider
+        self._loop = asyncio.new_event_loop()
+        self._sessions: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self._loop.run_forever, name='rag-async', daemon=True).start()
+
+    def submit(self, coro, session_id: Optional[str] = None) -> Future:
+        """Jalankan coroutine di loop; query aktif lain dari `session_id` dibatalkan."""
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        if session_id is None:
+            return future
+        with self._lock:
+            previous = self._sessions.get(session_id)
+            self._sessions[session_id] = future
+        if previous is not None:
+            previous.cancel()
+        future.add_done_callback(lambda done: self._forget(session_id, done))
+        return future
+
+    def _forget(self, session_id: str, future: Future):
+        with self._lock:
+            if self._sessions.get(session_id) is future:
+                del self._sessions[session_id]
+
+    def cancel(self, session_id: str) -> bool:
+        """Batalkan query aktif sesi ini (mis. user meninggalkan halaman)."""
+        with self._lock:
+            future = self._sessions.pop(session_id, None)
+        return future is not None and future.cancel()
+
+    def active(self) -> int:
+        """Jumlah sesi yang query-nya sedang berjalan."""
+        with self._lock:
+            return len(self._sessions)
+
+    def answer(self, query: str, session_id: Optional[str] = None, k: int = 3,
+               category: Optional[str] = None, timeout: Optional[float] = None) -> Dict:
+        """Wrapper sinkron untuk RAGEngine.aanswer."""
+        engine = self._engine_provider()
+        return self.submit(engine.aanswer(query, k=k, category=category), session_id).result(timeout)
+
+    def stream(self, query: str, metrics: Dict, session_id: Optional[str] = None, k: int = 3,
+               category: Optional[str] = None) -> Iterator[str]:
+        """Wrapper sinkron untuk RAGEngine.astream; berhenti membaca = query dibatalkan."""
+        engine = self._engine_provider()
+        chunks: queue.Queue = queue.Queue()
+
+        async def pump():
+            async for chunk in engine.astream(query, metrics, k=k, category=category):
+                chunks.put(chunk)
+
+        future = self.submit(pump(), session_id)
+        # Juga terpanggil jika task dibatalkan sebelum sempat berjalan
+        future.add_done_callback(lambda _: chunks.put(_DONE))
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is _DONE:
+                    break
+                yield chunk
+            future.result()
+        finally:
+            future.cancel()
@@ -0,0 +1,215 @@
+"""Analisis klaim massal dari file CSV/JSONL.
+
+Jalankan:
+    python batch.py klaim.csv hasil.jsonl --concurrency 4
+    python batch.py pertanyaan.jsonl hasil.jsonl --no-llm      # retrieval saja
+
+Setiap baris input berisi satu pertanyaan (kolom/field `query`) atau satu baris
+klaim; jika kolom `query` tidak ada, semua nilai baris digabung menjadi query.
+Hasil ditulis per baris ke JSONL begitu selesai, sehingga proses yang terhenti
+bisa dilanjutkan: baris yang sudah sukses di file output akan dilewati. Saat
+resume, file output dirapikan dulu: record error (dan baris terpotong) dibuang
+karena barisnya diproses ulang, jadi setiap baris input punya tepat satu record.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Iterator, Set, Tuple
+
+from dotenv import load_dotenv
+
+from rag_core import LLM_RATE_PER_MINUTE, RAGEngine, StubChatModel, create_llm, hybrid_search, load_engine
+
+
+def read_rows(input_file: str) -> Iterator[Tuple[int, Dict]]:
+    """Baca baris input secara streaming: (nomor baris, data baris)."""
+    with open(input_file, 'r', encoding='utf-8', newline='') as f:
+        if input_file.lower().endswith('.csv'):
+            for row_number, row in enumerate(csv.DictReader(f)):
+                yield row_number, row
+        else:
+            for row_number, line in enumerate(f):
+                line = line.strip()
+                if not line:
+                    continue
+                data = json.loads(line)
+                yield row_number, data if isinstance(data, dict) else {'query': str(data)}
+
+
+def row_to_query(row: Dict, column: str) -> str:
+    """Ambil query dari kolom tertentu, atau gabungkan semua nilai baris klaim."""
+    if row.get(column):
+        return str(row[column]).strip()
+    return ' '.join(str(value).strip() for value in row.values() if value).strip()
+
+
+def load_completed_rows(output_file: str) -> Set[int]:
+    """Nomor baris yang sudah sukses diproses (untuk resume).
+
+    Record error dan baris terpotong dibuang dari file output (ditulis ulang
+    secara atomik), karena baris itu akan diproses ulang dan ditulis lagi.
+    Jika satu baris punya beberapa record, yang terbaru dipakai.
+    """
+    if not os.path.exists(output_file):
+        return set()
+    latest: Dict[int, str] = {}
+    stale = 0
+    with open(output_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Baris terakhir bisa terpotong jika proses mati saat menulis
+                stale += 1
+                continue
+            if record['row'] in latest:
+                stale += 1
+            latest[record['row']] = line if line.endswith('\n') else line + '\n'
+
+    completed = {row for row, line in latest.items() if not json.loads(line).get('error')}
+    if stale or len(completed) < len(latest):
+        tmp_file = f"{output_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.writelines(latest[row] for row in sorted(completed))
+        os.replace(tmp_file, output_file)
+    return completed
+
+
+class ResultWriter:
+    """Penulis JSONL thread-safe, flush setiap baris."""
+
+    def __init__(self, output_file: str):
+        self._file = open(output_file, 'a+', encoding='utf-8')
+        # Tutup baris terakhir yang terpotong agar record baru tetap valid
+        if self._file.tell() > 0:
+            self._file.seek(self._file.tell() - 1)
+            if self._file.read(1) != '\n':
+                self._file.write('\n')
+        self._lock = threading.Lock()
+        self.written = 0
+        self.errors = 0
+
+    def write(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+            self.written += 1
+            if record.get('error'):
+                self.errors += 1
+
+    def close(self):
+        self._file.close()
+
+
+def process_row(engine: RAGEngine, row_number: int, row: Dict, query: str,
+                embedding, k: int, use_llm: bool) -> Dict:
+    """Proses satu baris: retrieval (+ jawaban LLM bila diminta)."""
+    record = {'row': row_number, 'input': row, 'query': query}
+    start = time.perf_counter()
+    try:
+        if use_llm:
+            result = engine.answer(query, k=k, query_embedding=embedding)
+            record.update(case_ids=result['case_ids'], answer=result['answer'],
+                          cache=result['cache'], path=result['path'])
+        else:
+            docs, _ = hybrid_search(engine.db, query, engine.case_store, k, embedding)
+            record['case_ids'] = [doc.metadata['id'] for doc in docs]
+            record['kode'] = [list(doc.metadata.get('kode', [])) for doc in docs]
+    except Exception as e:
+        record['error'] = str(e)
+    record['total_ms'] = round((time.perf_counter() - start) * 1000)
+    return record
+
+
+def run_batch(engine: RAGEngine, input_file: str, output_file: str, column: str = 'query',
+              k: int = 3, concurrency: int = 4, batch_size: int = 64, use_llm: bool = True) -> Dict:
+    """Proses seluruh file input; return ringkasan jumlah baris."""
+    completed = load_completed_rows(output_file)
+    writer = ResultWriter(output_file)
+    skipped = 0
+    start = time.perf_counter()
+
+    rows = read_rows(input_file)
+    try:
+        # Jumlah worker dibatasi; laju panggilan LLM tetap diatur LLMScheduler
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+
+                pending = []
+                for row_number, row in batch:
+                    if row_number in completed:
+                        skipped += 1
+                        continue
+                    query = row_to_query(row, column)
+                    if not query:
+                        writer.write({'row': row_number, 'input': row, 'error': "query kosong"})
+                        continue
+                    pending.append((row_number, row, query))
+
+                # Satu panggilan embedding untuk semua query batch yang membutuhkannya
+                need = [query for _, _, query in pending if engine.needs_embedding(query, k, use_llm)]
+                embeddings = dict(zip(need, engine.embed_queries(need)))
+
+                futures = [
+                    pool.submit(process_row, engine, row_number, row, query,
+                                embeddings.get(query), k, use_llm)
+                    for row_number, row, query in pending
+                ]
+                for future in futures:
+                    writer.write(future.result())
+                print(f"... {writer.written} baris diproses, {skipped} dilewati", file=sys.stderr)
+    finally:
+        writer.close()
+
+    return {
+        'processed': writer.written,
+        'errors': writer.errors,
+        'skipped': skipped,
+        'elapsed_s': round(time.perf_counter() - start, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analisis klaim INA-CBG massal (CSV/JSONL)")
+    parser.add_argument('input_file')
+    parser.add_argument('output_file')
+    parser.add_argument('--json-file', default='medical_database_structured2.json')
+    parser.add_argument('--column', default='query', help="kolom/field berisi pertanyaan")
+    parser.add_argument('-k', type=int, default=3, help="jumlah case per query")
+    parser.add_argument('--concurrency', type=int, default=4, help="maksimum panggilan paralel")
+    parser.add_argument('--batch-size', type=int, default=64, help="query per batch embedding")
+    parser.add_argument('--no-llm', action='store_true', help="retrieval saja, tanpa jawaban LLM")
+    parser.add_argument('--stub-llm', action='store_true', help="pakai LLM palsu deterministik")
+    parser.add_argument('--llm-rate', type=float, default=LLM_RATE_PER_MINUTE,
+                        help="batas request LLM per menit")
+    args = parser.parse_args()
+
+    client_factory = create_llm
+    if args.stub_llm:
+        client_factory = StubChatModel
+    elif not args.no_llm:
+        load_dotenv()
+        if not os.getenv("GROQ_API_KEY"):
+            sys.exit("GROQ_API_KEY tidak ditemukan (set di .env, atau pakai --no-llm/--stub-llm)")
+
+    engine = load_engine(args.json_file, client_factory, rate_per_minute=args.llm_rate)
+    summary = run_batch(
+        engine, args.input_file, args.output_file,
+        column=args.column, k=args.k, concurrency=args.concurrency,
+        batch_size=args.batch_size, use_llm=not args.no_llm
+    )
+    print(json.dumps(summary))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,479 @@
+"""Benchmark retrieval + end-to-end dari database bawaan (tanpa Groq).
+
+Jalankan:
+    python benchmark.py --output bench/hasil.json
+    python benchmark.py --output bench/baru.json --compare bench/hasil.json
+    python benchmark.py --parity onnx-int8 --parity-tolerance 0.9   # backend vs fp32
+    python benchmark.py --fake-llm-server --stub-latency 0.5        # client Groq asli ke server palsu
+
+Query berlabel diturunkan dari setiap case (`diagnosa_utama`, `keywords`,
+`kode_diagnosa`); `contoh_pertanyaan` dipakai untuk latensi/throughput.
+LLM diganti `StubChatModel` deterministik sehingga hasil bisa dibandingkan
+antar commit. Dengan `--fake-llm-server`, client Groq asli (sync dan async)
+dipanggil lewat HTTP ke `fake_llm_server.py` sehingga throughput N user
+mencakup jalur jaringan.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+import rag_core
+from answer_cache import AnswerCache
+from metrics import REGISTRY
+from rag_core import (
+    CHUNK_TEMPLATE, EMBEDDING_MODEL_NAME, RAGEngine, StubChatModel,
+    build_case_store, create_embedding_model, create_llm, create_llm_scheduler, create_vector_store
+)
+
+KS = (1, 3, 5, 10)
+CONCURRENCY_LEVELS = (1, 4, 8, 16)
+
+
+def build_labeled_queries(json_data: Dict) -> List[Dict]:
+    """Query berlabel: teks query + himpunan ID case yang relevan + kategori asal."""
+    cases = json_data['cases']
+    by_diagnosa: Dict[str, List[str]] = {}
+    by_code: Dict[str, List[str]] = {}
+    for case in cases:
+        by_diagnosa.setdefault(case['diagnosa_utama'].strip().lower(), []).append(case['id'])
+        for code in case['kode_diagnosa']:
+            by_code.setdefault(code, []).append(case['id'])
+
+    queries = []
+    seen = set()
+
+    def add(kind: str, text: str, relevant: Sequence[str], category: str):
+        text = text.strip()
+        if text and (kind, text.lower()) not in seen:
+            seen.add((kind, text.lower()))
+            queries.append({'kind': kind, 'query': text, 'relevant': sorted(set(relevant)),
+                            'kategori': category})
+
+    for case in cases:
+        diagnosa = case['diagnosa_utama'].strip()
+        add('diagnosa_utama', diagnosa, by_diagnosa[diagnosa.lower()], case['kategori'])
+        if case['keywords']:
+            add('keywords', ' '.join(case['keywords'][:3]), [case['id']], case['kategori'])
+        if case['kode_diagnosa']:
+            code = case['kode_diagnosa'][0]
+            add('kode', f"kode {code}", by_code[code], case['kategori'])
+    return queries
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))], 3)
+
+    return {
+        'p50_ms': pick(0.5), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99),
+        'mean_ms': round(sum(ordered) / len(ordered), 3), 'max_ms': round(ordered[-1], 3),
+    }
+
+
+def evaluate_retrieval(search: Callable[[str, int], List[str]], queries: List[Dict],
+                       ks: Sequence[int] = KS, case_categories: Dict[str, str] = None) -> Dict:
+    """Recall@k, MRR dan latensi untuk satu fungsi search(query, k) -> [case_id].
+
+    Dengan `case_categories` (ID case -> kategori) dihitung juga off_topic@3:
+    porsi hasil top-3 yang kategorinya beda dengan kategori query.
+    """
+    max_k = max(ks)
+    latencies = []
+    off_topic = 0.0
+    recall = {k: 0.0 for k in ks}
+    reciprocal_ranks = 0.0
+    per_kind: Dict[str, Dict] = {}
+
+    for item in queries:
+        start = time.perf_counter()
+        ranked = search(item['query'], max_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        relevant = set(item['relevant'])
+        kind_stats = per_kind.setdefault(item['kind'], {'n': 0, 'hits_at_3': 0, 'rr': 0.0})
+        kind_stats['n'] += 1
+        for k in ks:
+            hits = len(relevant.intersection(ranked[:k]))
+            recall[k] += hits / min(len(relevant), k)
+        if case_categories and ranked[:3]:
+            off_topic += sum(case_categories[case_id] != item['kategori'] for case_id in ranked[:3]) / len(ranked[:3])
+        rank = next((i + 1 for i, case_id in enumerate(ranked) if case_id in relevant), None)
+        if rank:
+            reciprocal_ranks += 1 / rank
+            kind_stats['rr'] += 1 / rank
+            if rank <= 3:
+                kind_stats['hits_at_3'] += 1
+
+    n = len(queries) or 1
+    return {
+        'queries': len(queries),
+        **{f"recall@{k}": round(recall[k] / n, 4) for k in ks},
+        'mrr': round(reciprocal_ranks / n, 4),
+        **({'off_topic@3': round(off_topic / n, 4)} if case_categories else {}),
+        'latency': percentiles(latencies),
+        'per_kind': {
+            kind: {'queries': stats['n'], 'hit@3': round(stats['hits_at_3'] / stats['n'], 4),
+                   'mrr': round(stats['rr'] / stats['n'], 4)}
+            for kind, stats in per_kind.items()
+        },
+    }
+
+
+def measure_throughput(engine: RAGEngine, queries: List[str], concurrency: int) -> Dict:
+    """Throughput end-to-end (retrieval + LLM stub) pada satu level konkurensi."""
+    latencies = []
+
+    def run(query):
+        start = time.perf_counter()
+        engine.answer(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, queries))
+    elapsed = time.perf_counter() - start
+    return {
+        'concurrency': concurrency,
+        'requests': len(queries),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(queries) / elapsed, 2) if elapsed else None,
+        'latency': percentiles(latencies),
+    }
+
+
+async def measure_async_throughput(engine: RAGEngine, queries: List[str], concurrency: int) -> Dict:
+    """Seperti measure_throughput, tapi N user dilayani satu event loop (RAGEngine.aanswer)."""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(query):
+        async with semaphore:
+            start = time.perf_counter()
+            await engine.aanswer(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run(query) for query in queries))
+    elapsed = time.perf_counter() - start
+    return {
+        'concurrency': concurrency,
+        'requests': len(queries),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(queries) / elapsed, 2) if elapsed else None,
+        'latency': percentiles(latencies),
+    }
+
+
+def embedding_parity(documents: Sequence, queries: List[Dict], backend: str,
+                     k: int = 5, latency_samples: int = 50) -> Dict:
+    """Bandingkan backend embedding dengan fp32: kemiripan vektor, overlap top-k, recall, latensi."""
+    texts = [doc.page_content for doc in documents]
+    metadatas = [doc.metadata for doc in documents]
+    query_texts = [item['query'] for item in queries]
+    runs = {}
+    for name in ('torch', backend):
+        start = time.perf_counter()
+        model = create_embedding_model(name)
+        load_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        doc_vectors = model.embed_documents(texts)
+        index_s = time.perf_counter() - start
+        db = FAISS.from_embeddings(list(zip(texts, doc_vectors)), model, metadatas=metadatas)
+
+        start = time.perf_counter()
+        query_vectors = model.embed_documents(query_texts)
+        batch_s = time.perf_counter() - start
+
+        single = []
+        for text in query_texts[:latency_samples]:
+            start = time.perf_counter()
+            model.embed_query(text)
+            single.append((time.perf_counter() - start) * 1000)
+
+        vectors = dict(zip(query_texts, query_vectors))
+        top = {text: [doc.metadata['id'] for doc in db.similarity_search_by_vector(vectors[text], k=k)]
+               for text in query_texts}
+        runs[name] = {
+            'vectors': np.asarray(query_vectors, dtype=np.float32),
+            'top': top,
+            'report': {
+                'model_load_s': round(load_s, 3),
+                'index_embed_s': round(index_s, 3),
+                'query_batch_qps': round(len(query_texts) / batch_s, 1) if batch_s else None,
+                'query_latency': percentiles(single),
+                'retrieval': evaluate_retrieval(lambda text, n: top[text][:n], queries, ks=(1, 3, k)),
+            },
+        }
+
+    reference, candidate = runs['torch'], runs[backend]
+    a, b = reference['vectors'], candidate['vectors']
+    cosine = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) + 1e-12)
+    overlap = [len(set(reference['top'][text]) & set(candidate['top'][text])) / k for text in query_texts]
+    return {
+        'backend': backend,
+        'k': k,
+        'cosine_mean': round(float(cosine.mean()), 4),
+        'cosine_min': round(float(cosine.min()), 4),
+        f'overlap@{k}': round(sum(overlap) / len(overlap), 4),
+        'fp32': reference['report'],
+        'candidate': candidate['report'],
+    }
+
+
+def measure_import_times(modules: Sequence[str]) -> Dict[str, float]:
+    """Waktu import dingin (proses baru) per modul, dalam detik."""
+    results = {}
+    for module_name in modules:
+        code = (f"import time; start = time.perf_counter(); import {module_name}; "
+                f"print(time.perf_counter() - start)")
+        try:
+            output = subprocess.check_output([sys.executable, '-c', code], text=True,
+                                             stderr=subprocess.DEVNULL)
+            results[module_name] = round(float(output.strip().splitlines()[-1]), 3)
+        except Exception as e:
+            print(f"Error measuring import {module_name}: {e}", file=sys.stderr)
+    return results
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS proses ini (MB)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux melaporkan KB, macOS melaporkan byte
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return 'unknown'
+
+
+def compare(current: Dict, previous: Dict) -> List[str]:
+    """Baris ringkas selisih metrik utama terhadap hasil sebelumnya."""
+    lines = [f"Dibanding {previous.get('git_revision')} ({previous.get('timestamp')}):"]
+    for name, section in current['retrieval'].items():
+        before = previous.get('retrieval', {}).get(name)
+        if not before:
+            continue
+        for metric in ('recall@1', 'recall@3', 'mrr'):
+            delta = section[metric] - before.get(metric, 0)
+            lines.append(f"  {name} {metric}: {before.get(metric)} -> {section[metric]} ({delta:+.4f})")
+        p95_before = before.get('latency', {}).get('p95_ms')
+        lines.append(f"  {name} p95: {p95_before} -> {section['latency'].get('p95_ms')} ms")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval & end-to-end RAG")
+    parser.add_argument('--json-file', default='medical_database_structured2.json')
+    parser.add_argument('--output', default=None, help="simpan hasil JSON ke path ini")
+    parser.add_argument('--compare', default=None, help="hasil JSON sebelumnya untuk dibandingkan")
+    parser.add_argument('--stub-latency', type=float, default=0.05, help="latensi LLM palsu (detik)")
+    parser.add_argument('--throughput-queries', type=int, default=64)
+    parser.add_argument('--fake-llm-server', action='store_true',
+                        help="pakai client Groq asli ke server LLM palsu lokal (latensi = --stub-latency)")
+    parser.add_argument('--limit', type=int, default=None, help="batasi jumlah query berlabel")
+    parser.add_argument('--parity', default=None, metavar='BACKEND',
+                        help="bandingkan backend embedding ini dengan fp32 (torch)")
+    parser.add_argument('--parity-tolerance', type=float, default=0.9,
+                        help="overlap top-k minimum terhadap fp32 agar lolos")
+    parser.add_argument('--rerank', action='store_true',
+                        help="ukur juga re-ranking cross-encoder (otomatis jika RAG_RERANK=1)")
+    args = parser.parse_args()
+
+    result = {
+        'timestamp': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'config': {
+            'embedding_model': EMBEDDING_MODEL_NAME,
+            'embedding_backend': rag_core.EMBEDDING_BACKEND,
+            'embedding_threads': rag_core.EMBEDDING_THREADS,
+            'category_inference': rag_core.CATEGORY_INFERENCE,
+            'chunk_template_sha': hashlib.sha256(CHUNK_TEMPLATE.encode('utf-8')).hexdigest()[:12],
+            'search_candidates': rag_core.SEARCH_CANDIDATES,
+            'rrf_k': rag_core.RRF_K,
+            'fusion_weights': list(rag_core.FUSION_WEIGHTS),
+            'sparse_shortcut_margin': rag_core.SPARSE_SHORTCUT_MARGIN,
+            'context_token_budget': rag_core.CONTEXT_TOKEN_BUDGET,
+            'rerank_enabled': rag_core.RERANK_ENABLED,
+        },
+    }
+
+    # Waktu build: parse + chunk + index kode/BM25, lalu embedding penuh (tanpa cache disk)
+    start = time.perf_counter()
+    case_store = build_case_store(args.json_file)
+    case_store_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    embedding_model = create_embedding_model()
+    model_load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dense_db = FAISS.from_documents(list(case_store.documents), embedding_model)
+    embed_build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    db = create_vector_store(case_store.documents, case_store.index_key)
+    load_s = time.perf_counter() - start
+
+    result['import_s'] = measure_import_times(('rag_core',) + rag_core.HEAVY_MODULES)
+    result['build'] = {
+        'cases': len(case_store.documents),
+        'case_store_s': round(case_store_s, 3),
+        'model_load_s': round(model_load_s, 3),
+        'full_embedding_build_s': round(embed_build_s, 3),
+        'saved_index_load_s': round(load_s, 3),
+    }
+    if rag_core.SHARED_STORE_DIR:
+        # Mode multi-proses: evaluasi memakai store yang di-mmap (buka = tanpa parsing)
+        rag_core.open_shared_store(args.json_file)
+        start = time.perf_counter()
+        case_store, db = rag_core.open_shared_store(args.json_file)
+        result['build']['shared_store_open_s'] = round(time.perf_counter() - start, 3)
+
+    queries = build_labeled_queries(case_store.json_data)
+    if args.limit:
+        queries = queries[:args.limit]
+
+    def dense_only(query, k):
+        return [doc.metadata['id'] for doc in dense_db.similarity_search(query, k=k)]
+
+    def hybrid(query, k):
+        return [doc.metadata['id'] for doc in rag_core.smart_search(db, query, case_store, k=k)]
+
+    # Kategori eksplisit per query (seperti dipilih di UI/API)
+    scoped_category = {item['query']: item['kategori'] for item in queries}
+
+    def hybrid_scoped(query, k):
+        docs = rag_core.smart_search(db, query, case_store, k=k, category=scoped_category[query])
+        return [doc.metadata['id'] for doc in docs]
+
+    case_categories = {doc.metadata['id']: doc.metadata['kategori'] for doc in case_store.documents}
+    inference, rerank = rag_core.CATEGORY_INFERENCE, rag_core.RERANK_ENABLED
+    try:
+        # Baseline selalu tanpa re-rank supaya selisihnya terlihat
+        rag_core.RERANK_ENABLED = False
+        rag_core.CATEGORY_INFERENCE = False
+        unscoped = evaluate_retrieval(hybrid, queries, case_categories=case_categories)
+        rag_core.CATEGORY_INFERENCE = inference
+        result['retrieval'] = {
+            'dense_only': evaluate_retrieval(dense_only, queries),
+            'smart_search_unscoped': unscoped,
+            'smart_search': evaluate_retrieval(hybrid, queries, case_categories=case_categories),
+            'smart_search_category': evaluate_retrieval(hybrid_scoped, queries, case_categories=case_categories),
+        }
+
+        if args.rerank or rerank:
+            rag_core.RERANK_ENABLED = True
+            rag_core.get_reranker().load()
+            timeouts = REGISTRY.snapshot()['counters'].get('rerank.timeout', 0)
+            cold = evaluate_retrieval(hybrid, queries, case_categories=case_categories)
+            timeouts = REGISTRY.snapshot()['counters'].get('rerank.timeout', 0) - timeouts
+            # Putaran kedua: semua skor (query, case) sudah ada di cache
+            warm = evaluate_retrieval(hybrid, queries, case_categories=case_categories)
+            base = result['retrieval']['smart_search']
+            result['retrieval']['smart_search_rerank'] = cold
+            result['rerank'] = {
+                'model': rag_core.get_reranker().model_name,
+                'candidates': rag_core.RERANK_CANDIDATES,
+                'budget_ms': rag_core.RERANK_BUDGET_MS,
+                'timeouts': timeouts,
+                **{f"{metric}_gain": round(cold[metric] - base[metric], 4)
+                   for metric in ('recall@1', 'recall@3', 'mrr')},
+                **{f"{q}_cost_ms": round(cold['latency'][f"{q}_ms"] - base['latency'][f"{q}_ms"], 3)
+                   for q in ('p50', 'p95')},
+                'cached_p95_ms': warm['latency']['p95_ms'],
+            }
+    finally:
+        rag_core.CATEGORY_INFERENCE, rag_core.RERANK_ENABLED = inference, rerank
+
+    # End-to-end dengan LLM palsu; cache jawaban di file sementara agar tidak ada hit
+    examples = list(case_store.json_data.get('contoh_pertanyaan', []))
+    pool = examples + [item['query'] for item in queries]
+    client_factory = lambda: StubChatModel(latency=args.stub_latency)
+    if args.fake_llm_server:
+        from fake_llm_server import start_fake_llm_server
+        fake_server, base_url = start_fake_llm_server(latency=args.stub_latency)
+        os.environ['GROQ_API_BASE'] = base_url
+        os.environ.setdefault('GROQ_API_KEY', 'palsu')
+        client_factory = create_llm
+    loop = asyncio.new_event_loop()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = RAGEngine(
+                case_store,
+                db,
+                create_llm_scheduler(client_factory, rate_per_minute=1e9),
+                AnswerCache(os.path.join(tmp, 'answers.sqlite3'), case_store.index_key)
+            )
+
+            def level_queries(tag: str, level: int) -> List[str]:
+                # Akhiran unik per level supaya tidak ada cache hit/coalescing antar level
+                return [pool[i % len(pool)] + f" #{tag}{level}.{i}" for i in range(args.throughput_queries)]
+
+            result['end_to_end'] = {
+                'stub_latency_s': args.stub_latency,
+                'llm': 'fake_server' if args.fake_llm_server else 'stub',
+                'levels': [
+                    measure_throughput(engine, level_queries('', level), level)
+                    for level in CONCURRENCY_LEVELS
+                ],
+                # Satu event loop untuk semua level: client async terikat ke loop-nya
+                'async_levels': [
+                    loop.run_until_complete(measure_async_throughput(engine, level_queries('a', level), level))
+                    for level in CONCURRENCY_LEVELS
+                ],
+            }
+    finally:
+        loop.close()
+        if args.fake_llm_server:
+            fake_server.shutdown()
+
+    parity_failed = False
+    if args.parity:
+        parity = embedding_parity(case_store.documents, queries, args.parity)
+        parity['tolerance'] = args.parity_tolerance
+        parity['passed'] = parity[f"overlap@{parity['k']}"] >= args.parity_tolerance
+        parity_failed = not parity['passed']
+        result['parity'] = parity
+
+    # Rincian per tahap (span) dari seluruh run, untuk mencari bottleneck
+    result['stages'] = REGISTRY.snapshot()['stages']
+    result['peak_rss_mb'] = peak_rss_mb()
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            print("\n".join(compare(result, json.load(f))))
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if parity_failed:
+        sys.exit(f"Parity {args.parity} gagal: overlap di bawah {args.parity_tolerance}")
+
+
+if __name__ == '__main__':
+    main()
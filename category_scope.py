@@ -0,0 +1,62 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+
+from sparse_index import tokenize
+
+# Kategori penampung: tidak pernah ditebak dari query
+GENERIC_CATEGORY = 'umum'
+# Kata di nama kategori yang terlalu umum untuk dijadikan penanda
+GENERIC_NAME_WORDS = {
+    'sistem', 'penyakit', 'dan', 'lain', 'gejala', 'tanda', 'klinis', 'faktor',
+    'risiko', 'kesehatan', 'trauma', 'infeksi', 'gangguan'
+}
+MIN_TERM_CASES = 2   # term dari keywords harus muncul di >= 2 case kategori itu
+
+
+def build_category_index(json_data: Dict) -> Dict[str, List[str]]:
+    """kategori -> ID case."""
+    index: Dict[str, List[str]] = {}
+    for case in json_data['cases']:
+        index.setdefault(case['kategori'], []).append(case['id'])
+    return index
+
+
+def build_category_terms(json_data: Dict) -> Dict[str, str]:
+    """Term penanda -> kategori, untuk menebak kategori dari query.
+
+    Term diambil dari nama kategori, keywords dan diagnosa_utama. Term hanya
+    dipakai jika semua case yang memuatnya ada di satu kategori yang sama
+    (bukan 'umum'), jadi tebakan tidak pernah membuang case kategori lain
+    yang juga relevan.
+    """
+    term_categories: Dict[str, Set[str]] = defaultdict(set)
+    term_cases: Dict[str, int] = defaultdict(int)
+    for case in json_data['cases']:
+        text = ' '.join(case.get('keywords') or []) + ' ' + (case.get('diagnosa_utama') or '')
+        for term in set(tokenize(text)):
+            term_categories[term].add(case['kategori'])
+            term_cases[term] += 1
+
+    name_terms = {
+        term: category
+        for category in {case['kategori'] for case in json_data['cases']}
+        for term in tokenize(category.replace('_', ' '))
+        if term not in GENERIC_NAME_WORDS
+    }
+
+    terms = {}
+    for term, categories in term_categories.items():
+        if len(categories) != 1:
+            continue
+        category = next(iter(categories))
+        if category == GENERIC_CATEGORY:
+            continue
+        if term_cases[term] >= MIN_TERM_CASES or name_terms.get(term) == category:
+            terms[term] = category
+    return terms
+
+
+def infer_category(query: str, category_terms: Dict[str, str]) -> Optional[str]:
+    """Kategori query jika semua term penandanya menunjuk satu kategori; selain itu None."""
+    categories = {category_terms[term] for term in tokenize(query) if term in category_terms}
+    return categories.pop() if len(categories) == 1 else None
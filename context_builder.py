@@ -0,0 +1,129 @@
+import re
+from typing import Dict, List, Sequence, Set, Tuple
+
+CHARS_PER_TOKEN = 4          # perkiraan kasar untuk teks Indonesia/Inggris campur
+TRUNCATED = '…'
+DEDUPLICATED = "(sebagian sama dengan kasus di atas)"
+
+# Urutan prioritas field saat budget menipis (paling penting dulu)
+FIELD_PRIORITY = ('aspek_koding', 'perhatian_khusus', 'prosedur', 'diagnosa')
+# Urutan tampil di prompt; field kosong tidak ditulis
+FIELD_LABELS = (
+    ('diagnosa', 'KETERANGAN'),
+    ('prosedur', 'PROSEDUR'),
+    ('aspek_koding', 'ASPEK KODING'),
+    ('perhatian_khusus', 'PERHATIAN KHUSUS'),
+)
+
+_SENTENCE_PATTERN = re.compile(r'(?<=[.!?;])\s+')
+_NORMALIZE_PATTERN = re.compile(r'[\W_]+')
+
+
+def estimate_tokens(text: str) -> int:
+    """Perkiraan jumlah token tanpa tokenizer (±4 karakter per token)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_PATTERN.split(text or '') if s.strip()]
+
+
+def _sentence_key(sentence: str) -> str:
+    return _NORMALIZE_PATTERN.sub(' ', sentence.lower()).strip()
+
+
+class _CaseBlock:
+    """Isi konteks satu case yang sedang dirakit."""
+
+    def __init__(self, meta: Dict, codes: List[str], repeated_codes: int):
+        self.meta = meta
+        self.codes = codes
+        self.repeated_codes = repeated_codes
+        self.fields: Dict[str, List[str]] = {field: [] for field in FIELD_PRIORITY}
+        self.truncated: Set[str] = set()
+        self.deduplicated: Set[str] = set()
+        self.title = (meta.get('diagnosa_utama') or '').strip()
+        if not self.title:
+            # Case hasil match kode bisa tanpa diagnosa_utama: pakai kalimat pertama diagnosa
+            self.title = next(iter(split_sentences(meta.get('diagnosa') or '')), 'N/A')
+
+    def extra_cost(self, field: str, text: str) -> int:
+        """Token tambahan jika `text` ditambahkan ke field (termasuk label baris)."""
+        cost = estimate_tokens(text) + 1
+        if not self.fields[field] and field not in self.truncated and field not in self.deduplicated:
+            cost += estimate_tokens(dict(FIELD_LABELS)[field]) + 2
+        return cost
+
+    def header(self) -> str:
+        codes = ', '.join(self.codes) or '-'
+        if self.repeated_codes:
+            codes += f" (+{self.repeated_codes} kode sama dengan kasus di atas)"
+        return f"DIAGNOSA: {self.title}\nKODE ICD: {codes}"
+
+    def render(self) -> str:
+        lines = [self.header()]
+        for field, label in FIELD_LABELS:
+            parts = list(self.fields[field])
+            if field in self.deduplicated:
+                parts.append(DEDUPLICATED)
+            if field in self.truncated:
+                parts.append(TRUNCATED)
+            if parts:
+                lines.append(f"{label}: {' '.join(parts)}")
+        return "\n".join(lines) + "\n---"
+
+
+def build_context(docs: Sequence, token_budget: int) -> Tuple[str, int]:
+    """Rakit konteks prompt dari dokumen (urut relevansi) dalam batas token.
+
+    - Header (diagnosa + kode) case dimasukkan lebih dulu, selama muat.
+    - Sisa budget diisi per kalimat: case paling relevan dulu, field sesuai
+      FIELD_PRIORITY; kalimat yang tidak muat membuat field ditandai terpotong.
+    - Kalimat dan kode yang sudah muncul di case sebelumnya tidak diulang.
+
+    Return (teks konteks, perkiraan token).
+    """
+    seen_codes: Set[str] = set()
+    blocks = []
+    used = 0
+    for doc in docs:
+        meta = doc.metadata
+        codes = [code for code in meta.get('kode', []) if code not in seen_codes]
+        block = _CaseBlock(meta, codes, len(meta.get('kode', [])) - len(codes))
+        cost = estimate_tokens(block.render()) + 1
+        # Case paling relevan selalu masuk; sisanya hanya jika header-nya muat
+        if blocks and used + cost > token_budget:
+            break
+        seen_codes.update(codes)
+        blocks.append(block)
+        used += cost
+    seen_sentences: Set[str] = set()
+    for block in blocks:
+        for field in FIELD_PRIORITY:
+            sentences = split_sentences(block.meta.get(field) or '')
+            if field == 'diagnosa':
+                sentences = [s for s in sentences if s != block.title]
+            for sentence in sentences:
+                key = _sentence_key(sentence)
+                if not key:
+                    continue
+                if key in seen_sentences:
+                    if field not in block.deduplicated:
+                        cost = block.extra_cost(field, DEDUPLICATED)
+                        if used + cost <= token_budget:
+                            block.deduplicated.add(field)
+                            used += cost
+                    continue
+                cost = block.extra_cost(field, sentence)
+                if used + cost > token_budget:
+                    cost = block.extra_cost(field, TRUNCATED)
+                    if used + cost <= token_budget:
+                        block.truncated.add(field)
+                        used += cost
+                    break
+                seen_sentences.add(key)
+                block.fields[field].append(sentence)
+                used += cost
+
+    context = "\n".join(block.render() for block in blocks)
+    return context, estimate_tokens(context)
@@ -0,0 +1,217 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+DEFAULT_TITLE = 'Percakapan Baru'
+
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class ConversationStore:
+    """Penyimpanan riwayat chat di SQLite.
+
+    Metadata percakapan (judul, waktu, jumlah pesan) disimpan terpisah dari
+    pesan, jadi daftar sidebar cukup membaca satu tabel kecil yang ter-index,
+    dan menambah pesan hanya berupa satu INSERT (tanpa menulis ulang riwayat).
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    created TEXT NOT NULL,
+                    updated TEXT NOT NULL,
+                    message_count INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS conversations_user_updated
+                    ON conversations(user_id, updated DESC);
+                CREATE TABLE IF NOT EXISTS messages (
+                    conversation_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    extra TEXT,
+                    PRIMARY KEY (conversation_id, seq)
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+
+    def count_conversations(self, user_id: str) -> int:
+        """Jumlah percakapan (yang sudah berisi pesan) milik user."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM conversations WHERE user_id = ? AND message_count > 0",
+                (user_id,)
+            ).fetchone()[0]
+
+    def list_conversations(self, user_id: str, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """Satu halaman daftar percakapan, terbaru di atas."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, title, created, updated, message_count FROM conversations "
+                "WHERE user_id = ? AND message_count > 0 "
+                "ORDER BY updated DESC LIMIT ? OFFSET ?",
+                (user_id, limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def load_conversation(self, user_id: str, conversation_id: str,
+                          limit: Optional[int] = None) -> Optional[Dict]:
+        """Metadata + pesan satu percakapan (hanya `limit` pesan terakhir jika diisi).
+
+        `first_seq` adalah nomor urut pesan pertama yang dimuat; pesan sebelumnya
+        bisa diambil dengan `load_messages`.
+        """
+        with self._lock:
+            conv = self._conn.execute(
+                "SELECT id, title, created, updated, message_count FROM conversations "
+                "WHERE id = ? AND user_id = ?",
+                (conversation_id, user_id)
+            ).fetchone()
+            if conv is None:
+                return None
+            start = 0 if limit is None else max(0, conv['message_count'] - limit)
+            rows = self._conn.execute(
+                "SELECT question, answer, timestamp, extra FROM messages "
+                "WHERE conversation_id = ? AND seq >= ? ORDER BY seq",
+                (conversation_id, start)
+            ).fetchall()
+        data = dict(conv)
+        data['first_seq'] = start
+        data['messages'] = [self._row_to_message(row) for row in rows]
+        return data
+
+    def load_messages(self, conversation_id: str, start: int, end: int) -> List[Dict]:
+        """Pesan dengan nomor urut `start` <= seq < `end` (paging riwayat ke belakang)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question, answer, timestamp, extra FROM messages "
+                "WHERE conversation_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (conversation_id, start, end)
+            ).fetchall()
+        return [self._row_to_message(row) for row in rows]
+
+    def list_questions(self, conversation_id: str, end: int, limit: int) -> List[str]:
+        """Pertanyaan terakhir sebelum seq `end` (untuk ringkasan riwayat lama), urut lama ke baru."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question FROM messages WHERE conversation_id = ? AND seq < ? "
+                "ORDER BY seq DESC LIMIT ?",
+                (conversation_id, end, limit)
+            ).fetchall()
+        return [row['question'] for row in reversed(rows)]
+
+    @staticmethod
+    def _row_to_message(row) -> Dict:
+        message = json.loads(row['extra']) if row['extra'] else {}
+        message.update(question=row['question'], answer=row['answer'], timestamp=row['timestamp'])
+        return message
+
+    def append_message(self, user_id: str, conversation_id: str, title: str, message: Dict):
+        """Tambah satu pesan (O(1)) dan perbarui metadata percakapan."""
+        extra = {key: value for key, value in message.items()
+                 if key not in ('question', 'answer', 'timestamp')}
+        now = _now()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO conversations (id, user_id, title, created, updated, message_count) "
+                "VALUES (?, ?, ?, ?, ?, 0) ON CONFLICT(id) DO NOTHING",
+                (conversation_id, user_id, title, now, now)
+            )
+            seq = self._conn.execute(
+                "SELECT message_count FROM conversations WHERE id = ?", (conversation_id,)
+            ).fetchone()[0]
+            self._conn.execute(
+                "INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?)",
+                (conversation_id, seq, message['question'], message['answer'],
+                 message.get('timestamp') or now, json.dumps(extra, ensure_ascii=False) if extra else None)
+            )
+            self._conn.execute(
+                "UPDATE conversations SET title = ?, updated = ?, message_count = ? WHERE id = ?",
+                (title, now, seq + 1, conversation_id)
+            )
+
+    def delete_conversation(self, user_id: str, conversation_id: str) -> bool:
+        """Hapus percakapan beserta pesannya."""
+        with self._lock, self._conn:
+            deleted = self._conn.execute(
+                "DELETE FROM conversations WHERE id = ? AND user_id = ?", (conversation_id, user_id)
+            ).rowcount
+            if deleted:
+                self._conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+        return bool(deleted)
+
+    def import_conversation(self, user_id: str, data: Dict) -> bool:
+        """Impor satu percakapan format JSON lama (dilewati jika ID sudah ada)."""
+        messages = data.get('messages') or []
+        now = _now()
+        with self._lock, self._conn:
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO conversations VALUES (?, ?, ?, ?, ?, ?)",
+                (data['id'], user_id, data.get('title') or DEFAULT_TITLE,
+                 data.get('created') or now, data.get('updated') or now, len(messages))
+            ).rowcount
+            if not inserted:
+                return False
+            for seq, message in enumerate(messages):
+                extra = {key: value for key, value in message.items()
+                         if key not in ('question', 'answer', 'timestamp')}
+                self._conn.execute(
+                    "INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?)",
+                    (data['id'], seq, message.get('question', ''), message.get('answer', ''),
+                     message.get('timestamp') or now,
+                     json.dumps(extra, ensure_ascii=False) if extra else None)
+                )
+        return True
+
+    def migrate_json_histories(self, history_dir: str) -> int:
+        """Migrasi sekali dari `history_dir/<user_id>/<conv_id>.json` (format lama).
+
+        File JSON lama tidak dihapus. Return jumlah percakapan yang diimpor.
+        """
+        with self._lock:
+            done = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'json_migrated'"
+            ).fetchone()
+        if done or not os.path.isdir(history_dir):
+            return 0
+
+        imported = 0
+        for user_id in os.listdir(history_dir):
+            user_dir = os.path.join(history_dir, user_id)
+            if not os.path.isdir(user_dir):
+                continue
+            for filename in os.listdir(user_dir):
+                if not filename.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(user_dir, filename), 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    data.setdefault('id', filename[:-len('.json')])
+                    if self.import_conversation(user_id, data):
+                        imported += 1
+                except Exception as e:
+                    print(f"Error migrating conversation {filename}: {e}")
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('json_migrated', ?)", (_now(),)
+            )
+        return imported
@@ -0,0 +1,77 @@
+"""Backend embedding yang bisa dipilih untuk CPU.
+
+- `torch`      : model PyTorch fp32 (sama dengan HuggingFaceEmbeddings sebelumnya)
+- `torch-int8` : kuantisasi dinamis int8 layer Linear (tanpa file tambahan)
+- `onnx`       : ONNX Runtime, ekspor fp32 dari model yang sama
+- `onnx-int8`  : ONNX Runtime, ekspor terkuantisasi int8
+
+Semua backend memakai model yang sama dan encoding batch; jumlah thread CPU
+bisa dibatasi per worker. Cek kesamaan hasil retrieval terhadap fp32 dengan
+`python benchmark.py --parity <backend>`.
+"""
+import os
+import platform
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_BACKENDS = ('torch', 'torch-int8', 'onnx', 'onnx-int8')
+
+
+def default_onnx_int8_file() -> str:
+    """File ONNX int8 yang cocok untuk CPU ini (bisa di-override EMBEDDING_ONNX_FILE)."""
+    override = os.getenv("EMBEDDING_ONNX_FILE")
+    if override:
+        return override
+    if platform.machine().lower() in ('arm64', 'aarch64'):
+        return "onnx/model_qint8_arm64.onnx"
+    return "onnx/model_quint8_avx2.onnx"
+
+
+def _load_model(model_name: str, backend: str, threads: Optional[int]):
+    from sentence_transformers import SentenceTransformer
+
+    if backend in ('torch', 'torch-int8'):
+        import torch
+        if threads:
+            torch.set_num_threads(threads)
+        model = SentenceTransformer(model_name, device='cpu')
+        if backend == 'torch-int8':
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    import onnxruntime
+    session_options = onnxruntime.SessionOptions()
+    if threads:
+        session_options.intra_op_num_threads = threads
+        session_options.inter_op_num_threads = 1
+    model_kwargs = {'provider': 'CPUExecutionProvider', 'session_options': session_options}
+    if backend == 'onnx-int8':
+        model_kwargs['file_name'] = default_onnx_int8_file()
+    return SentenceTransformer(model_name, device='cpu', backend='onnx', model_kwargs=model_kwargs)
+
+
+class SentenceEmbeddings(Embeddings):
+    """Embeddings LangChain di atas SentenceTransformer dengan backend pilihan."""
+
+    def __init__(self, model_name: str, backend: str = 'torch', batch_size: int = 32,
+                 threads: Optional[int] = None):
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"backend embedding tidak dikenal: {backend} (pilih {', '.join(EMBEDDING_BACKENDS)})")
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.threads = threads
+        self._model = _load_model(model_name, backend, threads)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Sama dengan HuggingFaceEmbeddings: baris baru diganti spasi
+        texts = [text.replace("\n", " ") for text in texts]
+        if not texts:
+            return []
+        vectors = self._model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True,
+                                     show_progress_bar=False)
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
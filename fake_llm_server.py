@@ -0,0 +1,111 @@
+"""Server LLM palsu (kompatibel Groq/OpenAI chat completions) untuk load test.
+
+Client Groq asli (sync maupun async) bisa diarahkan ke sini, jadi throughput
+diukur lewat jalur jaringan yang sama dengan produksi tanpa memakai kuota:
+    python fake_llm_server.py --port 8090 --latency 0.5
+    GROQ_API_BASE=http://127.0.0.1:8090 GROQ_API_KEY=palsu python api_server.py
+"""
+import argparse
+import hashlib
+import json
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import List, Tuple
+
+CHAT_PATH = '/openai/v1/chat/completions'
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    """Jawaban deterministik dari hash prompt setelah `latency` detik."""
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client membatalkan request
+
+    def _tokens(self, prompt: str) -> List[str]:
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        return [f"{digest[i % 64]} " for i in range(self.server.tokens)]
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != CHAT_PATH:
+            self._send_json(404, {'error': {'message': f"endpoint tidak dikenal: {self.path}"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        prompt = "\n".join(str(message.get('content', '')) for message in request.get('messages', []))
+        tokens = self._tokens(prompt)
+        usage = {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(tokens),
+                 'total_tokens': len(prompt) // 4 + len(tokens)}
+        base = {'id': f"chatcmpl-{uuid.uuid4().hex[:12]}", 'created': int(time.time()),
+                'model': request.get('model', 'fake')}
+
+        if not request.get('stream'):
+            time.sleep(self.server.latency)
+            self._send_json(200, {
+                **base, 'object': 'chat.completion', 'usage': usage,
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': ''.join(tokens)}}],
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            time.sleep(self.server.latency / len(tokens))
+            delta = {'role': 'assistant', 'content': token} if i == 0 else {'content': token}
+            self._send_event({**base, 'object': 'chat.completion.chunk',
+                              'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})
+        self._send_event({**base, 'object': 'chat.completion.chunk', 'x_groq': {'usage': usage},
+                          'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def _send_event(self, payload):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_llm_server(port: int = 0, latency: float = 0.5, tokens: int = 40,
+                          host: str = '127.0.0.1') -> Tuple[ThreadingHTTPServer, str]:
+    """Jalankan server di thread latar; return (server, base URL untuk client Groq)."""
+    server = ThreadingHTTPServer((host, port), FakeLLMHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.tokens = tokens
+    Thread(target=server.serve_forever, name='fake-llm', daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server LLM palsu untuk load test")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0.5, help="detik per jawaban")
+    parser.add_argument('--tokens', type=int, default=40)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_llm_server(args.port, args.latency, args.tokens, args.host)
+    print(f"LLM palsu berjalan di {base_url} (latensi {args.latency} dtk)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
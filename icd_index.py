@@ -0,0 +1,152 @@
+import re
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Tuple
+
+# Pola kode: ICD-10 (A01, A01.0) dan ICD-9-CM prosedur (74.1, 00.09)
+ICD10_PATTERN = r'[A-Z]\d{2}(?:\.\d+)?'
+ICD9_PATTERN = r'\d{2}\.\d{1,2}'
+RANGE_PATTERN = re.compile(
+    rf'\b({ICD10_PATTERN}|{ICD9_PATTERN})\s*[-–]\s*({ICD10_PATTERN}|{ICD9_PATTERN})\b'
+)
+CODE_PATTERN = re.compile(rf'\b(?:{ICD10_PATTERN}|{ICD9_PATTERN})\b')
+
+# Batas atas untuk query prefix/range (lebih besar dari karakter kode apapun)
+_MAX_CHAR = '\uffff'
+
+
+def normalize_code(code: str) -> str:
+    """Normalisasi kode: huruf besar, tanpa spasi/titik di ujung."""
+    return code.strip().upper().rstrip('.')
+
+
+def parent_code(code: str) -> str:
+    """Kode induk (kategori 3 karakter): A01.0 -> A01, 74.1 -> 74."""
+    return code.split('.', 1)[0]
+
+
+class CodeIndex:
+    """Index kode ICD-10 / ICD-9-CM -> ID case, berbasis array kode terurut.
+
+    Semua lookup memakai binary search (bisect), jadi biayanya O(log n + hasil)
+    dan tidak pernah memindai seluruh daftar case.
+    """
+
+    def __init__(self, postings: Dict[str, Tuple[str, ...]]):
+        self._postings = postings
+        self._codes = sorted(postings)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __contains__(self, code: str) -> bool:
+        return normalize_code(code) in self._postings
+
+    def _collect(self, codes: Iterable[str]) -> List[str]:
+        """Gabungkan posting list tanpa duplikat, urutan tetap stabil."""
+        seen = {}
+        for code in codes:
+            for case_id in self._postings.get(code, ()):
+                seen.setdefault(case_id, None)
+        return list(seen)
+
+    def _codes_from(self, prefix: str) -> List[str]:
+        lo = bisect_left(self._codes, prefix)
+        hi = bisect_right(self._codes, prefix + _MAX_CHAR)
+        return self._codes[lo:hi]
+
+    def codes_with_prefix(self, prefix: str) -> List[str]:
+        """Semua kode terindeks yang diawali `prefix`."""
+        return self._codes_from(normalize_code(prefix))
+
+    def codes_in_range(self, start: str, end: str) -> List[str]:
+        """Semua kode dari `start` s/d `end` (inklusif, termasuk sub-kode `end`)."""
+        start, end = normalize_code(start), normalize_code(end)
+        if start > end:
+            start, end = end, start
+        lo = bisect_left(self._codes, start)
+        hi = bisect_right(self._codes, end + _MAX_CHAR)
+        return self._codes[lo:hi]
+
+    def exact(self, code: str) -> List[str]:
+        """Case yang memuat kode persis ini."""
+        return list(self._postings.get(normalize_code(code), ()))
+
+    def prefix(self, prefix: str) -> List[str]:
+        """Case yang memuat kode berawalan `prefix` (mis. 'A0', '74')."""
+        return self._collect(self.codes_with_prefix(prefix))
+
+    def children(self, code: str) -> List[str]:
+        """Case dengan sub-kode dari `code` (A01 -> A01.0, A01.1, ...)."""
+        # Tanpa normalize ulang: titik di akhir prefix harus tetap ada
+        return self._collect(self._codes_from(normalize_code(code) + '.'))
+
+    def parent(self, code: str) -> List[str]:
+        """Case dengan kode induk dari `code` (A01.0 -> A01)."""
+        code = normalize_code(code)
+        parent = parent_code(code)
+        if parent == code:
+            return []
+        return self.exact(parent)
+
+    def range(self, start: str, end: str) -> List[str]:
+        """Case dengan kode di dalam rentang, mis. A00-A08."""
+        return self._collect(self.codes_in_range(start, end))
+
+    def lookup(self, code: str) -> List[str]:
+        """Lookup satu kode: persis dulu, lalu sub-kode, lalu induknya."""
+        seen = {}
+        for case_id in self.exact(code) + self.children(code) + self.parent(code):
+            seen.setdefault(case_id, None)
+        return list(seen)
+
+    def extract_codes(self, query: str) -> Tuple[List[Tuple[str, str]], List[str]]:
+        """Ambil rentang dan kode tunggal dari teks query.
+
+        Kode berformat ICD-9-CM (mis. 74.1) hanya dianggap kode jika ada di
+        index, supaya angka biasa seperti suhu '38.5' tidak ikut tertangkap.
+        """
+        text = query.upper()
+        ranges = []
+        for start, end in RANGE_PATTERN.findall(text):
+            ranges.append((normalize_code(start), normalize_code(end)))
+        text = RANGE_PATTERN.sub(' ', text)
+
+        codes = []
+        for code in CODE_PATTERN.findall(text):
+            code = normalize_code(code)
+            if code[0].isdigit() and not self.codes_with_prefix(code):
+                continue
+            if code not in codes:
+                codes.append(code)
+        return ranges, codes
+
+    def search(self, query: str) -> List[str]:
+        """Cari ID case dari semua kode/rentang yang disebut di query."""
+        ranges, codes = self.extract_codes(query)
+        seen = {}
+        for code in codes:
+            for case_id in self.exact(code):
+                seen.setdefault(case_id, None)
+        for code in codes:
+            for case_id in self.children(code) + self.parent(code):
+                seen.setdefault(case_id, None)
+        for start, end in ranges:
+            for case_id in self.range(start, end):
+                seen.setdefault(case_id, None)
+        return list(seen)
+
+
+def build_code_index(json_data: Dict) -> CodeIndex:
+    """Bangun index kode dari `cases[].kode_diagnosa`."""
+    postings: Dict[str, List[str]] = {}
+    for case in json_data['cases']:
+        for code in case['kode_diagnosa']:
+            ids = postings.setdefault(normalize_code(code), [])
+            if case['id'] not in ids:
+                ids.append(case['id'])
+
+    # Kode yang tersedia di metadata tapi belum dipakai case tetap dikenali
+    for code in json_data.get('metadata', {}).get('kode_icd_tersedia', []):
+        postings.setdefault(normalize_code(code), [])
+
+    return CodeIndex({code: tuple(ids) for code, ids in postings.items()})
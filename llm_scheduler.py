@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import AsyncIterator, Callable, Dict, Optional
+
+# Status HTTP yang layak dicoba ulang (rate limit & gangguan sementara server)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+ASYNC_POLL_S = 0.02   # interval cek giliran untuk pemanggil async (tanpa memblokir loop)
+
+
+class TokenBucket:
+    """Token bucket sederhana: `rate_per_minute` token, kapasitas `burst`."""
+
+    def __init__(self, rate_per_minute: float, burst: Optional[int] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst or rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> float:
+        """Ambil satu token; return 0 jika berhasil, atau detik tunggu sampai token ada."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def penalize(self, seconds: float):
+        """Kosongkan bucket selama `seconds` (dipakai saat server membalas 429)."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+
+def _is_retryable(exc: Exception) -> bool:
+    status = getattr(exc, 'status_code', None)
+    if status in RETRYABLE_STATUS:
+        return True
+    name = type(exc).__name__
+    return 'RateLimit' in name or 'Connection' in name or 'Timeout' in name
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """Baca header Retry-After dari error API (jika ada)."""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class LeaderCancelled(RuntimeError):
+    """Pemanggil yang memimpin prompt bersama dibatalkan sebelum jawabannya selesai."""
+
+
+class LLMScheduler:
+    """Penjadwal panggilan LLM untuk seluruh proses.
+
+    - Satu client dipakai ulang untuk semua request.
+    - Token bucket membatasi laju sesuai kuota (mis. 30 request/menit Groq).
+    - Request yang melebihi kuota mengantre FIFO (tiket), jadi urutannya adil.
+    - Error 429/5xx dicoba ulang dengan exponential backoff + jitter.
+    - Prompt identik yang sedang berjalan digabung: hanya satu panggilan upstream.
+    - Semua panggilan lewat client async (`ainvoke`/`astream`); `invoke` hanya
+      wrapper blocking. Request yang dibatalkan melepas gilirannya.
+    """
+
+    def __init__(self, client_factory: Callable[[], object], rate_per_minute: float = 30,
+                 burst: Optional[int] = None, max_retries: int = 4,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 on_usage: Optional[Callable[[Dict], None]] = None):
+        self._client_factory = client_factory
+        self._on_usage = on_usage
+        self._client = None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._bucket = TokenBucket(rate_per_minute, burst)
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._abandoned = set()
+        self._in_flight: Dict[str, Future] = {}
+        self._stats = {
+            'requests': 0,
+            'upstream_calls': 0,
+            'coalesced': 0,
+            'retries': 0,
+            'errors': 0,
+            'total_wait_s': 0.0,
+            'max_wait_s': 0.0,
+        }
+
+    @property
+    def client(self):
+        with self._cond:
+            if self._client is None:
+                self._client = self._client_factory()
+            return self._client
+
+    def _advance(self):
+        """Giliran berikutnya (lewati tiket yang sudah dibatalkan). Dipanggil dengan lock."""
+        self._serving += 1
+        while self._serving in self._abandoned:
+            self._abandoned.discard(self._serving)
+            self._serving += 1
+        self._cond.notify_all()
+
+    def _record_wait(self, start: float):
+        waited = time.monotonic() - start
+        self._stats['upstream_calls'] += 1
+        self._stats['total_wait_s'] += waited
+        self._stats['max_wait_s'] = max(self._stats['max_wait_s'], waited)
+
+    async def _acquire_async(self):
+        """Tunggu giliran (FIFO) dan token rate limit; batal = tiket dilepas."""
+        start = time.monotonic()
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+        try:
+            while True:
+                with self._cond:
+                    wait = ASYNC_POLL_S
+                    if ticket == self._serving:
+                        wait = self._bucket.try_take()
+                        if wait == 0:
+                            self._advance()
+                            self._record_wait(start)
+                            return
+                await asyncio.sleep(min(wait, ASYNC_POLL_S))
+        except BaseException:
+            with self._cond:
+                if ticket == self._serving:
+                    self._advance()
+                else:
+                    self._abandoned.add(ticket)
+            raise
+
+    def _backoff_delay(self, attempt: int, exc: Exception) -> float:
+        delay = _retry_after(exc)
+        if delay is None:
+            delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+            delay = random.uniform(delay / 2, delay)
+        with self._cond:
+            self._stats['retries'] += 1
+            if getattr(exc, 'status_code', None) == 429 or 'RateLimit' in type(exc).__name__:
+                self._bucket.penalize(delay)
+        return delay
+
+    def _report_usage(self, usage: Optional[Dict]):
+        if usage and self._on_usage is not None:
+            self._on_usage(usage)
+
+    def _join_or_lead(self, prompt: str):
+        """Return (future, is_leader) untuk prompt ini."""
+        key = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        with self._cond:
+            self._stats['requests'] += 1
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._stats['coalesced'] += 1
+                return key, future, False
+            future = Future()
+            self._in_flight[key] = future
+            return key, future, True
+
+    def _finish(self, key: str, future: Future, result: Optional[str] = None,
+                error: Optional[Exception] = None):
+        with self._cond:
+            self._in_flight.pop(key, None)
+            if error is not None:
+                self._stats['errors'] += 1
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def _run(self, prompt: str, streaming: bool) -> AsyncIterator[str]:
+        """Inti bersama `ainvoke`/`astream`: penggabungan prompt, antrean dan retry.
+
+        Retry hanya dilakukan sebelum teks pertama terkirim. Follower menerima
+        jawaban akhir pemimpin sekaligus; jika pemimpin batal, follower mengambil alih.
+        """
+        while True:
+            key, future, is_leader = self._join_or_lead(prompt)
+            if is_leader:
+                break
+            try:
+                # shield: pembatalan follower tidak ikut membatalkan jawaban bersama
+                yield await asyncio.shield(asyncio.wrap_future(future))
+                return
+            except LeaderCancelled:
+                continue
+
+        parts = []
+        try:
+            for attempt in range(self.max_retries + 1):
+                await self._acquire_async()
+                try:
+                    if streaming:
+                        usage = None
+                        async for chunk in self.client.astream(prompt):
+                            # Groq mengirim usage token di chunk terakhir
+                            usage = getattr(chunk, 'usage_metadata', None) or usage
+                            if chunk.content:
+                                parts.append(chunk.content)
+                                yield chunk.content
+                    else:
+                        response = await self.client.ainvoke(prompt)
+                        usage = getattr(response, 'usage_metadata', None)
+                        parts.append(response.content)
+                    self._report_usage(usage)
+                    break
+                except Exception as e:
+                    if parts or attempt >= self.max_retries or not _is_retryable(e):
+                        raise
+                    await asyncio.sleep(self._backoff_delay(attempt, e))
+        except BaseException as e:
+            # Pembatalan, KeyboardInterrupt dsb.: follower tetap harus dibangunkan
+            self._finish(key, future, error=e if isinstance(e, Exception) else LeaderCancelled("request dibatalkan"))
+            raise
+        content = "".join(parts)
+        self._finish(key, future, result=content)
+        if not streaming:
+            yield content
+
+    async def ainvoke(self, prompt: str) -> str:
+        """Panggil LLM (client.ainvoke) dan return teks jawaban; bisa dibatalkan kapan saja."""
+        return "".join([part async for part in self._run(prompt, streaming=False)])
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Streaming token dari LLM (client.astream); aturan retry dan penggabungan sama."""
+        async for part in self._run(prompt, streaming=True):
+            yield part
+
+    def invoke(self, prompt: str) -> str:
+        """Wrapper blocking untuk `ainvoke` (jangan dipanggil dari dalam event loop)."""
+        return asyncio.run(self.ainvoke(prompt))
+
+    def stats(self) -> Dict:
+        """Statistik antrean untuk sizing deployment."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['queue_depth'] = self._next_ticket - self._serving - len(self._abandoned)
+            stats['in_flight'] = len(self._in_flight)
+            stats['avg_wait_s'] = (
+                stats['total_wait_s'] / stats['upstream_calls'] if stats['upstream_calls'] else 0.0
+            )
+            stats['tokens_available'] = round(max(self._bucket.tokens, 0.0), 2)
+        return stats
@@ -0,0 +1,300 @@
+"""Tracing dan metrik latensi per tahap pipeline RAG.
+
+- `span(name)` / `@traced(name)` mengukur durasi satu tahap.
+- `trace(name)` mengelompokkan span satu request; hasilnya ditulis ke file
+  JSONL (`RAG_TRACE_FILE`, opt-in, diputar per `RAG_TRACE_MAX_BYTES`) dan,
+  jika request lambat, bisa disertai sampel stack dari sampling profiler
+  (`RAG_PROFILE_SLOW_MS`).
+- `REGISTRY` menyimpan histogram bergulir (p50/p95/p99) dan counter token,
+  diekspor dalam format teks Prometheus lewat `render_prometheus()`.
+"""
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+HISTOGRAM_WINDOW = 2048          # jumlah observasi terakhir per tahap
+QUANTILES = (0.5, 0.95, 0.99)
+TRACE_FILE = os.getenv("RAG_TRACE_FILE", "")   # opt-in, mis. .rag_traces.jsonl; kosong = nonaktif
+TRACE_MAX_BYTES = int(os.getenv("RAG_TRACE_MAX_BYTES", str(50 * 1024 * 1024)))   # lalu diputar ke <file>.1
+PROFILE_SLOW_MS = float(os.getenv("RAG_PROFILE_SLOW_MS", "0"))   # 0 = profiler nonaktif
+PROFILE_INTERVAL_S = 0.01
+
+
+def _quantile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Registry:
+    """Histogram durasi bergulir per tahap + counter, aman lintas thread."""
+
+    def __init__(self, window: int = HISTOGRAM_WINDOW):
+        self._lock = threading.Lock()
+        self._window = window
+        self._durations: Dict[str, deque] = {}
+        self._totals: Dict[str, List[float]] = {}   # [count, sum] sejak start
+        self._counters: Counter = Counter()
+
+    def observe(self, stage: str, duration_ms: float):
+        with self._lock:
+            self._durations.setdefault(stage, deque(maxlen=self._window)).append(duration_ms)
+            totals = self._totals.setdefault(stage, [0, 0.0])
+            totals[0] += 1
+            totals[1] += duration_ms
+
+    def inc(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def snapshot(self) -> Dict:
+        """Ringkasan: per tahap count/sum/p50/p95/p99 (ms), plus counter."""
+        with self._lock:
+            durations = {stage: sorted(values) for stage, values in self._durations.items()}
+            totals = {stage: list(values) for stage, values in self._totals.items()}
+            counters = dict(self._counters)
+        stages = {}
+        for stage, values in durations.items():
+            stages[stage] = {
+                'count': totals[stage][0],
+                'sum_ms': round(totals[stage][1], 2),
+                **{f"p{int(q * 100)}_ms": round(_quantile(values, q), 2) for q in QUANTILES},
+            }
+        return {'stages': stages, 'counters': counters}
+
+    def render_prometheus(self, extra_gauges: Optional[Dict[str, float]] = None) -> str:
+        """Ekspor format teks Prometheus (bisa di-scrape)."""
+        snap = self.snapshot()
+        lines = [
+            "# HELP rag_stage_duration_ms Durasi tahap pipeline RAG (jendela bergulir).",
+            "# TYPE rag_stage_duration_ms summary",
+        ]
+        for stage, stats in sorted(snap['stages'].items()):
+            for q in QUANTILES:
+                lines.append(
+                    f'rag_stage_duration_ms{{stage="{stage}",quantile="{q}"}} {stats[f"p{int(q * 100)}_ms"]}'
+                )
+            lines.append(f'rag_stage_duration_ms_sum{{stage="{stage}"}} {stats["sum_ms"]}')
+            lines.append(f'rag_stage_duration_ms_count{{stage="{stage}"}} {stats["count"]}')
+
+        lines.append("# TYPE rag_events_total counter")
+        for name, value in sorted(snap['counters'].items()):
+            lines.append(f'rag_events_total{{name="{name}"}} {value}')
+
+        for name, value in sorted((extra_gauges or {}).items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('rag_trace', default=None)
+_trace_file_lock = threading.Lock()
+
+
+class SamplingProfiler:
+    """Sampling profiler ringan: cuplik stack satu thread secara berkala."""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL_S):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, top: int = 20) -> List[Dict]:
+        """Hentikan profiler; return stack tersering (format collapsed)."""
+        self._stop.set()
+        self._thread.join()
+        return [{'stack': stack, 'samples': count} for stack, count in self.samples.most_common(top)]
+
+
+class Trace:
+    """Satu request: daftar span beserta atribut tambahan."""
+
+    def __init__(self, name: str, attrs: Dict):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = dict(attrs)
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.spans: List[Dict] = []
+        self.profiler: Optional[SamplingProfiler] = None
+
+    def to_dict(self, duration_ms: float) -> Dict:
+        return {
+            'trace_id': self.id,
+            'name': self.name,
+            'timestamp': round(self.started_at, 3),
+            'duration_ms': round(duration_ms, 2),
+            'attrs': self.attrs,
+            'spans': self.spans,
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def set_attribute(key: str, value):
+    """Tambahkan atribut ke trace yang sedang berjalan (jika ada)."""
+    active = _current_trace.get()
+    if active is not None:
+        active.attrs[key] = value
+
+
+def _write_trace(record: Dict):
+    if not TRACE_FILE:
+        return
+    try:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with _trace_file_lock:
+            # Rotasi berbasis ukuran: paling banyak dua file (aktif + .1)
+            if os.path.exists(TRACE_FILE) and os.path.getsize(TRACE_FILE) >= TRACE_MAX_BYTES:
+                os.replace(TRACE_FILE, TRACE_FILE + '.1')
+            with open(TRACE_FILE, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+    except Exception as e:
+        print(f"Error writing trace: {e}")
+
+
+def begin_trace(name: str, **attrs) -> Trace:
+    """Buat trace baru tanpa mengaktifkannya (untuk generator/streaming)."""
+    active = Trace(name, attrs)
+    if PROFILE_SLOW_MS > 0:
+        active.profiler = SamplingProfiler(threading.get_ident())
+        active.profiler.start()
+    return active
+
+
+@contextmanager
+def use_trace(active: Trace):
+    """Aktifkan `active` sebagai trace berjalan selama blok ini."""
+    token = _current_trace.set(active)
+    try:
+        yield active
+    finally:
+        _current_trace.reset(token)
+
+
+def finish_trace(active: Trace, error: Optional[BaseException] = None):
+    """Tutup trace: catat histogram request dan tulis ke file JSONL."""
+    duration_ms = (time.perf_counter() - active.start) * 1000
+    REGISTRY.observe(f"request.{active.name}", duration_ms)
+    record = active.to_dict(duration_ms)
+    if error is not None:
+        record['error'] = repr(error)
+        REGISTRY.inc(f"request.{active.name}.errors")
+    if active.profiler is not None:
+        samples = active.profiler.stop()
+        if duration_ms >= PROFILE_SLOW_MS:
+            record['profile'] = samples
+    _write_trace(record)
+
+
+@contextmanager
+def trace(name: str, **attrs):
+    """Mulai trace satu request. Trace bersarang dicatat sebagai span trace luar."""
+    if _current_trace.get() is not None:
+        with span(name):
+            yield _current_trace.get()
+        return
+
+    active = begin_trace(name, **attrs)
+    try:
+        with use_trace(active):
+            yield active
+    except BaseException as e:
+        finish_trace(active, e)
+        raise
+    finish_trace(active)
+
+
+@contextmanager
+def span(name: str):
+    """Ukur durasi satu tahap; dicatat ke histogram dan ke trace aktif."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        duration_ms = (end - start) * 1000
+        REGISTRY.observe(name, duration_ms)
+        active = _current_trace.get()
+        if active is not None:
+            active.spans.append({
+                'name': name,
+                'start_ms': round((start - active.start) * 1000, 2),
+                'duration_ms': round(duration_ms, 2),
+            })
+
+
+def traced(name: str):
+    """Decorator: bungkus seluruh fungsi dengan `span(name)`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_usage(usage: Optional[Dict]):
+    """Catat jumlah token dari `usage_metadata` respons LLM."""
+    if not usage:
+        return
+    input_tokens = usage.get('input_tokens', 0)
+    output_tokens = usage.get('output_tokens', 0)
+    REGISTRY.inc('llm.input_tokens', input_tokens)
+    REGISTRY.inc('llm.output_tokens', output_tokens)
+    set_attribute('input_tokens', input_tokens)
+    set_attribute('output_tokens', output_tokens)
+
+
+def start_metrics_server(port: int, host: str = '127.0.0.1', gauges=None) -> ThreadingHTTPServer:
+    """Server /metrics mandiri di thread latar (untuk proses Streamlit)."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') != '/metrics':
+                self.send_error(404)
+                return
+            body = REGISTRY.render_prometheus(gauges() if gauges else None).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
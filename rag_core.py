@@ -0,0 +1,1040 @@
+import os
+import sys
+import json
+import asyncio
+import uuid
+import shutil
+import hashlib
+import importlib
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, AsyncIterator, Callable, List, Dict, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+# Pustaka LangChain & Komponen AI (yang berat di-import saat dipakai, lihat lazy_import)
+from langchain_core.documents import Document
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+    from langchain_groq import ChatGroq
+
+from icd_index import CodeIndex, build_code_index
+from sparse_index import BM25Index, build_sparse_index, is_confident, reciprocal_rank_fusion
+from answer_cache import AnswerCache, make_cache_key
+from embedding_backend import SentenceEmbeddings
+from reranker import CrossEncoderReranker
+from llm_scheduler import LLMScheduler
+from context_builder import build_context
+from category_scope import build_category_index, build_category_terms, infer_category
+from template_answer import (
+    GENERIC_DIAGNOSA, build_diagnosa_index, match_exact, normalize_diagnosa, render_template_answer
+)
+from metrics import REGISTRY, begin_trace, finish_trace, record_usage, set_attribute, span, trace, traced, use_trace
+
+# --- KONFIGURASI INDEX ---
+EMBEDDING_MODEL_NAME = "paraphrase-multilingual-mpnet-base-v2"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")   # torch | torch-int8 | onnx | onnx-int8
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0")) or None   # None = default library
+EMBEDDING_BATCH_SIZE = 32
+INDEX_CACHE_DIR = ".index_cache"
+CASE_HASHES_FILE = "case_hashes.json"   # hash isi per case, disimpan bersama index
+DB_WATCH_INTERVAL_S = 5.0               # interval cek perubahan file database (WarmUp.watch)
+# Mode multi-proses: direktori case store + index read-only yang di-mmap semua worker
+SHARED_STORE_DIR = os.getenv("RAG_SHARED_STORE", "")   # kosong = semua dimuat di memori proses
+GROQ_MODEL = "moonshotai/kimi-k2-instruct-0905"
+
+# --- KONFIGURASI HYBRID SEARCH ---
+SEARCH_CANDIDATES = 10       # kandidat per retriever sebelum fusion
+RRF_K = 60                   # konstanta Reciprocal Rank Fusion
+FUSION_WEIGHTS = (1.0, 1.0)  # bobot (sparse BM25, dense FAISS)
+SPARSE_SHORTCUT_MARGIN = 1.5 # hasil BM25 dipakai langsung jika unggul sejauh ini
+CATEGORY_INFERENCE = True    # tebak kategori dari term penanda di query (lihat category_scope)
+
+# Re-ranking cross-encoder (opsional, butuh unduhan model tambahan)
+RERANK_ENABLED = os.getenv("RAG_RERANK", "0") == "1"
+RERANK_CANDIDATES = 20       # kandidat (dense + BM25) yang dinilai ulang
+RERANK_BUDGET_MS = float(os.getenv("RAG_RERANK_BUDGET_MS", "300"))   # lewat = urutan asli
+
+# --- KONFIGURASI CACHE JAWABAN ---
+ANSWER_CACHE_PATH = ".answer_cache.sqlite3"
+ANSWER_CACHE_MAX_ENTRIES = 1000
+ANSWER_CACHE_TTL = 7 * 24 * 3600   # detik
+PROMPT_VERSION = "2"               # naikkan jika template prompt diubah
+# Tier semantik (cosine minimum, mis. 0.95) hanya jika di-set; None = nonaktif.
+# Parafrase beda makna ("dengan diare" vs "tanpa diare") bisa di atas 0.95.
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("RAG_SEMANTIC_CACHE")) if os.getenv("RAG_SEMANTIC_CACHE") else None
+
+# --- KONFIGURASI RATE LIMIT LLM ---
+LLM_RATE_PER_MINUTE = 30           # kuota Groq gratis
+LLM_MAX_RETRIES = 4
+LLM_BACKOFF_BASE = 1.0             # detik, dikali 2 tiap percobaan (+ jitter)
+
+# --- KONFIGURASI KONTEKS PROMPT ---
+CONTEXT_TOKEN_BUDGET = 800         # perkiraan token maksimum untuk konteks database
+
+# --- KONFIGURASI JAWABAN TEMPLATE (TANPA LLM) ---
+TEMPLATE_ANSWERS = True            # False = selalu lewat LLM
+TEMPLATE_MAX_CASES = 3             # case maksimum (satu diagnosa_utama); lebih = LLM
+
+# Modul berat (torch/sentence-transformers ikut ter-import) yang ditunda sampai dipakai
+HEAVY_MODULES = ('sentence_transformers', 'langchain_community.vectorstores', 'langchain_groq')
+
+# Template chunk ikut menentukan kunci index: ubah template = index dibangun ulang
+CHUNK_TEMPLATE = """ID: {id}
+DIAGNOSA: {diagnosa_utama} - {diagnosa}
+KODE: {kode}
+KATEGORI: {kategori}
+PROSEDUR: {prosedur}
+ASPEK KODING: {aspek_koding}
+KEYWORDS: {keywords}"""
+# Naikkan jika cara create_smart_chunks membangun chunk berubah: shared store dibangun ulang
+CHUNK_BUILDER_VERSION = 1
+
+def lazy_import(module_name: str, attr: Optional[str] = None):
+    """Import modul saat pertama dipakai; durasinya dicatat sebagai span `import.<modul>`."""
+    if module_name in sys.modules:
+        module = importlib.import_module(module_name)
+    else:
+        with span(f"import.{module_name}"):
+            module = importlib.import_module(module_name)
+    return getattr(module, attr) if attr else module
+
+@traced("load_json_database")
+def load_json_database(json_file: str) -> Dict:
+    """Load JSON database"""
+    with open(json_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+@traced("create_smart_chunks")
+def create_smart_chunks(json_data: Dict) -> List[Document]:
+    """SMART CHUNKING: Satu case = satu chunk dengan struktur optimal"""
+    documents = []
+    
+    for case in json_data['cases']:
+        # Format chunk yang OPTIMAL untuk pencarian
+        chunk_text = CHUNK_TEMPLATE.format(
+            id=case['id'],
+            diagnosa_utama=case.get('diagnosa_utama', ''),
+            diagnosa=case['diagnosa'][:200],
+            kode=', '.join(case['kode_diagnosa'][:5]),
+            kategori=case['kategori'],
+            prosedur=case['prosedur'][:150] if case['prosedur'] else 'Tidak ada',
+            aspek_koding=case['aspek_koding'][:300],
+            keywords=', '.join(case['keywords'][:15])
+        )
+        
+        doc = Document(
+            page_content=chunk_text,
+            metadata={
+                'id': case['id'],
+                'diagnosa_utama': case.get('diagnosa_utama', ''),
+                'diagnosa': case['diagnosa'],
+                'kode': case['kode_diagnosa'],
+                'kategori': case['kategori'],
+                'prosedur': case['prosedur'],
+                'aspek_koding': case['aspek_koding'],
+                'perhatian_khusus': case['perhatian_khusus'],
+                'keywords': case['keywords']
+            }
+        )
+        
+        documents.append(doc)
+    
+    return documents
+
+class CaseStore(NamedTuple):
+    """Database yang sudah di-parse, dipakai bersama (read-only) oleh semua sesi.
+
+    Di mode shared store (RAG_SHARED_STORE) field-nya adalah view di atas file
+    yang di-mmap (lihat shared_store.py), dengan antarmuka yang sama.
+    """
+    json_data: Dict
+    documents: Sequence[Document]
+    documents_by_id: Mapping[str, Document]
+    code_index: CodeIndex
+    sparse_index: BM25Index
+    diagnosa_index: Mapping[str, List[str]]
+    category_index: Mapping[str, List[str]]
+    category_terms: Mapping[str, str]
+    index_key: str
+
+def build_case_store(json_file: str) -> CaseStore:
+    """Parse JSON + buat chunks dan index pendukung untuk satu versi file."""
+    json_data = load_json_database(json_file)
+    documents = tuple(create_smart_chunks(json_data))
+    return CaseStore(
+        json_data=json_data,
+        documents=documents,
+        documents_by_id={doc.metadata['id']: doc for doc in documents},
+        code_index=build_code_index(json_data),
+        sparse_index=build_sparse_index(json_data),
+        diagnosa_index=build_diagnosa_index(json_data),
+        category_index=build_category_index(json_data),
+        category_terms=build_category_terms(json_data),
+        index_key=compute_index_key(json_file, documents)
+    )
+
+def compute_index_key(json_file: str, documents: Sequence[Document]) -> str:
+    """Kunci index = hash(isi database + isi setiap chunk + nama model + backend).
+
+    Chunk di-hash dari hasil `create_smart_chunks` (bukan dari template), jadi
+    perubahan cara chunk dibangun (mis. batas pemotongan teks) ikut mengganti kunci.
+    """
+    hasher = hashlib.sha256()
+    with open(json_file, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            hasher.update(block)
+    for doc in documents:
+        hasher.update(case_content_hash(doc).encode('utf-8'))
+    hasher.update(EMBEDDING_MODEL_NAME.encode('utf-8'))
+    if EMBEDDING_BACKEND != 'torch':
+        # Vektor backend terkuantisasi sedikit berbeda; index fp32 lama tetap valid
+        hasher.update(EMBEDDING_BACKEND.encode('utf-8'))
+    return hasher.hexdigest()[:16]
+
+def compute_store_key(json_file: str) -> str:
+    """Kunci shared store = hash(byte database + versi pembangun chunk + model + backend).
+
+    Tidak mem-parse JSON, jadi murah dihitung oleh setiap worker saat start.
+    """
+    hasher = hashlib.sha256()
+    with open(json_file, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            hasher.update(block)
+    hasher.update(f"{CHUNK_BUILDER_VERSION}\x1f{CHUNK_TEMPLATE}\x1f{EMBEDDING_MODEL_NAME}\x1f{EMBEDDING_BACKEND}".encode('utf-8'))
+    return hasher.hexdigest()[:16]
+
+def embedding_signature() -> str:
+    """Vektor dua index hanya bisa dipakai ulang jika template, model dan backend sama."""
+    return f"{hashlib.sha256(CHUNK_TEMPLATE.encode('utf-8')).hexdigest()[:12]}:{EMBEDDING_MODEL_NAME}:{EMBEDDING_BACKEND}"
+
+def case_content_hash(doc: Document) -> str:
+    """Hash isi satu case (teks chunk + metadata); berubah = case di-embed ulang."""
+    raw = doc.page_content + '\x1f' + json.dumps(doc.metadata, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+def load_saved_index(index_key: str, embedding_model):
+    """Load index FAISS tersimpan (memory-mapped) jika kuncinya cocok."""
+    index_dir = os.path.join(INDEX_CACHE_DIR, index_key)
+    if not os.path.exists(os.path.join(index_dir, "index.faiss")):
+        return None
+    try:
+        import faiss
+        io_flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        FAISS = lazy_import('langchain_community.vectorstores', 'FAISS')
+        # File pickle dibuat sendiri oleh proses ini, aman untuk di-load
+        return FAISS.load_local(
+            index_dir,
+            embedding_model,
+            allow_dangerous_deserialization=True,
+            io_flags=io_flags
+        )
+    except Exception as e:
+        print(f"Error loading saved index {index_key}: {e}")
+        return None
+
+def save_index(db, index_key: str, case_hashes: Dict[str, str]):
+    """Simpan index FAISS + hash per case secara atomik, lalu hapus index dengan kunci lama."""
+    index_dir = os.path.join(INDEX_CACHE_DIR, index_key)
+    tmp_dir = f"{index_dir}.tmp-{uuid.uuid4().hex[:8]}"
+    try:
+        db.save_local(tmp_dir)
+        with open(os.path.join(tmp_dir, CASE_HASHES_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'embedding': embedding_signature(), 'cases': case_hashes}, f)
+        try:
+            os.rename(tmp_dir, index_dir)
+        except OSError:
+            # Worker lain sudah menyimpan index dengan kunci yang sama
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        for name in os.listdir(INDEX_CACHE_DIR):
+            if name != index_key and '.tmp-' not in name:
+                shutil.rmtree(os.path.join(INDEX_CACHE_DIR, name), ignore_errors=True)
+    except Exception as e:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        print(f"Error saving index {index_key}: {e}")
+
+def create_embedding_model(backend: Optional[str] = None) -> SentenceEmbeddings:
+    """Model embedding untuk index dan query (backend default: EMBEDDING_BACKEND)."""
+    lazy_import('sentence_transformers')
+    return SentenceEmbeddings(
+        EMBEDDING_MODEL_NAME,
+        backend=backend or EMBEDDING_BACKEND,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        threads=EMBEDDING_THREADS
+    )
+
+def find_previous_index(index_key: str) -> Optional[Tuple[str, Dict[str, str]]]:
+    """Index tersimpan terbaru (kunci lain) yang vektornya bisa dipakai ulang: (dir, hash per case)."""
+    if not os.path.isdir(INDEX_CACHE_DIR):
+        return None
+    candidates = []
+    for name in os.listdir(INDEX_CACHE_DIR):
+        index_dir = os.path.join(INDEX_CACHE_DIR, name)
+        if name == index_key or '.tmp-' in name:
+            continue
+        try:
+            with open(os.path.join(index_dir, CASE_HASHES_FILE), 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if saved.get('embedding') == embedding_signature():
+            candidates.append((os.path.getmtime(index_dir), index_dir, saved['cases']))
+    if not candidates:
+        return None
+    _, index_dir, case_hashes = max(candidates)
+    return index_dir, case_hashes
+
+@traced("index.incremental")
+def update_previous_index(documents: Sequence[Document], case_hashes: Dict[str, str],
+                          index_key: str, embedding_model) -> Optional["FAISS"]:
+    """Index baru dari index versi sebelumnya: hanya case baru/berubah yang di-embed.
+
+    Index lama di-load sebagai salinan di memori (bukan mmap), jadi index yang
+    sedang melayani query tidak pernah ikut berubah. None jika tidak ada index
+    lama yang cocok.
+    """
+    previous = find_previous_index(index_key)
+    if previous is None:
+        return None
+    index_dir, old_hashes = previous
+    try:
+        FAISS = lazy_import('langchain_community.vectorstores', 'FAISS')
+        # File pickle dibuat sendiri oleh proses ini, aman untuk di-load
+        db = FAISS.load_local(index_dir, embedding_model, allow_dangerous_deserialization=True)
+    except Exception as e:
+        print(f"Error loading previous index {index_dir}: {e}")
+        return None
+
+    docstore_ids = {
+        db.docstore.search(docstore_id).metadata['id']: docstore_id
+        for docstore_id in db.index_to_docstore_id.values()
+    }
+    if set(docstore_ids) != set(old_hashes):
+        # Hash tidak sesuai isi index (file rusak/diubah manual): bangun ulang penuh
+        return None
+    changed = [doc for doc in documents if old_hashes.get(doc.metadata['id']) != case_hashes[doc.metadata['id']]]
+    stale = [case_id for case_id in old_hashes if case_id not in case_hashes]
+    stale += [doc.metadata['id'] for doc in changed if doc.metadata['id'] in old_hashes]
+
+    if stale:
+        db.delete([docstore_ids[case_id] for case_id in stale])
+    if changed:
+        db.add_documents(list(changed), ids=[doc.metadata['id'] for doc in changed])
+    set_attribute('embedded', len(changed))
+    set_attribute('deleted', len(stale))
+    REGISTRY.inc("index.incremental.embedded", len(changed))
+    REGISTRY.inc("index.incremental.deleted", len(stale))
+    return db
+
+@traced("create_vector_store")
+def create_vector_store(documents: Sequence[Document], index_key: str, embedding_model=None) -> "FAISS":
+    """Buat vector store dari documents (pakai index tersimpan jika masih valid).
+
+    Jika database berubah, index versi sebelumnya di-update per case (lihat
+    update_previous_index); embedding penuh hanya jika tidak ada index lama.
+    """
+    embedding_model = embedding_model or create_embedding_model()
+    db = load_saved_index(index_key, embedding_model)
+    if db is None:
+        case_hashes = {doc.metadata['id']: case_content_hash(doc) for doc in documents}
+        db = update_previous_index(documents, case_hashes, index_key, embedding_model)
+        if db is None:
+            FAISS = lazy_import('langchain_community.vectorstores', 'FAISS')
+            db = FAISS.from_documents(list(documents), embedding_model,
+                                      ids=[doc.metadata['id'] for doc in documents])
+        save_index(db, index_key, case_hashes)
+    return db
+
+@traced("open_shared_store")
+def open_shared_store(json_file: str, embedding_model=None) -> Tuple[CaseStore, "FAISS"]:
+    """Case store + FAISS dari SHARED_STORE_DIR (di-mmap); dibangun sekali jika belum ada.
+
+    Worker hanya meng-hash byte file database (compute_store_key); JSON di-parse
+    dan chunk dibangun hanya saat store untuk kunci itu belum ada.
+    """
+    import faiss
+    import shared_store
+
+    embedding_model = embedding_model or create_embedding_model()
+    store_key = compute_store_key(json_file)
+    store_dir = shared_store.store_directory(SHARED_STORE_DIR, store_key)
+    if shared_store.read_manifest(store_dir) is None:
+        case_store = build_case_store(json_file)
+        db = create_vector_store(case_store.documents, case_store.index_key, embedding_model)
+        os.makedirs(SHARED_STORE_DIR, exist_ok=True)
+        shared_store.write_shared_store(case_store, db, store_dir, EMBEDDING_MODEL_NAME, store_key)
+
+    parts = shared_store.open_shared_store(store_dir, store_key)
+    case_store = CaseStore(
+        json_data=parts['json_data'],
+        documents=parts['documents'],
+        documents_by_id=parts['documents_by_id'],
+        code_index=parts['code_index'],
+        sparse_index=parts['sparse_index'],
+        diagnosa_index=parts['diagnosa_index'],
+        category_index=parts['category_index'],
+        category_terms=parts['category_terms'],
+        index_key=parts['manifest']['index_key']
+    )
+    FAISS = lazy_import('langchain_community.vectorstores', 'FAISS')
+    io_flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    db = FAISS(
+        embedding_model,
+        faiss.read_index(parts['faiss_path'], io_flags),
+        parts['docstore'],
+        parts['faiss_positions']
+    )
+    return case_store, db
+
+def load_store(json_file: str, embedding_model=None) -> Tuple[CaseStore, "FAISS"]:
+    """(case store, vector store) sesuai mode: shared store di-mmap atau di memori."""
+    if SHARED_STORE_DIR:
+        return open_shared_store(json_file, embedding_model)
+    case_store = build_case_store(json_file)
+    return case_store, create_vector_store(case_store.documents, case_store.index_key, embedding_model)
+
+_RERANKER: Optional[CrossEncoderReranker] = None
+_RERANKER_LOCK = threading.Lock()
+
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    """Reranker bersama per proses; None jika RERANK_ENABLED mati."""
+    global _RERANKER
+    if not RERANK_ENABLED:
+        return None
+    with _RERANKER_LOCK:
+        if _RERANKER is None:
+            _RERANKER = CrossEncoderReranker(budget_ms=RERANK_BUDGET_MS)
+        return _RERANKER
+
+def search_candidates(k: int) -> int:
+    """Jumlah kandidat per retriever: lebih banyak jika hasilnya akan di-rerank."""
+    return max(k, RERANK_CANDIDATES if RERANK_ENABLED else SEARCH_CANDIDATES)
+
+def resolve_category(query: str, case_store: CaseStore,
+                     category: Optional[str] = None) -> Tuple[Optional[str], bool]:
+    """Kategori untuk membatasi pencarian: (kategori atau None, hasil tebakan?).
+
+    Kategori eksplisit (UI/API) membatasi mutlak; tanpa itu kategori ditebak
+    dari term penanda di query (CATEGORY_INFERENCE), kecuali query memuat kode
+    yang ada di database.
+    """
+    if category:
+        if category not in case_store.category_index:
+            raise ValueError(f"kategori tidak dikenal: {category}")
+        return category, False
+    # Kode ICD di query lebih spesifik dari term penanda: jangan tebak kategori
+    if CATEGORY_INFERENCE and not case_store.code_index.search(query):
+        inferred = infer_category(query, case_store.category_terms)
+        if inferred:
+            return inferred, True
+    return None, False
+
+# Per vector store: ID case per posisi FAISS dan parameter filter per kategori
+_FAISS_SCOPES = weakref.WeakKeyDictionary()
+
+def _faiss_scope(db, case_store: CaseStore, category: Optional[str]):
+    """(ID case per posisi FAISS, SearchParameters yang hanya mengizinkan `category`)."""
+    import faiss
+    import numpy as np
+    
+    scopes = _FAISS_SCOPES.get(db)
+    if scopes is None:
+        positions = [
+            db.docstore.search(db.index_to_docstore_id[pos]).metadata['id']
+            for pos in range(db.index.ntotal)
+        ]
+        scopes = _FAISS_SCOPES.setdefault(db, {None: positions})
+    if category not in scopes:
+        allowed = set(case_store.category_index.get(category, ()))
+        ids = np.array([pos for pos, case_id in enumerate(scopes[None]) if case_id in allowed], dtype=np.int64)
+        # Filter diterapkan di dalam scan FAISS, jadi jarak case di luar kategori tidak dihitung
+        scopes[category] = (len(ids), faiss.SearchParameters(sel=faiss.IDSelectorBatch(ids)))
+    return scopes[None], scopes[category]
+
+def dense_search(db, query_embedding: List[float], case_store: CaseStore, k: int,
+                 category: Optional[str] = None) -> List[str]:
+    """ID case terdekat dengan embedding query, opsional hanya di satu kategori."""
+    if category is None:
+        return [doc.metadata['id'] for doc in db.similarity_search_by_vector(query_embedding, k=k)]
+    
+    import faiss
+    import numpy as np
+    
+    case_ids, (size, params) = _faiss_scope(db, case_store, category)
+    if not size:
+        return []
+    vector = np.array([query_embedding], dtype=np.float32)
+    if getattr(db, '_normalize_L2', False):
+        faiss.normalize_L2(vector)
+    _, indices = db.index.search(vector, min(k, size), params=params)
+    return [case_ids[pos] for pos in indices[0] if pos != -1]
+
+def resolve_without_embedding(query: str, case_store: CaseStore, k: int = 3,
+                              category: Optional[str] = None) -> Tuple[Optional[List[Document]], List[str]]:
+    """Tahap murah SMART SEARCH (index kode, lalu BM25): (kandidat atau None, ID sparse).
+
+    Kandidat (paling banyak `search_candidates(k)`) belum dipotong ke `k`,
+    supaya tetap bisa di-rerank. `category` (sudah di-resolve) membatasi case
+    yang boleh muncul.
+    """
+    allowed = set(case_store.category_index.get(category, ())) if category else None
+    
+    # Cek apakah ada kode ICD-10 / ICD-9-CM (atau rentang kode) di query
+    with span("search.code_index"):
+        case_ids = case_store.code_index.search(query)
+        if allowed is not None:
+            case_ids = [case_id for case_id in case_ids if case_id in allowed]
+    
+    # Jika ada kode spesifik, ambil langsung dari index kode (tanpa embedding)
+    if case_ids:
+        set_attribute('search_path', 'code')
+        return [case_store.documents_by_id[case_id] for case_id in case_ids[:search_candidates(k)]], []
+    
+    # Sparse search (BM25 di keywords, diagnosa_utama, aspek_koding)
+    with span("search.sparse"):
+        sparse_hits = case_store.sparse_index.search(query, n=search_candidates(k), case_filter=allowed)
+    sparse_ids = [case_id for case_id, _, _ in sparse_hits]
+    
+    # Query pendek yang jelas cocok tidak perlu embedding sama sekali
+    if len(sparse_ids) >= k and is_confident(sparse_hits, SPARSE_SHORTCUT_MARGIN):
+        set_attribute('search_path', 'sparse')
+        return [case_store.documents_by_id[case_id] for case_id in sparse_ids], sparse_ids
+    
+    return None, sparse_ids
+
+def rerank_top(query: str, candidates: List[Document], k: int) -> List[Document]:
+    """`k` kandidat teratas, di-rerank dulu jika reranker aktif (lewat budget = urutan asli)."""
+    reranker = get_reranker()
+    if reranker is None:
+        return candidates[:k]
+    reranked = reranker.rerank(query, candidates)
+    set_attribute('rerank', 'ok' if reranked is not None else 'fallback')
+    return (reranked or candidates)[:k]
+
+def _search_in_scope(db, query: str, case_store: CaseStore, k: int,
+                     query_embedding: Optional[List[float]],
+                     category: Optional[str]) -> Tuple[List[Document], Optional[List[float]]]:
+    # Hasil kode dan shortcut sparse juga di-rerank (cross-encoder tidak butuh embedding query)
+    candidates, sparse_ids = resolve_without_embedding(query, case_store, k, category)
+    if candidates is not None:
+        return rerank_top(query, candidates, k), query_embedding
+    
+    # Semantic search, lalu gabungkan dengan hasil sparse
+    set_attribute('search_path', 'hybrid')
+    if query_embedding is None:
+        with span("search.embed_query"):
+            query_embedding = db.embeddings.embed_query(query)
+    with span("search.faiss"):
+        dense_ids = dense_search(db, query_embedding, case_store, search_candidates(k), category)
+    
+    with span("search.fusion"):
+        fused_ids = reciprocal_rank_fusion(
+            [sparse_ids, dense_ids], k=RRF_K, weights=FUSION_WEIGHTS
+        )
+    
+    candidates = [case_store.documents_by_id[case_id] for case_id in fused_ids[:search_candidates(k)]]
+    return rerank_top(query, candidates, k), query_embedding
+
+@traced("smart_search")
+def hybrid_search(db, query: str, case_store: CaseStore, k: int = 3,
+                  query_embedding: Optional[List[float]] = None,
+                  category: Optional[str] = None) -> Tuple[List[Document], Optional[List[float]]]:
+    """SMART SEARCH lengkap; return juga embedding query (jika sempat dihitung).
+    
+    `query_embedding` bisa diisi dari hasil embedding batch supaya tidak
+    dihitung ulang per query. `category` membatasi pencarian ke satu kategori;
+    tanpa itu kategori bisa ditebak dari query (lihat resolve_category).
+    """
+    scope, inferred = resolve_category(query, case_store, category)
+    set_attribute('category', scope)
+    docs, query_embedding = _search_in_scope(db, query, case_store, k, query_embedding, scope)
+    if inferred and len(docs) < k:
+        # Kategori tebakan hanya mempersempit; kekurangan hasil diisi dari seluruh index
+        seen = {doc.metadata['id'] for doc in docs}
+        more, query_embedding = _search_in_scope(db, query, case_store, k, query_embedding, None)
+        docs = docs + [doc for doc in more if doc.metadata['id'] not in seen][:k - len(docs)]
+    return docs, query_embedding
+
+def smart_search(db, query: str, case_store: CaseStore, k: int = 3,
+                 category: Optional[str] = None) -> List[Document]:
+    """SMART SEARCH: Optimized hybrid search (opsional dibatasi satu kategori)"""
+    return hybrid_search(db, query, case_store, k, category=category)[0]
+
+@traced("template_answer")
+def template_answer(query: str, case_store: CaseStore,
+                    category: Optional[str] = None) -> Optional[Tuple[str, List[str]]]:
+    """Jawaban deterministik tanpa LLM untuk kode / diagnosa_utama yang match persis.
+
+    Hanya jika match tidak ambigu: satu case, atau beberapa case dengan
+    diagnosa_utama yang sama. `category` eksplisit membatasi case yang boleh
+    dipakai. Return (jawaban, ID case), atau None jika query perlu dijawab LLM.
+    """
+    if not TEMPLATE_ANSWERS:
+        return None
+    match = match_exact(query, case_store.code_index, case_store.diagnosa_index, TEMPLATE_MAX_CASES)
+    if match is None:
+        return None
+    case_ids = match[2]
+    if category:
+        allowed = set(case_store.category_index.get(category, ()))
+        case_ids = [case_id for case_id in case_ids if case_id in allowed]
+        if not case_ids:
+            return None
+        match = (match[0], match[1], case_ids)
+    cases = [case_store.documents_by_id[case_id].metadata for case_id in case_ids]
+    # Tidak ambigu = satu case, atau semua case punya diagnosa_utama spesifik yang sama
+    if len(cases) > 1:
+        groups = {normalize_diagnosa(meta.get('diagnosa_utama', '')) for meta in cases}
+        if len(groups) > 1 or groups & GENERIC_DIAGNOSA or '' in groups:
+            return None
+    return render_template_answer(match, cases), case_ids
+
+def create_llm() -> "ChatGroq":
+    """Client Groq dengan konfigurasi model standar."""
+    ChatGroq = lazy_import('langchain_groq', 'ChatGroq')
+    return ChatGroq(
+        model=GROQ_MODEL,  # Model stabil Groq (gratis!)
+        temperature=0.1,
+        max_tokens=1024,
+        max_retries=0      # retry diatur oleh LLMScheduler
+    )
+
+def create_llm_scheduler(client_factory: Callable[[], object] = create_llm,
+                         rate_per_minute: float = LLM_RATE_PER_MINUTE) -> LLMScheduler:
+    """Scheduler LLM dengan kuota dan retry standar."""
+    return LLMScheduler(
+        client_factory,
+        rate_per_minute=rate_per_minute,
+        max_retries=LLM_MAX_RETRIES,
+        backoff_base=LLM_BACKOFF_BASE,
+        on_usage=record_usage
+    )
+
+def scheduler_gauges(scheduler: LLMScheduler) -> Dict[str, float]:
+    """Gauge antrean LLM untuk diekspor bersama metrik tahap."""
+    stats = scheduler.stats()
+    return {
+        'rag_llm_queue_depth': stats['queue_depth'],
+        'rag_llm_in_flight': stats['in_flight'],
+        'rag_llm_avg_wait_seconds': round(stats['avg_wait_s'], 4),
+        'rag_llm_max_wait_seconds': round(stats['max_wait_s'], 4),
+        'rag_llm_upstream_calls': stats['upstream_calls'],
+        'rag_llm_coalesced': stats['coalesced'],
+        'rag_llm_retries': stats['retries'],
+    }
+
+def create_answer_cache(db_key: str) -> AnswerCache:
+    """Cache jawaban persisten yang terikat ke versi database."""
+    return AnswerCache(
+        ANSWER_CACHE_PATH,
+        db_key,
+        max_entries=ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds=ANSWER_CACHE_TTL
+    )
+
+def answer_version() -> str:
+    """Versi jawaban = versi prompt + model LLM."""
+    return f"{PROMPT_VERSION}:{GROQ_MODEL}"
+
+@traced("answer_cache")
+def get_cached_answer(db, cache: AnswerCache, query: str, cache_key: str,
+                      embedding: Optional[List[float]] = None,
+                      case_ids: Sequence[str] = ()) -> Tuple[Optional[str], Optional[str], Optional[List[float]]]:
+    """Cari jawaban di cache: (jawaban, tier 'exact'/'semantic', embedding query).
+
+    Hit semantik hanya dari entri dengan `case_ids` hasil retrieval yang sama.
+    """
+    answer = cache.get(cache_key)
+    if answer is not None:
+        return answer, "exact", embedding
+    
+    if SEMANTIC_CACHE_THRESHOLD is None:
+        return None, None, embedding
+    
+    if embedding is None:
+        embedding = db.embeddings.embed_query(query)
+    hit = cache.get_similar(embedding, answer_version(), SEMANTIC_CACHE_THRESHOLD, case_ids)
+    if hit:
+        return hit[0], "semantic", embedding
+    return None, None, embedding
+
+@traced("prompt_build")
+def build_rag_prompt(query: str, top_docs: List[Document]) -> str:
+    """Susun prompt RAG dari query dan dokumen hasil retrieval."""
+    # Build context dari metadata, dibatasi budget token dan tanpa pengulangan
+    context, context_tokens = build_context(top_docs, CONTEXT_TOKEN_BUDGET)
+    set_attribute('context_tokens', context_tokens)
+    REGISTRY.inc('prompt.context_tokens', context_tokens)
+    
+    # PROMPT YANG SUPER EFEKTIF
+    prompt = f"""Kamu adalah ahli koding ICD-10 dan INA-CBG. Jawab dengan RINGKAS, AKURAT, dan TERSTRUKTUR.
+
+KONTEKS DATABASE:
+{context}
+
+PERTANYAAN: {query}
+
+INSTRUKSI:
+1. Jawab LANGSUNG dengan struktur:
+   - DIAGNOSA: (singkat)
+   - KODE ICD-10/ICD-9: (list dengan penjelasan 1 kalimat)
+   - PROSEDUR: (jika ada)
+   - ASPEK KODING: (poin penting saja, max 3-4 poin)
+   - PERHATIAN KHUSUS: (jika ada, max 2-3 poin)
+
+2. ATURAN PENTING:
+   - Jawab PADAT dan FOKUS (hindari pengulangan)
+   - Jika ada kode kombinasi, jelaskan secara SINGKAT
+   - Jika info tidak lengkap di konteks, katakan "Tidak ditemukan dalam database"
+   - Gunakan bullet points (•) untuk list
+
+3. FORMAT CONTOH:
+DIAGNOSA: [nama diagnosa lengkap]
+
+KODE ICD-10: 
+• A01.0 - Typhoid fever
+• A09 - Tidak dikoding jika sudah ada A01.0
+
+PROSEDUR: [jika ada, jika tidak: "Tidak ada prosedur khusus"]
+
+ASPEK KODING:
+• [poin penting 1]
+• [poin penting 2]
+
+PERHATIAN KHUSUS: [jika ada, singkat saja]
+
+Jawaban:"""
+    return prompt
+
+class StubChatModel:
+    """LLM palsu deterministik untuk load test/benchmark tanpa kuota Groq."""
+
+    class _Message(NamedTuple):
+        content: str
+
+    def __init__(self, latency: float = 0.5, tokens: int = 40):
+        self.latency = latency
+        self.tokens = tokens
+
+    def _answer(self, prompt: str) -> List[str]:
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        return [f"{digest[i % 64]} " for i in range(self.tokens)]
+
+    async def ainvoke(self, prompt: str):
+        await asyncio.sleep(self.latency)
+        return self._Message("".join(self._answer(prompt)))
+
+    async def astream(self, prompt: str):
+        tokens = self._answer(prompt)
+        for token in tokens:
+            await asyncio.sleep(self.latency / len(tokens))
+            yield self._Message(token)
+
+class RAGEngine:
+    """Pipeline retrieval + RAG tanpa ketergantungan UI.
+
+    Satu instance dipakai bersama oleh semua request/sesi; semua komponennya
+    (case store, index, cache, scheduler) aman dipakai lintas thread.
+    """
+
+    def __init__(self, case_store: CaseStore, db: "FAISS", scheduler: LLMScheduler,
+                 answer_cache: AnswerCache):
+        self.case_store = case_store
+        self.db = db
+        self.scheduler = scheduler
+        self.answer_cache = answer_cache
+
+    def search(self, query: str, k: int = 3, category: Optional[str] = None) -> List[Document]:
+        """Retrieval saja (tanpa LLM)."""
+        with trace("search", k=k):
+            return smart_search(self.db, query, self.case_store, k=k, category=category)
+
+    def needs_embedding(self, query: str, k: int = 3, use_cache: bool = True,
+                        category: Optional[str] = None) -> bool:
+        """Apakah query ini butuh embedding (dense search / cache semantik)?"""
+        if template_answer(query, self.case_store, category) is not None:
+            return False
+        if use_cache and SEMANTIC_CACHE_THRESHOLD is not None:
+            return True
+        scope, _ = resolve_category(query, self.case_store, category)
+        return resolve_without_embedding(query, self.case_store, k, scope)[0] is None
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embedding banyak query dalam satu panggilan model."""
+        if not queries:
+            return []
+        return self.db.embeddings.embed_documents(list(queries))
+
+    def _prepare(self, query: str, k: int, query_embedding: Optional[List[float]] = None,
+                 category: Optional[str] = None):
+        top_docs, embedding = hybrid_search(self.db, query, self.case_store, k, query_embedding, category)
+        case_ids = [doc.metadata['id'] for doc in top_docs]
+        cache_key = make_cache_key(query, case_ids, answer_version())
+        answer, tier, embedding = get_cached_answer(self.db, self.answer_cache, query, cache_key, embedding, case_ids)
+        set_attribute('case_ids', case_ids)
+        set_attribute('cache', tier)
+        if tier:
+            REGISTRY.inc(f"answer_cache.{tier}_hit")
+        return top_docs, cache_key, answer, tier, embedding
+
+    def _template_result(self, template: Tuple[str, List[str]], start: float) -> Dict:
+        set_attribute('answer_path', 'template')
+        REGISTRY.inc("answer.template")
+        return {
+            'answer': template[0],
+            'case_ids': template[1],
+            'cache': None,
+            'path': 'template',
+            'total_ms': round((time.perf_counter() - start) * 1000)
+        }
+
+    def answer(self, query: str, k: int = 3, query_embedding: Optional[List[float]] = None,
+               category: Optional[str] = None) -> Dict:
+        """Wrapper blocking untuk `aanswer` (jangan dipanggil dari dalam event loop)."""
+        return asyncio.run(self.aanswer(query, k, category, query_embedding))
+
+    async def aanswer(self, query: str, k: int = 3, category: Optional[str] = None,
+                      query_embedding: Optional[List[float]] = None) -> Dict:
+        """Jawaban lengkap beserta ID case sumber dan metrik.
+
+        Retrieval & cache berjalan di thread pool, LLM lewat client async. `path`
+        menunjukkan sumber jawaban: 'template', 'cache' atau 'llm'. `category`
+        membatasi retrieval ke satu kategori. Task bisa dibatalkan kapan saja;
+        jawaban hanya disimpan ke cache jika selesai.
+        """
+        start = time.perf_counter()
+        with trace("answer", k=k):
+            template = await asyncio.to_thread(template_answer, query, self.case_store, category)
+            if template is not None:
+                return self._template_result(template, start)
+            top_docs, cache_key, answer, tier, embedding = await asyncio.to_thread(
+                self._prepare, query, k, query_embedding, category
+            )
+            set_attribute('answer_path', 'cache' if tier else 'llm')
+            if answer is None:
+                prompt = build_rag_prompt(query, top_docs)
+                with span("llm.invoke"):
+                    answer = await self.scheduler.ainvoke(prompt)
+                with span("answer_cache.put"):
+                    await asyncio.to_thread(
+                        self.answer_cache.put, cache_key, query, answer, answer_version(), embedding,
+                        [doc.metadata['id'] for doc in top_docs]
+                    )
+        return {
+            'answer': answer,
+            'case_ids': [doc.metadata['id'] for doc in top_docs],
+            'cache': tier,
+            'path': 'cache' if tier else 'llm',
+            'total_ms': round((time.perf_counter() - start) * 1000)
+        }
+
+    async def astream(self, query: str, metrics: Dict, k: int = 3,
+                      category: Optional[str] = None) -> AsyncIterator[str]:
+        """Jawaban streaming token demi token; dibatalkan = token berhenti, tidak masuk cache.
+
+        `metrics` diisi `ttft_ms` (waktu sampai token pertama), `total_ms`,
+        `path` ('template'/'cache'/'llm'), dan `cache` ('exact'/'semantic')
+        jika jawaban diambil dari cache. `category` membatasi retrieval.
+        """
+        start = time.perf_counter()
+        active = begin_trace("stream", k=k)
+        error = None
+        try:
+            with use_trace(active):
+                template = await asyncio.to_thread(template_answer, query, self.case_store, category)
+            if template is not None:
+                active.attrs['answer_path'] = metrics['path'] = 'template'
+                REGISTRY.inc("answer.template")
+                metrics['ttft_ms'] = round((time.perf_counter() - start) * 1000)
+                yield template[0]
+                return
+
+            with use_trace(active):
+                top_docs, cache_key, answer, tier, embedding = await asyncio.to_thread(
+                    self._prepare, query, k, None, category
+                )
+            active.attrs['answer_path'] = metrics['path'] = 'cache' if tier else 'llm'
+            if answer is not None:
+                metrics['ttft_ms'] = round((time.perf_counter() - start) * 1000)
+                metrics['cache'] = tier
+                yield answer
+                return
+
+            with use_trace(active):
+                prompt = build_rag_prompt(query, top_docs)
+                tokens = self.scheduler.astream(prompt)
+
+            parts = []
+            llm_start = time.perf_counter()
+            async for chunk in tokens:
+                if not parts:
+                    metrics['ttft_ms'] = round((time.perf_counter() - start) * 1000)
+                    REGISTRY.observe("llm.ttft", (time.perf_counter() - llm_start) * 1000)
+                parts.append(chunk)
+                yield chunk
+            REGISTRY.observe("llm.stream", (time.perf_counter() - llm_start) * 1000)
+
+            with use_trace(active), span("answer_cache.put"):
+                await asyncio.to_thread(
+                    self.answer_cache.put, cache_key, query, "".join(parts), answer_version(), embedding,
+                    [doc.metadata['id'] for doc in top_docs]
+                )
+
+        except BaseException as e:
+            error = e
+            raise
+
+        finally:
+            metrics['total_ms'] = round((time.perf_counter() - start) * 1000)
+            active.attrs.update(ttft_ms=metrics.get('ttft_ms'))
+            finish_trace(active, error)
+
+def file_signature(path: str) -> Tuple[int, int]:
+    """(mtime_ns, ukuran) file; berubah = database perlu dimuat ulang."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+class WarmUp:
+    """Muat database, model embedding dan index di thread latar.
+
+    UI/API bisa langsung tampil; request yang butuh engine memanggil `wait()`.
+    Durasi tiap langkah (termasuk import modul berat) ada di `status()`.
+
+    Dengan `watch_interval`, file database dipantau setelah siap: versi baru
+    dimuat di latar (index di-update per case) lalu ditukar secara atomik.
+    Query yang sedang berjalan tetap memakai versi lama sampai selesai.
+    """
+
+    def __init__(self, json_file: str, watch_interval: Optional[float] = None):
+        self.json_file = json_file
+        self.watch_interval = watch_interval
+        self.step = 'menunggu'
+        self.timings: Dict[str, int] = {}
+        self.error: Optional[Exception] = None
+        self.reloads = 0
+        self.reload_error: Optional[Exception] = None
+        self._store: Optional[Tuple[CaseStore, "FAISS"]] = None
+        self._start = time.perf_counter()
+        self._done = threading.Event()
+        threading.Thread(target=self._run, name='rag-warmup', daemon=True).start()
+
+    @property
+    def case_store(self) -> Optional[CaseStore]:
+        store = self._store
+        return store[0] if store else None
+
+    @property
+    def db(self):
+        store = self._store
+        return store[1] if store else None
+
+    def _timed(self, step: str, func: Callable):
+        self.step = step
+        start = time.perf_counter()
+        result = func()
+        self.timings[step] = round((time.perf_counter() - start) * 1000)
+        return result
+
+    def _run(self):
+        signature = file_signature(self.json_file) if self.watch_interval else None
+        try:
+            for module_name in HEAVY_MODULES:
+                self._timed(f"import.{module_name}", lambda: lazy_import(module_name))
+            if SHARED_STORE_DIR:
+                case_store, db = self._timed('shared_store', lambda: open_shared_store(self.json_file))
+            else:
+                case_store = self._timed('case_store', lambda: build_case_store(self.json_file))
+                db = self._timed(
+                    'vector_store',
+                    lambda: create_vector_store(case_store.documents, case_store.index_key)
+                )
+            # Query pertama memicu inisialisasi lazy di model (tokenizer, thread pool)
+            self._timed('warm_query', lambda: db.embeddings.embed_query("warm up"))
+            if RERANK_ENABLED:
+                self._timed('reranker', lambda: get_reranker().load())
+            self._store = (case_store, db)
+            self.step = 'siap'
+        except Exception as e:
+            self.error = e
+            self.step = 'gagal'
+            print(f"Error warming up: {e}")
+        finally:
+            self.timings['total'] = round((time.perf_counter() - self._start) * 1000)
+            REGISTRY.observe('startup.warmup', self.timings['total'])
+            self._done.set()
+        if self.watch_interval and self.error is None:
+            self._watch(signature)
+
+    def _watch(self, signature: Tuple[int, int]):
+        pending = None
+        while True:
+            time.sleep(self.watch_interval)
+            try:
+                current = file_signature(self.json_file)
+            except OSError:
+                continue
+            if current == signature:
+                pending = None
+            elif current != pending:
+                # Tunggu satu interval lagi: converter mungkin masih menulis file
+                pending = current
+            else:
+                self.reload()
+                signature, pending = current, None
+
+    def reload(self):
+        """Muat versi database saat ini dan tukar atomik; gagal = versi lama tetap dipakai."""
+        start = time.perf_counter()
+        self.step = 'reload'
+        try:
+            self._store = load_store(self.json_file, self.db.embeddings)
+            self.reloads += 1
+            self.reload_error = None
+        except Exception as e:
+            self.reload_error = e
+            print(f"Error reloading database: {e}")
+        finally:
+            self.timings['reload'] = round((time.perf_counter() - start) * 1000)
+            REGISTRY.observe('reload', self.timings['reload'])
+            self.step = 'siap'
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set() and self.error is None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Tunggu warm-up selesai (berhasil atau gagal); False jika timeout."""
+        return self._done.wait(timeout)
+
+    def result(self) -> Tuple[CaseStore, "FAISS"]:
+        """(case store, vector store) versi terbaru; error warm-up dilempar ulang."""
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self._store
+
+    def status(self) -> Dict:
+        total = self.timings.get('total')
+        case_store = self.case_store
+        return {
+            'step': self.step,
+            'ready': self.ready,
+            'error': str(self.error) if self.error else None,
+            'elapsed_s': round(total / 1000 if total is not None else time.perf_counter() - self._start, 1),
+            'timings_ms': dict(self.timings),
+            'index_key': case_store.index_key if case_store else None,
+            'reloads': self.reloads,
+            'reload_error': str(self.reload_error) if self.reload_error else None,
+        }
+
+def load_engine(json_file: str, client_factory: Callable[[], object] = create_llm,
+                rate_per_minute: float = LLM_RATE_PER_MINUTE) -> RAGEngine:
+    """Muat seluruh pipeline (case store, index, cache, scheduler) sekali."""
+    case_store, db = load_store(json_file)
+    return RAGEngine(
+        case_store,
+        db,
+        create_llm_scheduler(client_factory, rate_per_minute),
+        create_answer_cache(case_store.index_key)
+    )
@@ -0,0 +1,108 @@
+"""Re-ranking kandidat retrieval dengan cross-encoder multilingual (opsional).
+
+Cross-encoder menilai pasangan (query, teks case) secara langsung, jadi case
+yang memuat aturan koding yang ditanyakan bisa naik di atas case yang hanya
+mirip secara umum. Skoring berjalan di satu thread worker dengan batas waktu
+keras per query; jika terlewati, urutan asli dipakai (hasil yang terlambat
+tetap masuk cache skor untuk query berikutnya).
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.documents import Document
+
+from answer_cache import normalize_query
+from metrics import REGISTRY, span
+
+RERANK_MODEL_NAME = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+RERANK_MAX_LENGTH = 256
+
+
+class CrossEncoderReranker:
+    """Cross-encoder CPU dengan batching, batas waktu per query dan cache skor."""
+
+    def __init__(self, model_name: str = RERANK_MODEL_NAME, batch_size: int = 16,
+                 budget_ms: float = 300, cache_size: int = 20000):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self.cache_size = cache_size
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._cache = OrderedDict()   # (query ternormalisasi, ID case) -> skor
+        self._cache_lock = threading.Lock()
+        # Satu worker: model CPU sudah multi-thread, antrean ikut dibatasi budget
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rerank')
+
+    def load(self):
+        """Muat model (sekali); dipanggil juga saat warm-up."""
+        with self._load_lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(self.model_name, device='cpu', max_length=RERANK_MAX_LENGTH)
+            return self._model
+
+    def _cached(self, query_key: str, case_ids: Sequence[str]) -> Dict[str, float]:
+        with self._cache_lock:
+            scores = {}
+            for case_id in case_ids:
+                score = self._cache.get((query_key, case_id))
+                if score is not None:
+                    self._cache.move_to_end((query_key, case_id))
+                    scores[case_id] = score
+            return scores
+
+    def _store(self, query_key: str, scores: Dict[str, float]):
+        with self._cache_lock:
+            for case_id, score in scores.items():
+                self._cache[(query_key, case_id)] = score
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _score(self, query: str, query_key: str, docs: List[Document], deadline: float) -> Optional[Dict[str, float]]:
+        # Antrean sudah melewati batas waktu: jangan bebani CPU untuk hasil yang tidak dipakai
+        if time.perf_counter() > deadline:
+            return None
+        model = self.load()
+        values = model.predict(
+            [(query, doc.page_content) for doc in docs],
+            batch_size=self.batch_size,
+            show_progress_bar=False
+        )
+        scores = {doc.metadata['id']: float(value) for doc, value in zip(docs, values)}
+        self._store(query_key, scores)
+        return scores
+
+    def rerank(self, query: str, docs: List[Document]) -> Optional[List[Document]]:
+        """Urutkan ulang `docs` menurut skor cross-encoder; None jika lewat budget/gagal."""
+        if len(docs) < 2:
+            return docs
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000
+        query_key = normalize_query(query)
+        scores = self._cached(query_key, [doc.metadata['id'] for doc in docs])
+        REGISTRY.inc("rerank.cache_hit", len(scores))
+        missing = [doc for doc in docs if doc.metadata['id'] not in scores]
+
+        if missing:
+            with span("search.rerank"):
+                future = self._executor.submit(self._score, query, query_key, missing, deadline)
+                try:
+                    fresh = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+                except TimeoutError:
+                    fresh = None
+                except Exception as e:
+                    print(f"Error reranking: {e}")
+                    REGISTRY.inc("rerank.error")
+                    return None
+            if fresh is None:
+                REGISTRY.inc("rerank.timeout")
+                return None
+            scores.update(fresh)
+
+        REGISTRY.observe("rerank.total", (time.perf_counter() - start) * 1000)
+        # sorted stabil: skor sama mempertahankan urutan retrieval
+        return sorted(docs, key=lambda doc: scores[doc.metadata['id']], reverse=True)
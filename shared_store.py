@@ -0,0 +1,414 @@
+"""Case store + index read-only yang di-memory-map bersama oleh banyak proses.
+
+Dibangun sekali ke `<RAG_SHARED_STORE>/<store_key>-v<STORE_VERSION>/` (`store_directory`):
+    manifest.json          kunci store/index, ringkasan + bagian kecil database (tanpa cases)
+    strings.bin/.npy       semua teks (UTF-8) dan offset-nya, tanpa duplikat
+    case_*.npy             kolom case sebagai indeks ke tabel string
+    *_keys/_offsets/...    posting list kode, term BM25, diagnosa_utama, kategori, ID case
+    index.faiss            vektor FAISS (di-mmap dengan IO_FLAG_MMAP_IFC)
+
+Setiap worker hanya meng-hash byte file database (kunci store, lihat
+rag_core.compute_store_key) lalu memanggil np.load(mmap_mode='r') / mmap: tidak
+ada parse JSON, tokenisasi, pembangunan index, atau salinan data per proses;
+halaman file dibagi lewat page cache OS. Objek `Document` baru dibuat untuk case
+yang benar-benar diakses.
+
+Bangun lebih dulu (opsional, worker pertama juga akan membangunnya):
+    RAG_SHARED_STORE=.shared_store python shared_store.py
+"""
+import json
+import mmap
+import os
+import re
+import shutil
+import uuid
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from icd_index import CodeIndex
+from sparse_index import BM25Index
+
+STORE_VERSION = 3
+SCALAR_FIELDS = ('id', 'diagnosa_utama', 'diagnosa', 'kategori', 'prosedur',
+                 'aspek_koding', 'perhatian_khusus', 'page_content')
+LIST_FIELDS = ('kode', 'keywords')
+NONE = -1   # indeks string untuk nilai None
+# Hanya entri dengan pola nama ini yang boleh dihapus saat membersihkan versi lama
+STORE_NAME_PATTERN = re.compile(r'^[0-9a-f]{16}-v\d+$')
+
+
+def store_directory(root: str, store_key: str) -> str:
+    """Direktori store untuk `store_key` di bawah RAG_SHARED_STORE."""
+    return os.path.join(root, f"{store_key}-v{STORE_VERSION}")
+
+
+def read_manifest(directory: str) -> Optional[Dict]:
+    """Manifest store di `directory`, atau None jika store belum (selesai) dibangun."""
+    try:
+        with open(os.path.join(directory, 'manifest.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+# --- PENULISAN ---
+
+class _StringWriter:
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.values: List[bytes] = []
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return NONE
+        if value not in self.index:
+            self.index[value] = len(self.values)
+            self.values.append(value.encode('utf-8'))
+        return self.index[value]
+
+    def save(self, directory: str):
+        offsets = np.zeros(len(self.values) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in self.values], out=offsets[1:])
+        with open(os.path.join(directory, 'strings.bin'), 'wb') as f:
+            f.write(b''.join(self.values))
+        np.save(os.path.join(directory, 'strings.npy'), offsets)
+
+
+def _save_postings(directory: str, name: str, strings: _StringWriter,
+                   postings: Dict[str, List], dtypes: tuple):
+    """Simpan mapping string -> daftar nilai sebagai array terurut + offset."""
+    keys = sorted(postings)
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum([len(postings[key]) for key in keys], out=offsets[1:])
+    np.save(os.path.join(directory, f'{name}_keys.npy'),
+            np.array([strings.add(key) for key in keys], dtype=np.int32))
+    np.save(os.path.join(directory, f'{name}_offsets.npy'), offsets)
+    for column, dtype in enumerate(dtypes):
+        values = [item[column] if len(dtypes) > 1 else item for key in keys for item in postings[key]]
+        np.save(os.path.join(directory, f'{name}_values{column}.npy'), np.array(values, dtype=dtype))
+
+
+def write_shared_store(case_store, db, directory: str, embedding_model_name: str, store_key: str):
+    """Tulis case store + index FAISS ke `directory` secara atomik."""
+    import faiss
+
+    tmp_dir = f"{directory}.tmp-{uuid.uuid4().hex[:8]}"
+    os.makedirs(tmp_dir)
+    try:
+        strings = _StringWriter()
+        documents = list(case_store.documents)
+        position = {doc.metadata['id']: idx for idx, doc in enumerate(documents)}
+
+        scalars = np.full((len(documents), len(SCALAR_FIELDS)), NONE, dtype=np.int32)
+        list_offsets = np.zeros(len(documents) * len(LIST_FIELDS) + 1, dtype=np.int64)
+        list_values = []
+        for idx, doc in enumerate(documents):
+            for column, field in enumerate(SCALAR_FIELDS):
+                value = doc.page_content if field == 'page_content' else doc.metadata.get(field)
+                scalars[idx, column] = strings.add(value)
+            for column, field in enumerate(LIST_FIELDS):
+                list_values.extend(strings.add(value) for value in doc.metadata.get(field) or [])
+                list_offsets[idx * len(LIST_FIELDS) + column + 1] = len(list_values)
+        np.save(os.path.join(tmp_dir, 'case_scalars.npy'), scalars)
+        np.save(os.path.join(tmp_dir, 'case_list_offsets.npy'), list_offsets)
+        np.save(os.path.join(tmp_dir, 'case_list_values.npy'), np.array(list_values, dtype=np.int32))
+
+        _save_postings(tmp_dir, 'ids', strings, {case_id: [idx] for case_id, idx in position.items()},
+                       (np.int32,))
+        _save_postings(tmp_dir, 'codes', strings,
+                       {code: [position[case_id] for case_id in case_store.code_index.exact(code)]
+                        for code in case_store.code_index.codes_with_prefix('')},
+                       (np.int32,))
+        _save_postings(tmp_dir, 'diagnosa', strings,
+                       {key: [position[case_id] for case_id in ids]
+                        for key, ids in case_store.diagnosa_index.items()},
+                       (np.int32,))
+        _save_postings(tmp_dir, 'kategori', strings,
+                       {category: [position[case_id] for case_id in ids]
+                        for category, ids in case_store.category_index.items()},
+                       (np.int32,))
+        _save_postings(tmp_dir, 'category_terms', strings,
+                       {term: [strings.add(category)] for term, category in case_store.category_terms.items()},
+                       (np.int32,))
+
+        sparse = case_store.sparse_index
+        _save_postings(tmp_dir, 'terms', strings,
+                       {term: [(position[sparse.case_ids[doc_idx]], tf) for doc_idx, tf in docs]
+                        for term, docs in sparse.postings.items()},
+                       (np.int32, np.float64))
+        terms_sorted = sorted(sparse.postings)
+        np.save(os.path.join(tmp_dir, 'terms_idf.npy'),
+                np.array([sparse.idf[term] for term in terms_sorted], dtype=np.float64))
+        doc_lengths = np.zeros(len(documents), dtype=np.float64)
+        for doc_idx, case_id in enumerate(sparse.case_ids):
+            doc_lengths[position[case_id]] = sparse.doc_lengths[doc_idx]
+        np.save(os.path.join(tmp_dir, 'doc_lengths.npy'), doc_lengths)
+
+        # Posisi vektor FAISS -> indeks case
+        faiss_positions = np.full(db.index.ntotal, NONE, dtype=np.int32)
+        for pos, docstore_id in db.index_to_docstore_id.items():
+            faiss_positions[pos] = position[db.docstore.search(docstore_id).metadata['id']]
+        np.save(os.path.join(tmp_dir, 'faiss_positions.npy'), faiss_positions)
+        faiss.write_index(db.index, os.path.join(tmp_dir, 'index.faiss'))
+
+        strings.save(tmp_dir)
+        json_meta = {key: value for key, value in case_store.json_data.items() if key != 'cases'}
+        manifest = {
+            'version': STORE_VERSION,
+            'store_key': store_key,
+            'index_key': case_store.index_key,
+            'embedding_model': embedding_model_name,
+            'cases': len(documents),
+            'bm25': {'k1': sparse.k1, 'b': sparse.b, 'avg_length': sparse.avg_length,
+                     'field_weights': sparse.field_weights},
+            'json_meta': json_meta,
+        }
+        # manifest ditulis terakhir: direktori tanpa manifest dianggap belum jadi
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+        try:
+            os.rename(tmp_dir, directory)
+        except OSError:
+            # Proses lain sudah selesai membangun store yang sama
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # Hapus store versi lama saja; file lain di direktori induk bukan milik modul ini.
+    # Direktori .tmp- proses lain dibiarkan (mungkin masih ditulis).
+    parent = os.path.dirname(directory)
+    for name in os.listdir(parent):
+        if name != os.path.basename(directory) and STORE_NAME_PATTERN.match(name):
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+
+
+# --- PEMBACAAN (ZERO-COPY) ---
+
+class _StringTable:
+    """Tabel string di-mmap; string di-decode hanya saat diakses."""
+
+    def __init__(self, directory: str):
+        self._offsets = np.load(os.path.join(directory, 'strings.npy'), mmap_mode='r')
+        with open(os.path.join(directory, 'strings.bin'), 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def __getitem__(self, index: int) -> Optional[str]:
+        if index < 0:
+            return None
+        return self._data[int(self._offsets[index]):int(self._offsets[index + 1])].decode('utf-8')
+
+
+class _StringView(Sequence):
+    """Urutan string dari array indeks (mendukung bisect dan slicing)."""
+
+    def __init__(self, strings: _StringTable, indices: np.ndarray):
+        self._strings = strings
+        self._indices = indices
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._strings[int(i)] for i in self._indices[item]]
+        return self._strings[int(self._indices[item])]
+
+
+class _PostingTable(Mapping):
+    """Mapping string terurut -> nilai, dicari dengan binary search."""
+
+    def __init__(self, directory: str, name: str, strings: _StringTable,
+                 convert: Callable[[int, int, int], object]):
+        self.keys_view = _StringView(strings, np.load(os.path.join(directory, f'{name}_keys.npy'), mmap_mode='r'))
+        self.offsets = np.load(os.path.join(directory, f'{name}_offsets.npy'), mmap_mode='r')
+        self._convert = convert
+
+    def find(self, key: str) -> int:
+        i = bisect_left(self.keys_view, key)
+        return i if i < len(self.keys_view) and self.keys_view[i] == key else -1
+
+    def __getitem__(self, key: str):
+        i = self.find(key)
+        if i < 0:
+            raise KeyError(key)
+        return self._convert(i, int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and self.find(key) >= 0
+
+    def __iter__(self):
+        return iter(self.keys_view)
+
+    def __len__(self) -> int:
+        return len(self.keys_view)
+
+
+def _load_values(directory: str, name: str, column: int = 0) -> np.ndarray:
+    return np.load(os.path.join(directory, f'{name}_values{column}.npy'), mmap_mode='r')
+
+
+class MappedCodeIndex(CodeIndex):
+    """CodeIndex di atas posting list yang di-mmap (tanpa dict/list di memori)."""
+
+    def __init__(self, postings: _PostingTable):
+        self._postings = postings
+        self._codes = postings.keys_view
+
+
+class MappedBM25Index(BM25Index):
+    """BM25Index di atas array yang di-mmap; skor sama dengan versi di memori."""
+
+    def __init__(self, postings: _PostingTable, idf: _PostingTable, doc_lengths: np.ndarray,
+                 case_ids: Sequence, params: Dict):
+        self.field_weights = params['field_weights']
+        self.k1 = params['k1']
+        self.b = params['b']
+        self.avg_length = params['avg_length']
+        self.postings = postings
+        self.idf = idf
+        self.doc_lengths = doc_lengths
+        self.case_ids = case_ids
+
+
+class _MappedDocuments(Sequence):
+    """Dokumen case; `Document` dibuat dari data mmap saat diakses."""
+
+    def __init__(self, strings: _StringTable, scalars: np.ndarray,
+                 list_offsets: np.ndarray, list_values: np.ndarray):
+        self._strings = strings
+        self._scalars = scalars
+        self._list_offsets = list_offsets
+        self._list_values = list_values
+
+    def __len__(self) -> int:
+        return len(self._scalars)
+
+    def field(self, idx: int, name: str) -> Optional[str]:
+        return self._strings[int(self._scalars[idx, SCALAR_FIELDS.index(name)])]
+
+    def list_field(self, idx: int, name: str) -> List[str]:
+        slot = idx * len(LIST_FIELDS) + LIST_FIELDS.index(name)
+        lo, hi = int(self._list_offsets[slot]), int(self._list_offsets[slot + 1])
+        return [self._strings[int(i)] for i in self._list_values[lo:hi]]
+
+    def metadata(self, idx: int) -> Dict:
+        row = [self._strings[int(i)] for i in self._scalars[idx]]
+        meta = dict(zip(SCALAR_FIELDS, row))
+        meta.pop('page_content')
+        meta['diagnosa_utama'] = meta['diagnosa_utama'] or ''
+        for name in LIST_FIELDS:
+            meta[name] = self.list_field(idx, name)
+        return meta
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        idx = int(item)
+        return Document(page_content=self.field(idx, 'page_content'), metadata=self.metadata(idx))
+
+
+class _CaseRecords(Sequence):
+    """json_data['cases'] versi mmap: dict case dengan nama field asli."""
+
+    def __init__(self, documents: _MappedDocuments):
+        self._documents = documents
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        meta = self._documents.metadata(int(item))
+        meta['kode_diagnosa'] = meta.pop('kode')
+        return meta
+
+
+class _MappedDocstore:
+    """Docstore untuk wrapper FAISS LangChain: ID docstore = indeks case."""
+
+    def __init__(self, documents: _MappedDocuments):
+        self._documents = documents
+
+    def search(self, search) -> Document:
+        return self._documents[int(search)]
+
+
+def open_shared_store(directory: str, store_key: str) -> Dict:
+    """Buka store (semua array di-mmap). Return komponen untuk CaseStore + FAISS."""
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"shared store belum dibangun: {directory}")
+    if manifest.get('version') != STORE_VERSION:
+        raise ValueError(f"versi shared store tidak cocok: {manifest.get('version')}")
+    if manifest.get('store_key') != store_key:
+        raise ValueError(f"kunci shared store tidak cocok: {manifest.get('store_key')} != {store_key}")
+
+    def load(name):
+        return np.load(os.path.join(directory, name), mmap_mode='r')
+
+    strings = _StringTable(directory)
+    documents = _MappedDocuments(strings, load('case_scalars.npy'),
+                                 load('case_list_offsets.npy'), load('case_list_values.npy'))
+    case_ids = _StringView(strings, load('case_scalars.npy')[:, SCALAR_FIELDS.index('id')])
+
+    def case_id_list(values):
+        return lambda i, lo, hi: [case_ids[int(j)] for j in values[lo:hi]]
+
+    id_values = _load_values(directory, 'ids')
+    code_values = _load_values(directory, 'codes')
+    term_docs, term_tf = _load_values(directory, 'terms', 0), _load_values(directory, 'terms', 1)
+    idf = load('terms_idf.npy')
+    category_values = _load_values(directory, 'category_terms')
+
+    return {
+        'manifest': manifest,
+        'json_data': dict(manifest['json_meta'], cases=_CaseRecords(documents)),
+        'documents': documents,
+        'documents_by_id': _PostingTable(directory, 'ids', strings,
+                                         lambda i, lo, hi: documents[int(id_values[lo])]),
+        'code_index': MappedCodeIndex(_PostingTable(directory, 'codes', strings,
+                                                    lambda i, lo, hi: tuple(case_id_list(code_values)(i, lo, hi)))),
+        'sparse_index': MappedBM25Index(
+            _PostingTable(directory, 'terms', strings,
+                          lambda i, lo, hi: list(zip(term_docs[lo:hi].tolist(), term_tf[lo:hi].tolist()))),
+            _PostingTable(directory, 'terms', strings, lambda i, lo, hi: float(idf[i])),
+            load('doc_lengths.npy'),
+            case_ids,
+            manifest['bm25']
+        ),
+        'diagnosa_index': _PostingTable(directory, 'diagnosa', strings,
+                                        case_id_list(_load_values(directory, 'diagnosa'))),
+        'category_index': _PostingTable(directory, 'kategori', strings,
+                                        case_id_list(_load_values(directory, 'kategori'))),
+        'category_terms': _PostingTable(directory, 'category_terms', strings,
+                                        lambda i, lo, hi: strings[int(category_values[lo])]),
+        'docstore': _MappedDocstore(documents),
+        'faiss_positions': load('faiss_positions.npy'),
+        'faiss_path': os.path.join(directory, 'index.faiss'),
+    }
+
+
+def main():
+    import argparse
+    import rag_core
+
+    parser = argparse.ArgumentParser(description="Bangun shared store (mmap) untuk mode multi-proses")
+    parser.add_argument('--json-file', default='medical_database_structured2.json')
+    args = parser.parse_args()
+    if not rag_core.SHARED_STORE_DIR:
+        raise SystemExit("Set RAG_SHARED_STORE ke direktori tujuan, mis. RAG_SHARED_STORE=.shared_store")
+    rag_core.load_store(args.json_file)
+    store_key = rag_core.compute_store_key(args.json_file)
+    print(f"Shared store siap: {store_directory(rag_core.SHARED_STORE_DIR, store_key)}")
+
+
+if __name__ == '__main__':
+    main()
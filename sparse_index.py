@@ -0,0 +1,124 @@
+import math
+import re
+from collections import Counter
+from typing import Container, Dict, List, Optional, Sequence, Tuple
+
+# Bobot field mengikuti panduan_pencarian: keywords & diagnosa_utama prioritas utama
+FIELD_WEIGHTS = {
+    'keywords': 3.0,
+    'diagnosa_utama': 3.0,
+    'aspek_koding': 1.0,
+}
+
+# Kata umum pertanyaan yang tidak membantu membedakan case
+STOPWORDS = {
+    'apa', 'apakah', 'bagaimana', 'berapa', 'yang', 'dan', 'atau', 'untuk',
+    'dengan', 'pada', 'di', 'ke', 'dari', 'ini', 'itu', 'jika', 'kalau',
+    'adalah', 'saja', 'jelaskan', 'tolong', 'mohon', 'dipakai', 'digunakan',
+    'pakai', 'kode', 'koding', 'kodenya', 'aspek', 'perhatian', 'khusus',
+    'the', 'of', 'and', 'with', 'yg',
+}
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokenisasi sederhana: huruf kecil, alfanumerik, tanpa stopword."""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS and len(token) > 1
+    ]
+
+
+def _field_text(case: Dict, field: str) -> str:
+    value = case.get(field) or ''
+    if isinstance(value, list):
+        return ' '.join(value)
+    return value
+
+
+class BM25Index:
+    """Inverted index BM25 (varian BM25F sederhana dengan bobot per field)."""
+
+    def __init__(self, cases: Sequence[Dict], field_weights: Dict[str, float] = None,
+                 k1: float = 1.5, b: float = 0.75):
+        self.field_weights = field_weights or FIELD_WEIGHTS
+        self.k1 = k1
+        self.b = b
+        self.case_ids: List[str] = []
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        self.doc_lengths: List[float] = []
+
+        for doc_idx, case in enumerate(cases):
+            self.case_ids.append(case['id'])
+            weighted_tf: Counter = Counter()
+            for field, weight in self.field_weights.items():
+                for token in tokenize(_field_text(case, field)):
+                    weighted_tf[token] += weight
+            self.doc_lengths.append(sum(weighted_tf.values()))
+            for token, tf in weighted_tf.items():
+                self.postings.setdefault(token, []).append((doc_idx, tf))
+
+        total_docs = len(self.case_ids)
+        self.avg_length = (sum(self.doc_lengths) / total_docs) if total_docs else 0.0
+        self.idf = {
+            token: math.log(1 + (total_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for token, docs in self.postings.items()
+        }
+
+    def search(self, query: str, n: int = 10,
+               case_filter: Optional[Container[str]] = None) -> List[Tuple[str, float, float]]:
+        """Top-n case untuk query: list (case_id, skor, cakupan term query).
+
+        Cakupan = porsi term query (yang dikenal index) yang muncul di case.
+        `case_filter` (ID case) membatasi case yang diberi skor sama sekali.
+        """
+        terms = [term for term in dict.fromkeys(tokenize(query)) if term in self.postings]
+        if not terms:
+            return []
+
+        scores: Dict[int, float] = {}
+        matched: Counter = Counter()
+        for term in terms:
+            idf = self.idf[term]
+            for doc_idx, tf in self.postings[term]:
+                if case_filter is not None and self.case_ids[doc_idx] not in case_filter:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_idx] / self.avg_length)
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                matched[doc_idx] += 1
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n]
+        return [
+            (self.case_ids[doc_idx], score, matched[doc_idx] / len(terms))
+            for doc_idx, score in ranked
+        ]
+
+
+def is_confident(hits: List[Tuple[str, float, float]], margin: float = 1.5) -> bool:
+    """Hasil sparse cukup meyakinkan untuk melewati pencarian dense?
+
+    Syarat: case teratas memuat semua term query dan skornya unggul
+    minimal `margin` kali dari case kedua.
+    """
+    if not hits or hits[0][2] < 1.0:
+        return False
+    if len(hits) == 1:
+        return True
+    return hits[0][1] >= margin * hits[1][1]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60,
+                           weights: Sequence[float] = None) -> List[str]:
+    """Gabungkan beberapa daftar peringkat ID dengan Reciprocal Rank Fusion."""
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, case_id in enumerate(ranking):
+            fused[case_id] = fused.get(case_id, 0.0) + weight / (k + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)
+
+
+def build_sparse_index(json_data: Dict) -> BM25Index:
+    """Bangun index BM25 dari semua case di database."""
+    return BM25Index(json_data['cases'])
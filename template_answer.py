@@ -0,0 +1,112 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from icd_index import CodeIndex
+
+# Kata pengisi yang boleh ada di query tanpa mengubah maknanya
+FILLER_WORDS = {
+    'apa', 'apakah', 'kode', 'koding', 'code', 'coding', 'icd', 'icd-10', 'icd10', 'icd-9',
+    'icd9', 'icd-9-cm', 'untuk', 'dari', 'adalah', 'diagnosa', 'diagnosis', 'jelaskan',
+    'bagaimana', 'info', 'informasi', 'tentang', 'yang', 'dipakai', 'digunakan'
+}
+# diagnosa_utama generik yang tidak pernah dianggap match persis
+GENERIC_DIAGNOSA = {'tidak ada diagnosa spesifik'}
+EMPTY_FIELD = 'Tidak ada informasi'
+
+_WORD_PATTERN = re.compile(r'[\w\-\.]+')
+_PAREN_PATTERN = re.compile(r'\([^)]*\)')
+
+
+def normalize_diagnosa(text: str) -> str:
+    """Huruf kecil, tanpa keterangan dalam kurung (mis. '(A15.6)', '(TB)')."""
+    text = _PAREN_PATTERN.sub(' ', text or '').lower()
+    return ' '.join(word.strip('.') for word in _WORD_PATTERN.findall(text) if word.strip('.'))
+
+
+def build_diagnosa_index(json_data: Dict) -> Dict[str, List[str]]:
+    """diagnosa_utama ternormalisasi -> ID case."""
+    index: Dict[str, List[str]] = {}
+    for case in json_data['cases']:
+        key = normalize_diagnosa(case.get('diagnosa_utama', ''))
+        if key and key not in GENERIC_DIAGNOSA:
+            index.setdefault(key, []).append(case['id'])
+    return index
+
+
+def _content_words(query: str) -> List[str]:
+    words = [word.strip('.') for word in _WORD_PATTERN.findall(query.lower())]
+    return [word for word in words if word and word not in FILLER_WORDS]
+
+
+def match_exact(query: str, code_index: CodeIndex, diagnosa_index: Dict[str, List[str]],
+                max_cases: int = 3) -> Optional[Tuple[str, str, List[str]]]:
+    """Cek apakah query cukup dijawab dari database tanpa LLM.
+
+    Return (jenis match, kunci, ID case) jika query hanya berisi satu kode yang
+    ada di database, atau persis sama dengan satu `diagnosa_utama`, dan
+    jumlah case-nya tidak lebih dari `max_cases`. Selain itu None.
+    """
+    ranges, codes = code_index.extract_codes(query)
+    if ranges or len(codes) > 1:
+        return None
+
+    if codes:
+        code = codes[0]
+        rest = [word for word in _content_words(query) if word.upper().replace('.', '') != code.replace('.', '')]
+        case_ids = code_index.exact(code)
+        if rest or not case_ids or len(case_ids) > max_cases:
+            return None
+        return 'code', code, case_ids
+
+    key = ' '.join(_content_words(_PAREN_PATTERN.sub(' ', query)))
+    case_ids = diagnosa_index.get(key)
+    if not case_ids or len(case_ids) > max_cases:
+        return None
+    return 'diagnosa', key, list(case_ids)
+
+
+def _field(text: Optional[str]) -> str:
+    """Isi field apa adanya, atau 'Tidak ada informasi' jika kosong."""
+    return text.strip() if text and text.strip() else EMPTY_FIELD
+
+
+def render_case(meta: Dict, highlight_code: Optional[str] = None) -> str:
+    """Lima kategori wajib (instruksi_ai.format_jawaban_wajib) untuk satu case."""
+    codes = meta.get('kode') or []
+    if codes:
+        code_lines = "\n".join(
+            f"- **{code}**" if code == highlight_code else f"- {code}" for code in codes
+        )
+    else:
+        code_lines = EMPTY_FIELD
+
+    diagnosa = meta.get('diagnosa_utama') or EMPTY_FIELD
+    if meta.get('diagnosa') and meta['diagnosa'].strip() != diagnosa:
+        diagnosa = f"{diagnosa} — {meta['diagnosa']}"
+
+    return f"""DIAGNOSA: {diagnosa}
+
+KODE ICD-10/ICD-9-CM:
+{code_lines}
+
+PROSEDUR: {_field(meta.get('prosedur'))}
+
+ASPEK KODING:
+{_field(meta.get('aspek_koding'))}
+
+PERHATIAN KHUSUS:
+{_field(meta.get('perhatian_khusus'))}"""
+
+
+def render_template_answer(match: Tuple[str, str, List[str]], cases: List[Dict]) -> str:
+    """Jawaban terstruktur langsung dari field case yang cocok."""
+    kind, key, _ = match
+    highlight = key if kind == 'code' else None
+    if len(cases) == 1:
+        return render_case(cases[0], highlight)
+
+    label = f"kode {key}" if kind == 'code' else f"diagnosa '{key}'"
+    parts = [f"Ditemukan {len(cases)} kasus untuk {label}:"]
+    for meta in cases:
+        parts.append(f"### {meta['id']} — {meta.get('diagnosa_utama') or EMPTY_FIELD}\n\n{render_case(meta, highlight)}")
+    return "\n\n".join(parts)
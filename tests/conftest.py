@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DATABASE = os.path.join(ROOT, 'medical_database_structured2.json')
+
+
+@pytest.fixture(scope='session')
+def database_file() -> str:
+    """Database bawaan repo (206 case) sebagai data uji yang realistis."""
+    return DATABASE
+
+
+class CountingEmbeddings(Embeddings):
+    """Embedding palsu deterministik (per teks) yang menghitung teks yang di-embed."""
+
+    def __init__(self, size: int = 32):
+        self._inner = DeterministicFakeEmbedding(size=size)
+        self.embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return self._inner.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self._inner.embed_query(text)
+
+
+@pytest.fixture
+def embeddings() -> CountingEmbeddings:
+    return CountingEmbeddings()
+
+
+@pytest.fixture
+def index_cache(tmp_path, monkeypatch) -> str:
+    """INDEX_CACHE_DIR sementara agar test tidak memakai/menimpa cache repo."""
+    import rag_core
+
+    cache_dir = str(tmp_path / 'index_cache')
+    monkeypatch.setattr(rag_core, 'INDEX_CACHE_DIR', cache_dir)
+    return cache_dir
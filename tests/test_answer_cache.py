@@ -0,0 +1,72 @@
+import pytest
+
+import answer_cache
+from answer_cache import AnswerCache, make_cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(answer_cache.time, 'time', clock)
+    return clock
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path, clock):
+    cache = AnswerCache(str(tmp_path / 'cache.db'), 'db1', max_entries=2)
+    cache.put('a', 'query a', 'jawaban a', 'v1')
+    clock.now += 1
+    cache.put('b', 'query b', 'jawaban b', 'v1')
+    clock.now += 1
+    assert cache.get('a') == 'jawaban a'   # 'a' jadi yang terbaru dipakai
+    clock.now += 1
+    cache.put('c', 'query c', 'jawaban c', 'v1')
+
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') == 'jawaban a' and cache.get('c') == 'jawaban c'
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = AnswerCache(str(tmp_path / 'cache.db'), 'db1', ttl_seconds=60)
+    cache.put('a', 'query a', 'jawaban a', 'v1', embedding=[1.0, 0.0], case_ids=['C1'])
+    clock.now += 59
+    assert cache.get('a') == 'jawaban a'
+    clock.now += 2
+    assert cache.get('a') is None
+    assert cache.get_similar([1.0, 0.0], 'v1', 0.9, ['C1']) is None
+    cache.put('b', 'query b', 'jawaban b', 'v1')
+    assert len(cache) == 1   # entri kedaluwarsa dibuang saat put
+
+
+def test_database_change_purges_entries(tmp_path, clock):
+    path = str(tmp_path / 'cache.db')
+    AnswerCache(path, 'db1').put('a', 'query a', 'jawaban a', 'v1')
+    assert AnswerCache(path, 'db1').get('a') == 'jawaban a'
+
+    cache = AnswerCache(path, 'db2')
+    assert len(cache) == 0
+    assert cache.get('a') is None
+
+
+def test_semantic_tier_requires_same_case_set(tmp_path, clock):
+    cache = AnswerCache(str(tmp_path / 'cache.db'), 'db1')
+    cache.put('a', 'demam tifoid', 'jawaban a', 'v1', embedding=[1.0, 0.0], case_ids=['C2', 'C1'])
+
+    answer, score = cache.get_similar([0.99, 0.05], 'v1', 0.9, ['C1', 'C2'])
+    assert answer == 'jawaban a' and score > 0.9
+    assert cache.get_similar([0.99, 0.05], 'v1', 0.9, ['C1', 'C3']) is None
+    assert cache.get_similar([0.99, 0.05], 'v2', 0.9, ['C1', 'C2']) is None
+    assert cache.get_similar([0.0, 1.0], 'v1', 0.9, ['C1', 'C2']) is None
+
+
+def test_cache_key_ignores_case_and_order():
+    assert make_cache_key('Demam Tifoid?', ['C2', 'C1'], 'v1') == make_cache_key(' demam  tifoid', ['C1', 'C2'], 'v1')
+    assert make_cache_key('demam tifoid', ['C1'], 'v1') != make_cache_key('demam tifoid', ['C1'], 'v2')
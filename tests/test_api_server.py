@@ -0,0 +1,70 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import api_server
+import rag_core
+
+
+@pytest.fixture
+def api_url(tmp_path, monkeypatch, database_file, embeddings, index_cache):
+    """API nyata di port acak: warm-up dengan embedding palsu dan LLM stub."""
+    monkeypatch.setattr(rag_core, 'HEAVY_MODULES', ())
+    monkeypatch.setattr(rag_core, 'SHARED_STORE_DIR', None)
+    monkeypatch.setattr(rag_core, 'create_embedding_model', lambda backend=None: embeddings)
+    monkeypatch.setattr(rag_core, 'ANSWER_CACHE_PATH', str(tmp_path / 'answer_cache.db'))
+    monkeypatch.setattr(api_server.APIHandler, 'engine', None)
+    monkeypatch.setattr(api_server.APIHandler, 'warmup', rag_core.WarmUp(database_file))
+    monkeypatch.setattr(api_server.APIHandler, 'scheduler', rag_core.create_llm_scheduler(
+        lambda: rag_core.StubChatModel(latency=0.01), rate_per_minute=1e6))
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), api_server.APIHandler)
+    server.daemon_threads = True
+    server.quiet = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, body: bytes):
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.mark.parametrize('body', [b'[1, 2]', b'"teks"', b'null', b'{bukan json'])
+def test_bad_body_is_rejected(api_url, body):
+    status, payload = post(f"{api_url}/search", body)
+    assert status == 400 and payload['error']
+
+
+@pytest.mark.parametrize('k', [[3], {'n': 3}, 'tiga', '2.5', True, 2.5, None])
+def test_bad_k_is_rejected(api_url, k):
+    status, payload = post(f"{api_url}/search", json.dumps({'query': 'demam tifoid', 'k': k}).encode())
+    assert status == 400
+    assert 'k' in payload['error']
+
+
+def test_k_is_clamped(api_url):
+    status, payload = post(f"{api_url}/search", json.dumps({'query': 'demam tifoid', 'k': '500'}).encode())
+    assert status == 200
+    assert len(payload['results']) == api_server.MAX_K
+
+
+def test_answer_with_stub_llm(api_url):
+    status, payload = post(f"{api_url}/answer", json.dumps({'query': 'demam tifoid dengan diare', 'k': 3}).encode())
+    assert status == 200
+    assert payload['path'] == 'llm'
+    assert len(payload['case_ids']) == 3 and payload['answer']
+
+    status, again = post(f"{api_url}/answer", json.dumps({'query': 'demam tifoid dengan diare', 'k': 3}).encode())
+    assert status == 200 and again['path'] == 'cache'
+    assert again['answer'] == payload['answer']
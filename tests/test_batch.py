@@ -0,0 +1,78 @@
+import json
+
+from batch import load_completed_rows, run_batch
+
+
+class FakeEngine:
+    """Engine palsu: query yang ada di `failing` gagal sekali, lalu berhasil."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.answered = []
+
+    def needs_embedding(self, query, k=3, use_cache=True, category=None):
+        return False
+
+    def embed_queries(self, queries):
+        return []
+
+    def answer(self, query, k=3, query_embedding=None, category=None):
+        self.answered.append(query)
+        if query in self.failing:
+            self.failing.discard(query)
+            raise RuntimeError("upstream error")
+        return {'answer': f"jawaban {query}", 'case_ids': ['CASE-001'], 'cache': None, 'path': 'llm'}
+
+
+def write_input(path, queries):
+    path.write_text(''.join(json.dumps({'query': query}) + '\n' for query in queries), encoding='utf-8')
+    return str(path)
+
+
+def read_output(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_rerun_retries_errors_and_skips_completed_rows(tmp_path):
+    input_file = write_input(tmp_path / 'input.jsonl', ['q0', 'q1', 'q2'])
+    output_file = str(tmp_path / 'output.jsonl')
+
+    first = FakeEngine(failing={'q1'})
+    summary = run_batch(first, input_file, output_file, concurrency=2)
+    assert summary['errors'] == 1
+
+    second = FakeEngine()
+    summary = run_batch(second, input_file, output_file, concurrency=2)
+    assert second.answered == ['q1']
+    assert summary['skipped'] == 2 and summary['errors'] == 0
+
+    records = read_output(output_file)
+    assert sorted(record['row'] for record in records) == [0, 1, 2]
+    assert not any(record.get('error') for record in records)
+
+
+def test_truncated_last_line_is_reprocessed(tmp_path):
+    input_file = write_input(tmp_path / 'input.jsonl', ['q0', 'q1'])
+    output_file = tmp_path / 'output.jsonl'
+    run_batch(FakeEngine(), input_file, str(output_file))
+    # Proses mati saat menulis record terakhir
+    content = output_file.read_text(encoding='utf-8').splitlines()
+    output_file.write_text(content[0] + '\n' + content[1][:15], encoding='utf-8')
+
+    engine = FakeEngine()
+    run_batch(engine, input_file, str(output_file))
+    assert engine.answered == ['q1']
+    assert [record['row'] for record in read_output(output_file)] == [0, 1]
+
+
+def test_duplicate_records_are_collapsed_to_the_newest(tmp_path):
+    output_file = tmp_path / 'output.jsonl'
+    output_file.write_text(''.join(json.dumps(record) + '\n' for record in [
+        {'row': 0, 'answer': 'lama'},
+        {'row': 1, 'error': 'gagal'},
+        {'row': 0, 'answer': 'baru'},
+    ]), encoding='utf-8')
+
+    assert load_completed_rows(str(output_file)) == {0}
+    assert read_output(output_file) == [{'row': 0, 'answer': 'baru'}]
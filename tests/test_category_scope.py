@@ -0,0 +1,62 @@
+import pytest
+
+import rag_core
+
+
+@pytest.fixture(scope='module')
+def case_store(database_file):
+    return rag_core.build_case_store(database_file)
+
+
+@pytest.fixture
+def db(case_store, embeddings, index_cache):
+    return rag_core.create_vector_store(case_store.documents, case_store.index_key, embeddings)
+
+
+@pytest.fixture(autouse=True)
+def scope_settings(monkeypatch):
+    monkeypatch.setattr(rag_core, 'CATEGORY_INFERENCE', True)
+    monkeypatch.setattr(rag_core, 'RERANK_ENABLED', False)
+
+
+def ids(docs):
+    return [doc.metadata['id'] for doc in docs]
+
+
+def test_marker_term_infers_category(case_store):
+    assert rag_core.resolve_category('sectio caesar indikasi', case_store) == ('kehamilan_persalinan', True)
+    assert rag_core.resolve_category('efusi', case_store) == ('neoplasma', True)
+
+
+def test_code_in_query_disables_inference(case_store, db):
+    # "caesar" menunjuk kehamilan_persalinan, tapi kode A01.0 lebih spesifik
+    assert rag_core.resolve_category('A01.0 caesar', case_store) == (None, False)
+    assert ids(rag_core.smart_search(db, 'A01.0 caesar', case_store)) == ['CASE-001', 'CASE-002', 'CASE-080']
+    # Kode tanpa case persis tetap dikenali lewat parent/children
+    assert rag_core.resolve_category('A15.0 efusi', case_store) == (None, False)
+    assert set(ids(rag_core.smart_search(db, 'A15.0 efusi', case_store))) <= {
+        'CASE-003', 'CASE-004', 'CASE-005', 'CASE-007', 'CASE-008', 'CASE-009', 'CASE-010', 'CASE-087'}
+
+
+def test_inferred_category_scopes_results(case_store, db):
+    allowed = set(case_store.category_index['kehamilan_persalinan'])
+    results = ids(rag_core.smart_search(db, 'sectio caesar indikasi', case_store))
+    assert results and set(results) <= allowed
+
+
+def test_explicit_category_is_absolute(case_store, db):
+    assert rag_core.resolve_category('A01.0 caesar', case_store, 'kehamilan_persalinan') == ('kehamilan_persalinan', False)
+    allowed = set(case_store.category_index['kehamilan_persalinan'])
+    results = ids(rag_core.smart_search(db, 'A01.0 caesar', case_store, category='kehamilan_persalinan'))
+    assert results and set(results) <= allowed
+
+
+def test_unknown_category_is_rejected(case_store):
+    with pytest.raises(ValueError):
+        rag_core.resolve_category('demam', case_store, 'tidak_ada')
+
+
+def test_template_respects_explicit_category(monkeypatch, case_store):
+    monkeypatch.setattr(rag_core, 'TEMPLATE_ANSWERS', True)
+    assert rag_core.template_answer('A91', case_store) is not None
+    assert rag_core.template_answer('A91', case_store, 'neoplasma') is None
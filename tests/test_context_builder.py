@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import pytest
+
+from context_builder import DEDUPLICATED, TRUNCATED, build_context, estimate_tokens
+
+
+def case(diagnosa_utama, kode, aspek_koding, diagnosa='', prosedur=None, perhatian_khusus=None):
+    return SimpleNamespace(metadata={
+        'diagnosa_utama': diagnosa_utama, 'kode': kode, 'diagnosa': diagnosa,
+        'prosedur': prosedur, 'aspek_koding': aspek_koding, 'perhatian_khusus': perhatian_khusus,
+    })
+
+
+SHARED = "Kode A01.0 tidak boleh digabung dengan A09."
+DOCS = [
+    case('Typhoid Fever', ['A01.0', 'A09'],
+         f"{SHARED} Pastikan hasil widal atau kultur tercantum. Lama rawat minimal tiga hari.",
+         diagnosa="Demam tifoid dengan diare akut. Pasien dirawat inap."),
+    case('Diare', ['A09', 'E86'],
+         f"{SHARED} Dehidrasi dikode sekunder jika ditangani.",
+         diagnosa="Diare akut dengan dehidrasi sedang."),
+    case('Typhoid Fever', ['A01.0'],
+         f"Pastikan hasil widal atau kultur tercantum. {SHARED} Komplikasi dikode terpisah.",
+         prosedur="Tidak ada tindakan."),
+]
+
+
+def test_sentences_and_codes_are_not_repeated():
+    context, _ = build_context(DOCS, token_budget=10_000)
+    assert context.count(SHARED) == 1
+    assert context.count("Pastikan hasil widal atau kultur tercantum.") == 1
+    assert DEDUPLICATED in context
+    blocks = context.split("\n---")
+    assert "KODE ICD: A01.0, A09" in blocks[0]
+    assert "KODE ICD: E86 (+1 kode sama dengan kasus di atas)" in blocks[1]
+    assert "KODE ICD: - (+1 kode sama dengan kasus di atas)" in blocks[2]
+
+
+@pytest.mark.parametrize('budget', [40, 60, 80, 120, 200])
+def test_budget_holds_once_past_first_block(budget):
+    first_header, _ = build_context(DOCS[:1], token_budget=0)
+    assert budget >= estimate_tokens(first_header)
+    context, tokens = build_context(DOCS, token_budget=budget)
+    assert tokens <= budget
+    assert context.startswith("DIAGNOSA: Typhoid Fever")
+
+
+def test_small_budget_truncates_fields():
+    full, full_tokens = build_context(DOCS, token_budget=10_000)
+    context, tokens = build_context(DOCS, token_budget=full_tokens // 2)
+    assert tokens < full_tokens
+    assert TRUNCATED in context
+
+
+def test_first_case_is_always_included():
+    huge = case('Sepsis', ['A41.9'], "Kalimat panjang. " * 200)
+    context, tokens = build_context([huge, DOCS[1]], token_budget=5)
+    assert context.startswith("DIAGNOSA: Sepsis\nKODE ICD: A41.9")
+    assert "Diare" not in context
+    assert tokens > 5   # header case pertama tetap masuk walau melebihi budget
@@ -0,0 +1,74 @@
+import json
+import os
+
+from conversation_store import ConversationStore
+
+
+def message(i, **extra):
+    return {'question': f"pertanyaan {i}", 'answer': f"jawaban {i}", 'timestamp': f"2024-01-01 00:00:{i:02d}",
+            **extra}
+
+
+def test_append_and_list(tmp_path):
+    store = ConversationStore(str(tmp_path / 'chat.sqlite3'))
+    store.append_message('u1', 'c1', 'Judul', message(0, metrics={'path': 'llm'}))
+    store.append_message('u1', 'c1', 'Judul', message(1))
+    store.append_message('u2', 'c2', 'Lain', message(0))
+
+    assert store.count_conversations('u1') == 1
+    [conv] = store.list_conversations('u1')
+    assert conv['id'] == 'c1' and conv['message_count'] == 2
+
+    data = store.load_conversation('u1', 'c1')
+    assert [m['question'] for m in data['messages']] == ["pertanyaan 0", "pertanyaan 1"]
+    assert data['messages'][0]['metrics'] == {'path': 'llm'}
+    # Percakapan user lain tidak bisa dibaca/dihapus
+    assert store.load_conversation('u1', 'c2') is None
+    assert not store.delete_conversation('u1', 'c2')
+    assert store.delete_conversation('u1', 'c1')
+    assert store.count_conversations('u1') == 0
+
+
+def test_migrates_json_histories_once(tmp_path):
+    history_dir = tmp_path / 'user_histories'
+    user_dir = history_dir / 'u1'
+    user_dir.mkdir(parents=True)
+    with open(user_dir / 'c1.json', 'w', encoding='utf-8') as f:
+        json.dump({'title': 'Lama', 'created': '2024-01-01 00:00:00', 'updated': '2024-01-02 00:00:00',
+                   'messages': [message(0), message(1, metrics={'ttft_ms': 5})]}, f)
+    (user_dir / 'rusak.json').write_text('{bukan json', encoding='utf-8')
+
+    store = ConversationStore(str(history_dir / 'conversations.sqlite3'))
+    assert store.migrate_json_histories(str(history_dir)) == 1
+
+    data = store.load_conversation('u1', 'c1')
+    assert data['title'] == 'Lama'
+    assert [m['answer'] for m in data['messages']] == ["jawaban 0", "jawaban 1"]
+    assert data['messages'][1]['metrics'] == {'ttft_ms': 5}
+    # File lama tetap ada, migrasi tidak diulang
+    assert os.path.exists(user_dir / 'c1.json')
+    assert store.migrate_json_histories(str(history_dir)) == 0
+
+    # Pesan baru melanjutkan nomor urut hasil migrasi
+    store.append_message('u1', 'c1', 'Lama', message(2))
+    assert len(store.load_conversation('u1', 'c1')['messages']) == 3
+
+
+def test_window_and_paging(tmp_path):
+    store = ConversationStore(str(tmp_path / 'chat.sqlite3'))
+    for i in range(25):
+        store.append_message('u1', 'c1', 'Panjang', message(i))
+
+    data = store.load_conversation('u1', 'c1', limit=10)
+    assert data['message_count'] == 25 and data['first_seq'] == 15
+    assert [m['question'] for m in data['messages']] == [f"pertanyaan {i}" for i in range(15, 25)]
+
+    earlier = store.load_messages('c1', 5, 15)
+    assert [m['question'] for m in earlier] == [f"pertanyaan {i}" for i in range(5, 15)]
+    assert store.load_messages('c1', 0, 0) == []
+
+    assert store.list_questions('c1', end=15, limit=3) == ["pertanyaan 12", "pertanyaan 13", "pertanyaan 14"]
+
+    # limit lebih besar dari jumlah pesan = semua pesan
+    full = store.load_conversation('u1', 'c1', limit=100)
+    assert full['first_seq'] == 0 and len(full['messages']) == 25
@@ -0,0 +1,54 @@
+from icd_index import build_code_index
+
+
+def make_index():
+    return build_code_index({
+        'metadata': {'kode_icd_tersedia': ['B99']},
+        'cases': [
+            {'id': 'C1', 'kode_diagnosa': ['A01.0', 'A09']},
+            {'id': 'C2', 'kode_diagnosa': ['A01', 'a01.1 ']},
+            {'id': 'C3', 'kode_diagnosa': ['A15.0', '74.1']},
+            {'id': 'C4', 'kode_diagnosa': ['B20', '00.09']},
+        ]
+    })
+
+
+def test_exact_lookup_is_normalized():
+    index = make_index()
+    assert index.exact('a01.0') == ['C1']
+    assert index.exact('A01.1') == ['C2']
+    assert index.exact('A02') == []
+    assert 'B99' in index and index.exact('B99') == []
+
+
+def test_prefix_children_and_parent():
+    index = make_index()
+    assert index.codes_with_prefix('A0') == ['A01', 'A01.0', 'A01.1', 'A09']
+    assert index.prefix('A01') == ['C2', 'C1']
+    assert index.children('A01') == ['C1', 'C2']
+    assert index.parent('A01.0') == ['C2']
+    assert index.parent('A01') == []
+
+
+def test_range_is_inclusive_of_end_subcodes():
+    index = make_index()
+    assert index.codes_in_range('A01', 'A09') == ['A01', 'A01.0', 'A01.1', 'A09']
+    # Urutan terbalik tetap dipahami
+    assert index.range('A15', 'A01') == index.range('A01', 'A15')
+    assert 'C3' in index.range('A01', 'A15')
+    assert 'C4' not in index.range('A01', 'A15')
+
+
+def test_search_puts_exact_hits_before_related_codes():
+    index = make_index()
+    assert index.search('koding A01.0 untuk tifoid') == ['C1', 'C2']
+    assert index.search('rentang A00-A09') == ['C2', 'C1']
+
+
+def test_icd9_codes_only_when_indexed():
+    index = make_index()
+    ranges, codes = index.extract_codes('prosedur 74.1 dan 00.09, suhu 38.5')
+    assert ranges == []
+    assert codes == ['74.1', '00.09']
+    assert index.search('tindakan 74.1') == ['C3']
+    assert index.search('demam 38.5 derajat') == []
@@ -0,0 +1,62 @@
+import json
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+import rag_core
+
+
+def write_database(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    return str(path)
+
+
+def build(json_file, embeddings):
+    case_store = rag_core.build_case_store(json_file)
+    return case_store, rag_core.create_vector_store(case_store.documents, case_store.index_key, embeddings)
+
+
+def search_ids(db, vector, k=5):
+    return [doc.metadata['id'] for doc in db.similarity_search_by_vector(vector, k=k)]
+
+
+def test_incremental_update_matches_full_rebuild(tmp_path, database_file, embeddings, index_cache):
+    with open(database_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    old_file = write_database(tmp_path / 'v1.json', data)
+    _, old_db = build(old_file, embeddings)
+    assert embeddings.embedded == len(data['cases'])
+
+    # Satu case diubah, satu dihapus, satu ditambah
+    data['cases'][0]['diagnosa_utama'] += ' (revisi)'
+    removed = data['cases'].pop(1)['id']
+    added = dict(data['cases'][2], id='CASE-BARU')
+    data['cases'].append(added)
+    new_file = write_database(tmp_path / 'v2.json', data)
+
+    embeddings.embedded = 0
+    case_store, db = build(new_file, embeddings)
+    assert embeddings.embedded == 2
+    # Index lama yang sedang melayani tidak ikut berubah
+    assert removed in {doc.metadata['id'] for doc in old_db.docstore._dict.values()}
+
+    full = FAISS.from_documents(list(case_store.documents), embeddings,
+                                ids=[doc.metadata['id'] for doc in case_store.documents])
+    assert db.index.ntotal == full.index.ntotal == len(data['cases'])
+    ids = {doc.metadata['id'] for doc in db.docstore._dict.values()}
+    assert removed not in ids and 'CASE-BARU' in ids
+    for doc in case_store.documents:
+        vector = embeddings.embed_query(doc.page_content)
+        assert search_ids(db, vector) == search_ids(full, vector)
+    assert db.docstore.search(case_store.documents[0].metadata['id']).page_content == \
+        case_store.documents[0].page_content
+
+
+def test_unchanged_database_reuses_saved_index(tmp_path, database_file, embeddings, index_cache):
+    _, first = build(database_file, embeddings)
+    embeddings.embedded = 0
+    _, second = build(database_file, embeddings)
+    assert embeddings.embedded == 0
+    vector = np.asarray(embeddings.embed_query("demam tifoid"), dtype=np.float32).tolist()
+    assert search_ids(first, vector) == search_ids(second, vector)
@@ -0,0 +1,191 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from llm_scheduler import LLMScheduler
+
+
+class FakeClient:
+    """Client LLM palsu: mencatat prompt yang sampai ke upstream."""
+
+    def __init__(self, delay: float = 0.0, failures: int = 0):
+        self.delay = delay
+        self.failures = failures
+        self.calls = []
+        self._lock = threading.Lock()
+
+    async def ainvoke(self, prompt):
+        with self._lock:
+            self.calls.append(prompt)
+            if self.failures:
+                self.failures -= 1
+                raise RateLimited()
+        await asyncio.sleep(self.delay)
+        return SimpleNamespace(content=f"jawaban: {prompt}", usage_metadata=None)
+
+    async def astream(self, prompt):
+        response = await self.ainvoke(prompt)
+        for token in response.content.split(' '):
+            yield SimpleNamespace(content=token + ' ', usage_metadata=None)
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+def make_scheduler(client, **kwargs):
+    kwargs.setdefault('rate_per_minute', 1e9)
+    return LLMScheduler(lambda: client, backoff_base=0.01, **kwargs)
+
+
+def test_identical_prompts_are_coalesced():
+    client = FakeClient(delay=0.2)
+    scheduler = make_scheduler(client)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(scheduler.invoke("sama"))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join()
+
+    assert client.calls == ["sama"]
+    assert results == ["jawaban: sama"] * 3
+    assert scheduler.stats()['coalesced'] == 2
+
+
+def test_queue_is_served_in_fifo_order():
+    client = FakeClient()
+    # 1 token awal, lalu 20 token/detik: request berikutnya harus mengantre
+    scheduler = make_scheduler(client, rate_per_minute=1200, burst=1)
+    threads = []
+    for i in range(5):
+        thread = threading.Thread(target=scheduler.invoke, args=(f"p{i}",))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+
+    assert client.calls == [f"p{i}" for i in range(5)]
+    stats = scheduler.stats()
+    assert stats['queue_depth'] == 0
+    assert stats['max_wait_s'] > 0
+
+
+def test_retryable_errors_are_retried():
+    client = FakeClient(failures=2)
+    scheduler = make_scheduler(client)
+    assert scheduler.invoke("coba") == "jawaban: coba"
+    assert len(client.calls) == 3
+    assert scheduler.stats()['retries'] == 2
+
+
+def test_cancelled_async_request_gives_up_its_turn():
+    client = FakeClient()
+    scheduler = make_scheduler(client, rate_per_minute=600, burst=1)
+
+    async def scenario():
+        first = asyncio.create_task(scheduler.ainvoke("a"))
+        await asyncio.sleep(0.01)
+        waiting = asyncio.create_task(scheduler.ainvoke("b"))
+        behind = asyncio.create_task(scheduler.ainvoke("c"))
+        await asyncio.sleep(0.02)
+        waiting.cancel()
+        await first
+        return await asyncio.wait_for(behind, timeout=2)
+
+    assert asyncio.run(scenario()) == "jawaban: c"
+    assert client.calls == ["a", "c"]
+    assert scheduler.stats()['queue_depth'] == 0
+    assert scheduler.stats()['in_flight'] == 0
+
+
+def test_follower_takes_over_when_leader_is_cancelled():
+    client = FakeClient(delay=0.2)
+    scheduler = make_scheduler(client)
+
+    async def scenario():
+        leader = asyncio.create_task(scheduler.ainvoke("sama"))
+        await asyncio.sleep(0.05)
+        follower = asyncio.create_task(scheduler.ainvoke("sama"))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        return await asyncio.wait_for(follower, timeout=2)
+
+    assert asyncio.run(scenario()) == "jawaban: sama"
+    assert client.calls == ["sama", "sama"]
+    assert scheduler.stats()['in_flight'] == 0
+
+
+def test_cancelled_follower_does_not_cancel_shared_answer():
+    client = FakeClient(delay=0.2)
+    scheduler = make_scheduler(client)
+
+    async def scenario():
+        leader = asyncio.create_task(scheduler.ainvoke("sama"))
+        await asyncio.sleep(0.05)
+        follower = asyncio.create_task(scheduler.ainvoke("sama"))
+        await asyncio.sleep(0.05)
+        follower.cancel()
+        return await leader
+
+    assert asyncio.run(scenario()) == "jawaban: sama"
+    assert client.calls == ["sama"]
+
+
+class Interrupting(FakeClient):
+    """Panggilan pertama berhenti dengan BaseException (mis. KeyboardInterrupt di worker)."""
+
+    async def ainvoke(self, prompt):
+        with self._lock:
+            first = not self.calls
+        if first:
+            self.calls.append(prompt)
+            await asyncio.sleep(self.delay)
+            raise KeyboardInterrupt()
+        return await super().ainvoke(prompt)
+
+
+def test_follower_does_not_hang_when_leader_raises_base_exception():
+    client = Interrupting(delay=0.2)
+    scheduler = make_scheduler(client)
+    errors, results = [], []
+
+    def leader():
+        try:
+            scheduler.invoke("sama")
+        except KeyboardInterrupt as e:
+            errors.append(e)
+
+    leader_thread = threading.Thread(target=leader)
+    leader_thread.start()
+    time.sleep(0.05)
+    follower = threading.Thread(target=lambda: results.append(scheduler.invoke("sama")))
+    follower.start()
+    leader_thread.join()
+    follower.join(timeout=2)
+
+    assert not follower.is_alive()
+    assert len(errors) == 1
+    assert results == ["jawaban: sama"]
+    assert client.calls == ["sama", "sama"]
+    assert scheduler.stats()['in_flight'] == 0
+
+
+def test_stream_retries_only_before_first_token_and_shares_result():
+    client = FakeClient(delay=0.1, failures=1)
+    scheduler = make_scheduler(client)
+
+    async def scenario():
+        async def collect():
+            return "".join([token async for token in scheduler.astream("sama")])
+        leader = asyncio.create_task(collect())
+        await asyncio.sleep(0.05)
+        return await asyncio.gather(leader, scheduler.ainvoke("sama"))
+
+    streamed, joined = asyncio.run(scenario())
+    assert streamed.strip() == joined.strip() == "jawaban: sama"
+    assert client.calls == ["sama", "sama"]   # satu retry, follower tidak memanggil upstream
+    assert scheduler.stats()['coalesced'] == 1
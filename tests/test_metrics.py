@@ -0,0 +1,81 @@
+import json
+import time
+
+import metrics
+from metrics import Registry, span, trace
+
+
+def test_histogram_quantiles_use_rolling_window():
+    registry = Registry(window=100)
+    for value in range(1, 101):
+        registry.observe('search', float(value))
+    stats = registry.snapshot()['stages']['search']
+    assert (stats['p50_ms'], stats['p95_ms'], stats['p99_ms']) == (51.0, 95.0, 99.0)
+
+    for _ in range(100):
+        registry.observe('search', 1000.0)
+    stats = registry.snapshot()['stages']['search']
+    assert stats['p50_ms'] == 1000.0          # observasi lama keluar dari jendela
+    assert stats['count'] == 200              # count/sum tetap sejak start
+    assert stats['sum_ms'] == 5050 + 100_000
+
+
+def test_prometheus_text_format():
+    registry = Registry()
+    for value in (10.0, 20.0, 30.0):
+        registry.observe('llm', value)
+    registry.inc('answer_cache.exact_hit', 2)
+    text = registry.render_prometheus({'rag_llm_queue_depth': 3})
+
+    lines = text.splitlines()
+    assert text.endswith('\n')
+    assert '# TYPE rag_stage_duration_ms summary' in lines
+    assert 'rag_stage_duration_ms{stage="llm",quantile="0.5"} 20.0' in lines
+    assert 'rag_stage_duration_ms{stage="llm",quantile="0.99"} 30.0' in lines
+    assert 'rag_stage_duration_ms_sum{stage="llm"} 60.0' in lines
+    assert 'rag_stage_duration_ms_count{stage="llm"} 3' in lines
+    assert 'rag_events_total{name="answer_cache.exact_hit"} 2' in lines
+    assert lines[-2:] == ['# TYPE rag_llm_queue_depth gauge', 'rag_llm_queue_depth 3']
+
+
+def test_trace_file_is_opt_in_and_rotated(tmp_path, monkeypatch):
+    trace_file = tmp_path / 'traces.jsonl'
+    monkeypatch.setattr(metrics, 'TRACE_FILE', '')
+    with trace('answer'):
+        pass
+    assert list(tmp_path.iterdir()) == []
+
+    monkeypatch.setattr(metrics, 'TRACE_FILE', str(trace_file))
+    monkeypatch.setattr(metrics, 'TRACE_MAX_BYTES', 300)
+    for i in range(10):
+        with trace('answer', k=i):
+            with span('search'):
+                pass
+    rotated = tmp_path / 'traces.jsonl.1'
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['traces.jsonl', 'traces.jsonl.1']
+    # Diputar begitu mencapai batas: file .1 >= batas, file aktif paling banyak batas + satu record
+    assert rotated.stat().st_size >= 300
+    assert trace_file.stat().st_size < 300 + max(len(line) + 1 for line in rotated.read_text().splitlines())
+    records = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    assert records[-1]['attrs'] == {'k': 9}
+    assert records[-1]['spans'][0]['name'] == 'search'
+
+
+def test_slow_request_includes_profile_samples(tmp_path, monkeypatch):
+    trace_file = tmp_path / 'traces.jsonl'
+    monkeypatch.setattr(metrics, 'TRACE_FILE', str(trace_file))
+    monkeypatch.setattr(metrics, 'PROFILE_SLOW_MS', 50)
+
+    def busy_stage():
+        end = time.perf_counter() + 0.15
+        while time.perf_counter() < end:
+            pass
+
+    with trace('answer'):
+        busy_stage()
+    with trace('answer'):
+        pass
+
+    slow, fast = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    assert any('busy_stage' in sample['stack'] for sample in slow['profile'])
+    assert 'profile' not in fast
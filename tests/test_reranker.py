@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+import rag_core
+from reranker import CrossEncoderReranker
+
+
+class StubScorer:
+    """Pengganti CrossEncoder: skor = urutan di `preferred`, mencatat pasangan yang dinilai."""
+
+    def __init__(self, preferred, delay=0.0):
+        self.preferred = list(preferred)
+        self.delay = delay
+        self.scored = []
+
+    def predict(self, pairs, batch_size=16, show_progress_bar=False):
+        time.sleep(self.delay)
+        self.scored.extend(pairs)
+        return [float(len(self.preferred) - self.preferred.index(text)) if text in self.preferred else 0.0
+                for _, text in pairs]
+
+
+def make_reranker(scorer, budget_ms=1000):
+    reranker = CrossEncoderReranker(budget_ms=budget_ms)
+    reranker._model = scorer
+    return reranker
+
+
+@pytest.fixture(scope='module')
+def case_store(database_file):
+    return rag_core.build_case_store(database_file)
+
+
+def docs_for(case_store, ids):
+    return [case_store.documents_by_id[case_id] for case_id in ids]
+
+
+def ids(docs):
+    return [doc.metadata['id'] for doc in docs]
+
+
+def test_scores_are_cached_per_query_and_case(case_store):
+    docs = docs_for(case_store, ['CASE-001', 'CASE-002', 'CASE-080'])
+    scorer = StubScorer([docs[2].page_content, docs[0].page_content])
+    reranker = make_reranker(scorer)
+
+    assert ids(reranker.rerank("demam tifoid", docs)) == ['CASE-080', 'CASE-001', 'CASE-002']
+    assert len(scorer.scored) == 3
+    # Query setara setelah normalisasi: semua skor dari cache
+    assert ids(reranker.rerank("Demam  Tifoid?", docs)) == ['CASE-080', 'CASE-001', 'CASE-002']
+    assert len(scorer.scored) == 3
+    # Hanya case baru yang dinilai
+    reranker.rerank("demam tifoid", docs + docs_for(case_store, ['CASE-003']))
+    assert len(scorer.scored) == 4
+
+
+def test_deadline_falls_back_to_original_order(case_store):
+    docs = docs_for(case_store, ['CASE-001', 'CASE-002', 'CASE-080'])
+    scorer = StubScorer([docs[2].page_content], delay=0.2)
+    reranker = make_reranker(scorer, budget_ms=20)
+    assert reranker.rerank("demam tifoid", docs) is None
+
+    # Hasil yang terlambat tetap masuk cache untuk query berikutnya
+    time.sleep(0.3)
+    scorer.delay = 0.0
+    assert ids(reranker.rerank("demam tifoid", docs))[0] == 'CASE-080'
+    assert len(scorer.scored) == 3
+
+
+def test_code_hits_are_reranked(case_store, monkeypatch):
+    preferred = docs_for(case_store, ['CASE-080'])[0].page_content
+    reranker = make_reranker(StubScorer([preferred]))
+    monkeypatch.setattr(rag_core, 'get_reranker', lambda: reranker)
+    docs, _ = rag_core.hybrid_search(None, "A01.0", case_store, k=3)
+    assert ids(docs) == ['CASE-080', 'CASE-001', 'CASE-002']
+
+
+def test_search_keeps_order_when_rerank_times_out(case_store, monkeypatch):
+    reranker = make_reranker(StubScorer([], delay=0.2), budget_ms=20)
+    monkeypatch.setattr(rag_core, 'get_reranker', lambda: reranker)
+    docs, _ = rag_core.hybrid_search(None, "A01.0", case_store, k=3)
+    assert ids(docs) == ['CASE-001', 'CASE-002', 'CASE-080']
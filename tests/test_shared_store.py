@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+import rag_core
+import shared_store
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch, database_file, embeddings, index_cache):
+    """(case store + FAISS di memori, versi shared store yang di-mmap)."""
+    in_memory = rag_core.build_case_store(database_file)
+    db = rag_core.create_vector_store(in_memory.documents, in_memory.index_key, embeddings)
+    monkeypatch.setattr(rag_core, 'SHARED_STORE_DIR', str(tmp_path / 'shared'))
+    mapped, mapped_db = rag_core.load_store(database_file, embeddings)
+    return (in_memory, db), (mapped, mapped_db)
+
+
+def queries(case_store):
+    result = list(case_store.json_data.get('contoh_pertanyaan', []))
+    for doc in list(case_store.documents)[::5]:
+        result.append(doc.metadata['diagnosa_utama'])
+        result.extend(doc.metadata.get('kode', [])[:1])
+    return result
+
+
+def test_mapped_store_matches_in_memory(stores):
+    (case_store, db), (mapped, mapped_db) = stores
+    assert mapped.index_key == case_store.index_key
+    assert len(mapped.documents) == len(case_store.documents)
+    for doc in case_store.documents:
+        other = mapped.documents_by_id[doc.metadata['id']]
+        assert other.page_content == doc.page_content
+        assert other.metadata == doc.metadata
+    assert dict(mapped.category_index) == {key: list(ids) for key, ids in case_store.category_index.items()}
+
+    for query in queries(case_store):
+        expected = [doc.metadata['id'] for doc in rag_core.smart_search(db, query, case_store, k=3)]
+        actual = [doc.metadata['id'] for doc in rag_core.smart_search(mapped_db, query, mapped, k=3)]
+        assert actual == expected, query
+        assert mapped.code_index.search(query) == case_store.code_index.search(query)
+        assert mapped.sparse_index.search(query) == pytest.approx(case_store.sparse_index.search(query))
+        assert rag_core.template_answer(query, mapped) == rag_core.template_answer(query, case_store)
+
+
+def test_rebuild_prunes_only_old_store_versions(tmp_path, database_file, embeddings, index_cache, monkeypatch):
+    root = tmp_path / 'shared'
+    (root / 'data_lain').mkdir(parents=True)
+    (root / '0123456789abcdef-v1').mkdir()
+    monkeypatch.setattr(rag_core, 'SHARED_STORE_DIR', str(root))
+
+    case_store, _ = rag_core.load_store(database_file, embeddings)
+    store_dir = shared_store.store_directory(str(root), rag_core.compute_store_key(database_file))
+    assert sorted(os.listdir(root)) == sorted(['data_lain', os.path.basename(store_dir)])
+    assert os.path.exists(os.path.join(store_dir, 'manifest.json'))
+
+
+def test_worker_opens_store_without_parsing_json(tmp_path, database_file, embeddings, index_cache, monkeypatch):
+    monkeypatch.setattr(rag_core, 'SHARED_STORE_DIR', str(tmp_path / 'shared'))
+    built, _ = rag_core.load_store(database_file, embeddings)
+
+    def no_parse(json_file):
+        raise AssertionError("worker tidak boleh mem-parse JSON")
+    monkeypatch.setattr(rag_core, 'load_json_database', no_parse)
+    mapped, _ = rag_core.load_store(database_file, embeddings)
+    assert mapped.index_key == built.index_key
+
+    store_dir = shared_store.store_directory(str(tmp_path / 'shared'), rag_core.compute_store_key(database_file))
+    assert shared_store.read_manifest(store_dir)['store_key'] == rag_core.compute_store_key(database_file)
+    with pytest.raises(ValueError):
+        shared_store.open_shared_store(store_dir, '0' * 16)
+
+
+def test_store_key_follows_chunk_builder_version(database_file, monkeypatch):
+    key = rag_core.compute_store_key(database_file)
+    monkeypatch.setattr(rag_core, 'CHUNK_BUILDER_VERSION', rag_core.CHUNK_BUILDER_VERSION + 1)
+    assert rag_core.compute_store_key(database_file) != key
@@ -0,0 +1,60 @@
+import pytest
+
+from sparse_index import BM25Index, is_confident, reciprocal_rank_fusion, tokenize
+
+CASES = [
+    {'id': 'C1', 'keywords': ['demam tifoid', 'salmonella'], 'diagnosa_utama': 'Demam tifoid',
+     'aspek_koding': 'Kode A01.0 untuk tifoid'},
+    {'id': 'C2', 'keywords': ['diare', 'gastroenteritis'], 'diagnosa_utama': 'Diare akut',
+     'aspek_koding': 'Diare dengan dehidrasi dikode terpisah'},
+    {'id': 'C3', 'keywords': ['tuberkulosis paru'], 'diagnosa_utama': 'TB paru',
+     'aspek_koding': 'Demam lama dapat menyertai TB'},
+]
+
+
+def test_tokenize_drops_stopwords_and_short_tokens():
+    assert tokenize("Apa kode untuk Demam tifoid, a?") == ['demam', 'tifoid']
+
+
+def test_search_ranks_field_weighted_matches_first():
+    index = BM25Index(CASES)
+    hits = index.search('demam tifoid')
+    assert [case_id for case_id, _, _ in hits] == ['C1', 'C3']
+    # C1 memuat semua term query, C3 hanya 'demam'
+    assert hits[0][2] == 1.0 and hits[1][2] == 0.5
+    assert hits[0][1] > hits[1][1]
+
+
+def test_search_unknown_terms_and_filter():
+    index = BM25Index(CASES)
+    assert index.search('kata tidak dikenal') == []
+    assert [hit[0] for hit in index.search('demam', case_filter={'C3'})] == ['C3']
+    assert len(index.search('demam diare tifoid', n=2)) == 2
+
+
+def test_is_confident_requires_full_coverage_and_margin():
+    assert is_confident([('C1', 3.0, 1.0), ('C2', 1.0, 1.0)], margin=1.5)
+    assert not is_confident([('C1', 3.0, 1.0), ('C2', 2.5, 1.0)], margin=1.5)
+    assert not is_confident([('C1', 3.0, 0.5)])
+    assert not is_confident([])
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([['A', 'B', 'C'], ['B', 'D']], k=60)
+    assert fused[0] == 'B'            # muncul di kedua daftar
+    assert set(fused) == {'A', 'B', 'C', 'D'}
+    assert fused.index('A') < fused.index('D') < fused.index('C')
+
+
+def test_reciprocal_rank_fusion_weights():
+    assert reciprocal_rank_fusion([['A'], ['B']], weights=[1.0, 2.0]) == ['B', 'A']
+    assert reciprocal_rank_fusion([['A'], ['B']], weights=[2.0, 1.0]) == ['A', 'B']
+    assert reciprocal_rank_fusion([]) == []
+
+
+@pytest.mark.parametrize('query', ['tifoid', 'diare dehidrasi', 'tb paru'])
+def test_search_scores_are_positive_and_sorted(query):
+    hits = BM25Index(CASES).search(query)
+    scores = [score for _, score, _ in hits]
+    assert hits and all(score > 0 for score in scores)
+    assert scores == sorted(scores, reverse=True)
@@ -0,0 +1,33 @@
+import pytest
+
+import rag_core
+
+
+@pytest.fixture(scope='module')
+def case_store(database_file):
+    return rag_core.build_case_store(database_file)
+
+
+@pytest.fixture(autouse=True)
+def templates_on(monkeypatch):
+    monkeypatch.setattr(rag_core, 'TEMPLATE_ANSWERS', True)
+
+
+def test_single_case_gets_template(case_store):
+    answer = rag_core.template_answer('00.09', case_store)
+    assert answer is not None and answer[1] == ['CASE-166']
+
+
+def test_same_diagnosa_group_gets_template(case_store):
+    answer = rag_core.template_answer('A91', case_store)
+    assert answer is not None and sorted(answer[1]) == ['CASE-020', 'CASE-021']
+
+
+def test_mixed_diagnosa_falls_back_to_llm(case_store):
+    # A01.0: Typhoid Fever dan Diare
+    assert rag_core.template_answer('A01.0', case_store) is None
+
+
+def test_generic_diagnosa_is_not_a_group(case_store):
+    # 54.11: dua case yang sama-sama "Tidak ada diagnosa spesifik"
+    assert rag_core.template_answer('54.11', case_store) is None